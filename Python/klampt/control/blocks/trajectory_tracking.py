@@ -8,6 +8,7 @@ class TrajectoryPositionController(ControllerBlock):
     derivative of the trajectory"""
     def __init__(self,traj,type=('qcmd','dqcmd')):
         self.traj = traj
+        self.cursor = traj.cursor()
         self.outputType = type
         self.startTime = None
 
@@ -27,10 +28,10 @@ class TrajectoryPositionController(ControllerBlock):
         t = t - self.startTime
         if isinstance(self.outputType,(tuple,list)):
             assert len(self.outputType)==2
-            return {self.outputType[0]:self.traj.eval(t),
-                    self.outputType[1]:self.traj.deriv(t)}
+            return {self.outputType[0]:self.cursor.eval(t),
+                    self.outputType[1]:self.cursor.deriv(t)}
         else:
-            return {self.outputType:self.traj.eval(t)}
+            return {self.outputType:self.cursor.eval(t)}
 
     def getState(self):
         return {'startTime':self.startTime}
@@ -47,6 +48,8 @@ class TrajectoryWithFeedforwardTorqueController(ControllerBlock):
     def __init__(self,traj,torquetraj):
         self.traj = traj
         self.torquetraj = torquetraj
+        self.cursor = traj.cursor()
+        self.torquecursor = torquetraj.cursor()
         self.startTime = None
     def inputNames(self):
         return ['t']
@@ -60,7 +63,7 @@ class TrajectoryWithFeedforwardTorqueController(ControllerBlock):
         if self.startTime == None:
             self.startTime = t
         t = t - self.startTime
-        return api.makeFeedforwardPIDCommand(self.traj.eval(t),self.traj.deriv(t),self.torquetraj.eval(t))
+        return api.makeFeedforwardPIDCommand(self.cursor.eval(t),self.cursor.deriv(t),self.torquecursor.eval(t))
 
     def getState(self):
         return {'startTime':self.startTime}
@@ -81,6 +84,6 @@ def make(robot,file="mypath.path",ff_torque_file=None):
     if ff_torque_file is not None:
         tcmd = trajectory.Trajectory()
         tcmd.load(ff_torque_file)
-        return TrajectoryWithFeedforwardTorqueController(l,ff_torque_file)
+        return TrajectoryWithFeedforwardTorqueController(l,tcmd)
 
     return TrajectoryPositionController(l)
@@ -1410,6 +1410,8 @@ class _RobotInterfaceEmulatorData:
     def setPiecewiseLinear(self,indices,ts,qs,relative):
         assert self.curClock is not None
         assert len(ts) == len(qs)
+        #accept any sequences, e.g., the times/milestones of a StreamingTrajectory
+        ts,qs = list(ts),list(qs)
         if relative:
             if any(t < 0 for t in ts):
                 raise ValueError("Can't set a trajectory with negative relative times")
@@ -1439,6 +1441,8 @@ class _RobotInterfaceEmulatorData:
         assert self.curClock is not None
         assert len(ts) == len(qs)
         assert len(ts) == len(vs)
+        #accept any sequences, e.g., arrays from a StreamingHermiteTrajectory
+        ts,qs,vs = list(ts),list(qs),list(vs)
         if relative:
             if any(t < 0 for t in ts):
                 raise ValueError("Can't set a trajectory with negative relative times")
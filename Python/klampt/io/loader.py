@@ -61,6 +61,7 @@ Implementation
     loadTrajectory
     loadMultiPath
     loadDynamicXML
+    loadDynamicNpz
 
 """
 from ..robotsim import *
@@ -94,7 +95,8 @@ extensionToTypes = {'.config':['Config'],
                    '.urdf':['RobotModel'],
                    '.obj':['Geometry3D','RigidObjectModel','TriangleMesh'],
                    '.env':['TerrainModel'],
-                   '.xml':['WorldModel','MultiPath']
+                   '.xml':['WorldModel','MultiPath'],
+                   '.npz':['Trajectory','LinearPath','SE3Trajectory','SO3Trajectory','MultiPath']
                    }
 """dict mapping file extensions to lists of compatible Klampt types."""
 
@@ -126,9 +128,9 @@ def filenameToType(name):
     """Returns one Klampt type represented by the given filename's
     extension.
 
-    If the file is a dynamic type (.xml or .json), just 'xml' or 'json' is
-    returned because the type will need to be determined after parsing the
-    file.
+    If the file is a dynamic type (.xml, .json, or .npz), just 'xml',
+    'json', or 'npz' is returned because the type will need to be determined
+    after parsing the file.
 
     If the type is ambiguous (like .obj), the first type in extensionToTypes is
     returned.
@@ -141,6 +143,8 @@ def filenameToType(name):
         return 'xml'  #dynamic loading
     elif fileExtension == '.json':
         return 'json'  #dynamic loading
+    elif fileExtension == '.npz':
+        return 'npz'  #dynamic loading
     elif fileExtension in extensionToTypes:
         ftypes = extensionToTypes[fileExtension]
         if len(ftypes) > 1 and fileExtension not in ['.path'] and (ftypes[0] != 'Geometry3D' and len(ftypes) > 2):
@@ -645,12 +649,31 @@ def loadDynamicXML(fn):
     except Exception as e:
         raise
 
+def loadDynamicNpz(fn):
+    #npz files may contain a Trajectory or a MultiPath, and arrays are
+    #memory-mapped
+    from ..model import trajectory
+    from ..model.trajectory import _load_npz
+    arrays = _load_npz(fn,mmap=True)
+    if 'multipath' in arrays:
+        return loadMultiPath(fn)
+    if 'milestones' not in arrays:
+        raise IOError("File "+fn+" does not contain a Trajectory or MultiPath")
+    trajtype = str(arrays['type']) if 'type' in arrays else 'Trajectory'
+    if trajtype not in ['Trajectory','HermiteTrajectory','SO3Trajectory','SE3Trajectory','SO3HermiteTrajectory','SE3HermiteTrajectory']:
+        trajtype = 'Trajectory'
+    value = getattr(trajectory,trajtype)()
+    value.times = trajectory.ArrayListView(arrays['times'])
+    value.milestones = trajectory.ArrayListView(arrays['milestones'])
+    return value
+
 loaders = {'Trajectory':loadTrajectory,
            'LinearPath':loadTrajectory,
            'MultiPath':loadMultiPath,
            'Geometry3D':loadGeometry3D,
            'WorldModel':loadWorldModel,
-           'xml':loadDynamicXML
+           'xml':loadDynamicXML,
+           'npz':loadDynamicNpz
            }
 
 savers = {'Trajectory':lambda x,fn:x.save(fn),
@@ -658,6 +681,7 @@ savers = {'Trajectory':lambda x,fn:x.save(fn),
           'MultiPath':lambda x,fn:x.save(fn),
           'Geometry3D':lambda x,fn:x.save(fn),
           'WorldModel':lambda x,fn:x.writeFile(fn),
+          'npz':lambda x,fn:x.save(fn),
           }
 
 def save(obj,type,fn):
@@ -21,7 +21,9 @@ def to_numpy(obj,type='auto'):
     * Matrix3, Rotation: returned as 3x3 matrix. Can't be determined
       with 'auto', need to specify type='Matrix3' or 'Rotation'.
     * Configs
-    * Trajectory: returns a pair (times,milestones)
+    * Trajectory: returns a pair (times,milestones).  If the trajectory
+      uses the compact storage mode, these refer to its storage without
+      copying.
     * TriangleMesh: returns a pair (verts,indices)
     * PointCloud: returns a n x (3+k) array, where k is the # of properties
     * VolumeGrid: returns a triple (bmin,bmax,array)
@@ -49,7 +51,7 @@ def to_numpy(obj,type='auto'):
     elif type == 'Rotation' or type == 'Matrix3':
         return np.array(so3.matrix(obj))
     elif type == 'Trajectory':
-        return np.array(obj.times),np.array(obj.milestones)
+        return np.asarray(obj.times),np.asarray(obj.milestones)
     elif type == 'TriangleMesh':
         from klampt import Geometry3D
         if isinstance(obj,Geometry3D):
@@ -101,7 +103,8 @@ def from_numpy(obj,type='auto',template=None):
     * RigidTransform: accepts a 4x4 homogeneous coordinate transform
     * Matrix3, Rotation: accepts a 3x3 matrix.
     * Configs
-    * Trajectory: accepts a pair (times,milestones)
+    * Trajectory: accepts a pair (times,milestones).  The result uses the
+      compact storage mode and refers to the given arrays without copying.
     * TriangleMesh: accepts a pair (verts,indices)
     * PointCloud: accepts a n x (3+k) array, where k is the # of properties
     * VolumeGrid: accepts a triple (bmin,bmax,array)
@@ -155,8 +158,7 @@ def from_numpy(obj,type='auto',template=None):
         return so3.from_matrix(obj)
     elif type == 'Trajectory':
         assert len(obj)==2,"Trajectory format is (times,milestones)"
-        times = obj[0].tolist()
-        milestones = obj[1].tolist()
+        times,milestones = obj
         if template is not None:
             return template.constructor()(times,milestones)
         from klampt.model.trajectory import Trajectory
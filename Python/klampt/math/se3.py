@@ -19,6 +19,10 @@ To flatten into a single array, use ``klampt.model.getConfig(T)``, which is
 equivalent to ``T[0] + T[1]``.  To read and write to disk in a way that is
 compatible with  other Klamp't IO routines, use ``klampt.io.loader.writeSe3()``
 and ``klampt.io.loader.readSe3()``.
+
+Many functions also accept N x 12 numpy arrays of flattened transforms
+(R + t), in which case they dispatch to the vectorized versions in
+:mod:`klampt.math.se3_batch` and return arrays.
 """
 
 from . import vectorops
@@ -30,6 +34,9 @@ def identity():
 
 def inv(T):
     """Returns the inverse of the transformation."""
+    if so3._is_batch(T):
+        from . import se3_batch
+        return se3_batch.inv(T)
     (R,t) = T
     Rinv = so3.inv(R)
     tinv = [-Rinv[0]*t[0]-Rinv[3]*t[1]-Rinv[6]*t[2],
@@ -39,6 +46,9 @@ def inv(T):
 
 def apply(T,point):
     """Applies the transform T to the given point"""
+    if so3._is_batch(T) or so3._is_batch(point):
+        from . import se3_batch
+        return se3_batch.apply(T,point)
     return vectorops.add(apply_rotation(T,point),T[1])
 
 def apply_rotation(T,point):
@@ -80,6 +90,9 @@ def from_homogeneous(mat):
 
 def mul(T1,T2):
     """Composes two transformations."""
+    if so3._is_batch(T1) or so3._is_batch(T2):
+        from . import se3_batch
+        return se3_batch.mul(T1,T2)
     (R1,t1) = T1
     (R2,t2) = T2
     R = so3.mul(R1,R2)
@@ -90,6 +103,9 @@ def distance(T1,T2,Rweight=1.0,tweight=1.0):
     """Returns a distance metric between the two transformations. The
     rotation distance is weighted by Rweight and the translation distance
     is weighted by tweight"""
+    if so3._is_batch(T1) or so3._is_batch(T2):
+        from . import se3_batch
+        return se3_batch.distance(T1,T2,Rweight,tweight)
     (R1,t1)=T1
     (R2,t2)=T2
     return Rweight*so3.distance(R1,R2) + tweight*vectorops.distance(t1,t2)
@@ -97,13 +113,19 @@ def distance(T1,T2,Rweight=1.0,tweight=1.0):
 def error(T1,T2):
     """Returns a 6D "difference vector" that describes how far T1 is from T2.
     More precisely, this is the Lie derivative (w,v)."""
+    if so3._is_batch(T1) or so3._is_batch(T2):
+        from . import se3_batch
+        return se3_batch.error(T1,T2)
     (R1,t1)=T1
     (R2,t2)=T2
     #concatenate lists
-    return so3.error(R1,R2) + vectorops.sub(t1,t2)
+    return list(so3.error(R1,R2)) + list(vectorops.sub(t1,t2))
 
 def interpolate(T1,T2,u):
     """Interpolate linearly between the two transformations T1 and T2."""
+    if so3._is_batch(T1) or so3._is_batch(T2):
+        from . import se3_batch
+        return se3_batch.interpolate(T1,T2,u)
     return (so3.interpolate(T1[0],T2[0],u),vectorops.interpolate(T1[1],T2[1],u))
 
 def interpolator(T1,T2):
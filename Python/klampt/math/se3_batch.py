@@ -0,0 +1,69 @@
+"""Vectorized versions of the :mod:`klampt.math.se3` operations, which work
+on N x 12 numpy arrays whose rows are flattened rigid transforms R + t,
+where R is in the column-major form of so3.  Points are N x 3 arrays.
+
+Single transforms, given as 12-lists or (R,t) pairs, are broadcast against
+batches.
+
+The functions in :mod:`klampt.math.se3` dispatch to this module when given
+2D arrays.
+
+Requires numpy.
+"""
+
+import numpy as np
+from . import so3_batch
+
+def _rows(T):
+    """Returns T as an N x 12 array"""
+    if isinstance(T,tuple) and len(T) == 2:
+        T = list(T[0]) + list(T[1])
+    return np.asarray(T,dtype=float).reshape((-1,12))
+
+def identity(n=1):
+    """Returns n identity transforms"""
+    return np.tile([1.,0.,0.,0.,1.,0.,0.,0.,1.,0.,0.,0.],(n,1))
+
+def inv(T):
+    """Returns the inverses of the transforms."""
+    T = _rows(T)
+    Rinv = so3_batch.inv(T[:,:9])
+    return np.hstack((Rinv,-so3_batch.apply(Rinv,T[:,9:])))
+
+def apply(T,point):
+    """Applies the transforms to the points"""
+    T = _rows(T)
+    return so3_batch.apply(T[:,:9],point) + T[:,9:]
+
+def apply_rotation(T,point):
+    """Applies only the rotation parts of the transforms to the points"""
+    return so3_batch.apply(_rows(T)[:,:9],point)
+
+def mul(T1,T2):
+    """Composes the transforms."""
+    T1 = _rows(T1)
+    T2 = _rows(T2)
+    return np.hstack((so3_batch.mul(T1[:,:9],T2[:,:9]),so3_batch.apply(T1[:,:9],T2[:,9:]) + T1[:,9:]))
+
+def distance(T1,T2,Rweight=1.0,tweight=1.0):
+    """Returns the distances between the transforms, see
+    :func:`se3.distance`."""
+    T1 = _rows(T1)
+    T2 = _rows(T2)
+    return Rweight*so3_batch.distance(T1[:,:9],T2[:,:9]) + tweight*np.linalg.norm(T1[:,9:]-T2[:,9:],axis=1)
+
+def error(T1,T2):
+    """Returns the N x 6 Lie derivatives (w,v) of T1 relative to T2, see
+    :func:`se3.error`."""
+    T1 = _rows(T1)
+    T2 = _rows(T2)
+    return np.hstack((so3_batch.error(T1[:,:9],T2[:,:9]),T1[:,9:]-T2[:,9:]))
+
+def interpolate(T1,T2,u):
+    """Interpolates linearly between the transforms T1 and T2.  u may be a
+    scalar or a length-N array."""
+    T1 = _rows(T1)
+    T2 = _rows(T2)
+    R = so3_batch.interpolate(T1[:,:9],T2[:,:9],u)
+    u = np.asarray(u,dtype=float).reshape((-1,1))
+    return np.hstack((R,T1[:,9:] + u*(T2[:,9:]-T1[:,9:])))
@@ -13,11 +13,19 @@ Klamp't represents the matrix as a list [a11,a21,a31,a12,a22,a32,a13,a23,a33].
 The reasons for this representation are 1) simplicity, and 2) a more
 convenient interface with C code.
 
+Many functions also accept N x 9 numpy arrays of rotations (and N x 3 arrays
+of points), in which case they dispatch to the vectorized versions in
+:mod:`klampt.math.so3_batch` and return arrays.
+
 """
 
 import math
 from . import vectorops
 
+def _is_batch(x):
+    """Returns True if x is a 2D array, i.e., a batch of elements"""
+    return getattr(x,'ndim',None) == 2
+
 def __str__(R):
     """Converts a rotation to a string."""
     return '\n'.join([' '.join([str(ri) for ri in r]) for r in matrix(R)])
@@ -28,11 +36,17 @@ def identity():
 
 def inv(R):
     """Inverts the rotation"""
+    if _is_batch(R):
+        from . import so3_batch
+        return so3_batch.inv(R)
     Rinv = [R[0],R[3],R[6],R[1],R[4],R[7],R[2],R[5],R[8]]
     return Rinv
 
 def apply(R,point):
     """Applies the rotation to a point"""
+    if _is_batch(R) or _is_batch(point):
+        from . import so3_batch
+        return so3_batch.apply(R,point)
     return (R[0]*point[0]+R[3]*point[1]+R[6]*point[2],
             R[1]*point[0]+R[4]*point[1]+R[7]*point[2],
             R[2]*point[0]+R[5]*point[1]+R[8]*point[2])
@@ -50,6 +64,9 @@ def from_matrix(mat):
 
 def mul(R1,R2):
     """Multiplies two rotations."""
+    if _is_batch(R1) or _is_batch(R2):
+        from . import so3_batch
+        return so3_batch.mul(R1,R2)
     m1=matrix(R1)
     m2T=matrix(inv(R2))
     mres = matrix(identity())
@@ -71,6 +88,9 @@ def angle(R):
 def rpy(R):
     """Converts a rotation matrix to a roll,pitch,yaw angle triple.
     The result is given in radians."""
+    if _is_batch(R):
+        from . import so3_batch
+        return so3_batch.rpy(R)
     sign = lambda x: 1 if x > 0 else (-1 if x < 0 else 0)
 
     m = matrix(R)
@@ -115,6 +135,9 @@ def rotation_vector(R):
     """Returns the rotation vector w (exponential map) representation of R such
     that e^[w] = R.  Equivalent to axis-angle representation with
     w/||w||=axis, ||w||=angle."""
+    if _is_batch(R):
+        from . import so3_batch
+        return so3_batch.rotation_vector(R)
     theta = angle(R)
     if abs(theta-math.pi)<0.5:
         #for values close to pi this alternate technique has better numerical
@@ -186,6 +209,9 @@ def from_axis_angle(aa):
 
 def from_rotation_vector(w):
     """Converts a rotation vector representation w to a 3D rotation matrix."""
+    if _is_batch(w):
+        from . import so3_batch
+        return so3_batch.from_rotation_vector(w)
     length = vectorops.norm(w)
     if length < 1e-7: return identity()
     return rotation(vectorops.mul(w,1.0/length),length)
@@ -197,6 +223,9 @@ from_moment = from_rotation_vector
 def from_quaternion(q):
     """Given a unit quaternion (w,x,y,z), produce the corresponding rotation
     matrix."""
+    if _is_batch(q):
+        from . import so3_batch
+        return so3_batch.from_quaternion(q)
     w,x,y,z = q
     x2 = x + x; y2 = y + y; z2 = z + z;
     xx = x * x2;   xy = x * y2;   xz = x * z2;
@@ -217,6 +246,9 @@ def from_quaternion(q):
 def quaternion(R):
     """Given a Klamp't rotation representation, produces the corresponding
     unit quaternion (w,x,y,z)."""
+    if _is_batch(R):
+        from . import so3_batch
+        return so3_batch.quaternion(R)
     tr = trace(R) + 1.0;
     a11,a21,a31,a12,a22,a32,a13,a23,a33 = R
 
@@ -257,6 +289,9 @@ def quaternion(R):
 def distance(R1,R2):
     """Returns the absolute angle one would need to rotate in order to get
     from R1 to R2"""
+    if _is_batch(R1) or _is_batch(R2):
+        from . import so3_batch
+        return so3_batch.distance(R1,R2)
     R = mul(R1,inv(R2))
     return angle(R)
 
@@ -268,6 +303,9 @@ def error(R1,R2):
     Fun fact: this is related to the derivative of interpolate(R2,R1,u) at u=0
     by d/du interpolate(R2,R1,0) = mul(error(R1,R2),R2).
     """
+    if _is_batch(R1) or _is_batch(R2):
+        from . import so3_batch
+        return so3_batch.error(R1,R2)
     R = mul(R1,inv(R2))
     return moment(R)
 
@@ -351,6 +389,9 @@ def vector_rotation(v1,v2):
 
 def interpolate(R1,R2,u):
     """Interpolate linearly between the two rotations R1 and R2. """
+    if _is_batch(R1) or _is_batch(R2):
+        from . import so3_batch
+        return so3_batch.interpolate(R1,R2,u)
     R = mul(inv(R1),R2)
     m = moment(R)
     angle = vectorops.norm(m)
@@ -0,0 +1,168 @@
+"""Vectorized versions of the :mod:`klampt.math.so3` operations, which work
+on N x 9 numpy arrays whose rows are rotations in the same column-major
+form as so3.  Points and rotation vectors are N x 3 arrays, and quaternions
+are N x 4 arrays in (w,x,y,z) order.
+
+Single so3 elements (9-lists) and points are broadcast against batches, so
+for example ``apply(R,pts)`` rotates all rows of ``pts`` by R.
+
+The functions in :mod:`klampt.math.so3` dispatch to this module when given
+2D arrays.
+
+Requires numpy.
+"""
+
+import math
+import numpy as np
+
+def _rows(x,n):
+    """Returns x as an N x n array"""
+    return np.asarray(x,dtype=float).reshape((-1,n))
+
+def identity(n=1):
+    """Returns n identity rotations"""
+    return np.tile([1.,0.,0.,0.,1.,0.,0.,0.,1.],(n,1))
+
+def inv(R):
+    """Inverts the rotations"""
+    return _rows(R,9).reshape((-1,3,3)).transpose((0,2,1)).reshape((-1,9))
+
+def mul(R1,R2):
+    """Multiplies the rotations"""
+    #the row-major interpretation of each column-major row is its transpose
+    return np.matmul(_rows(R2,9).reshape((-1,3,3)),_rows(R1,9).reshape((-1,3,3))).reshape((-1,9))
+
+def apply(R,point):
+    """Applies the rotations to the points"""
+    return np.matmul(_rows(point,3)[:,np.newaxis,:],_rows(R,9).reshape((-1,3,3)))[:,0,:]
+
+def trace(R):
+    """Computes the traces of the rotation matrices."""
+    R = _rows(R,9)
+    return R[:,0]+R[:,4]+R[:,8]
+
+def angle(R):
+    """Returns the absolute deviations of the rotations from identity"""
+    return np.arccos(np.clip((trace(R)-1.0)*0.5,-1.0,1.0))
+
+def cross_product(w):
+    """Returns the cross product matrices associated with the rows of w"""
+    w = _rows(w,3)
+    z = np.zeros(len(w))
+    return np.column_stack((z,w[:,2],-w[:,1],-w[:,2],z,w[:,0],w[:,1],-w[:,0],z))
+
+def deskew(R):
+    """Returns representations w of (R-R^T)/2 such that
+    (R-R^T)/2 = cross_product(w)"""
+    R = _rows(R,9)
+    return 0.5*np.column_stack((R[:,5]-R[:,7],R[:,6]-R[:,2],R[:,1]-R[:,3]))
+
+def rotation_vector(R):
+    """Returns the rotation vectors w (exponential map) of the rotations
+    such that e^[w] = R."""
+    from . import so3
+    R = _rows(R,9)
+    theta = angle(R)
+    w = deskew(R)
+    scale = np.ones(len(R))
+    nz = np.abs(theta) > 1e-5
+    scale[nz] = theta[nz]/np.sin(theta[nz])
+    w *= scale[:,np.newaxis]
+    #close to pi, recover the axis from the diagonal, with signs from the
+    #antisymmetric part
+    nearpi = np.abs(theta-math.pi) < 0.5
+    if np.any(nearpi):
+        Rn = R[nearpi]
+        tn = theta[nearpi]
+        c = np.cos(tn)[:,np.newaxis]
+        wn = tn[:,np.newaxis]*np.sqrt(np.maximum((Rn[:,[0,4,8]]-c)/(1.0-c),0.0))
+        eps = (tn-math.pi)[:,np.newaxis]
+        flip = eps*np.column_stack((Rn[:,5]-Rn[:,7],Rn[:,6]-Rn[:,2],Rn[:,1]-Rn[:,3])) > 0
+        wn[flip] *= -1
+        w[nearpi] = wn
+        #signs are ambiguous at pi, use the list version's disambiguation
+        for i in np.nonzero(np.abs(theta-math.pi) < 1e-5)[0]:
+            w[i] = so3.rotation_vector(R[i].tolist())
+    return w
+
+moment = rotation_vector
+
+def from_rotation_vector(w):
+    """Converts rotation vectors to rotations."""
+    w = _rows(w,3)
+    theta = np.linalg.norm(w,axis=1)
+    R = identity(len(w))
+    nz = theta >= 1e-7
+    axis = w[nz]/theta[nz,np.newaxis]
+    c = np.cos(theta[nz])
+    s = np.sin(theta[nz])
+    Rnz = ((1.0-c)[:,np.newaxis,np.newaxis]*axis[:,:,np.newaxis]*axis[:,np.newaxis,:]).reshape((-1,9))
+    Rnz[:,[0,4,8]] += c[:,np.newaxis]
+    Rnz += s[:,np.newaxis]*cross_product(axis)
+    R[nz] = Rnz
+    return R
+
+from_moment = from_rotation_vector
+
+def from_quaternion(q):
+    """Converts unit quaternions (w,x,y,z) to rotations."""
+    q = _rows(q,4)
+    w,x,y,z = q[:,0],q[:,1],q[:,2],q[:,3]
+    xx,xy,xz = 2*x*x,2*x*y,2*x*z
+    yy,yz,zz = 2*y*y,2*y*z,2*z*z
+    wx,wy,wz = 2*w*x,2*w*y,2*w*z
+    return np.column_stack((1.0-(yy+zz),xy+wz,xz-wy,
+                            xy-wz,1.0-(xx+zz),yz+wx,
+                            xz+wy,yz-wx,1.0-(xx+yy)))
+
+def quaternion(R):
+    """Converts rotations to unit quaternions (w,x,y,z)."""
+    from . import so3
+    R = _rows(R,9)
+    tr = trace(R) + 1.0
+    q = np.zeros((len(R),4))
+    ok = tr > 1e-5
+    s = np.sqrt(tr[ok])
+    Rok = R[ok]
+    q[ok,0] = s*0.5
+    q[ok,1:] = (Rok[:,[5,6,1]] - Rok[:,[7,2,3]])*(0.5/s)[:,np.newaxis]
+    q[ok] /= np.linalg.norm(q[ok],axis=1)[:,np.newaxis]
+    #180 degree rotations are rare, use the list version
+    for i in np.nonzero(~ok)[0]:
+        q[i] = so3.quaternion(R[i].tolist())
+    return q
+
+def rpy(R):
+    """Converts rotations to roll,pitch,yaw angle triples, in radians."""
+    R = _rows(R,9)
+    b = -np.arcsin(np.clip(R[:,2],-1.0,1.0))
+    cb = np.cos(b)
+    a = np.empty(len(R))
+    c = np.zeros(len(R))
+    reg = np.abs(cb) > 1e-7
+    cbr = cb[reg]
+    ca = np.arccos(np.clip(R[reg,0]/cbr,-1.0,1.0))
+    a[reg] = np.where(np.sign(R[reg,1]) == np.sign(cbr),ca,2*math.pi-ca)
+    cc = np.arccos(np.clip(R[reg,8]/cbr,-1.0,1.0))
+    c[reg] = np.where(np.sign(R[reg,5]) == np.sign(cbr),cc,2*math.pi-cc)
+    #b is close to 90 degrees, so c can be set to 0
+    sing = ~reg
+    asing = -np.arcsin(np.clip(R[sing,3],-1.0,1.0))
+    a[sing] = np.where(np.sign(np.cos(asing)) != np.sign(R[sing,4]),math.pi-asing,asing)
+    return np.column_stack((c,b,a))
+
+def distance(R1,R2):
+    """Returns the absolute angles one would need to rotate in order to get
+    from R1 to R2"""
+    return angle(mul(R1,inv(R2)))
+
+def error(R1,R2):
+    """Returns the rotation vectors of R1*R2^T, see :func:`so3.error`."""
+    return rotation_vector(mul(R1,inv(R2)))
+
+def interpolate(R1,R2,u):
+    """Interpolates linearly between the rotations R1 and R2.  u may be a
+    scalar or a length-N array."""
+    m = rotation_vector(mul(inv(R1),R2))
+    u = np.asarray(u,dtype=float).reshape((-1,1))
+    return mul(R1,from_rotation_vector(m*u))
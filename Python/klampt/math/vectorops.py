@@ -1,7 +1,49 @@
-"""Allows treating tuples/lists as vectors"""
+"""Allows treating tuples/lists as vectors
+
+Numpy arrays are also accepted.  If any argument is a numpy array, the
+operation is performed by numpy and the result is an array.  Calling
+``set_backend('numpy')`` makes all operations use numpy, in which case
+list / tuple arguments still produce list results.  Numpy is faster for
+long vectors but slower for short ones; ``tests/benchmark_vectorops.py``
+reports the crossover dimension of each operation.
+"""
 
 import math
 
+_LISTTYPES = frozenset([list,tuple])
+_LISTORSCALARTYPES = frozenset([list,tuple,float,int])
+_numpy = None  #the numpy module, when the numpy backend is active
+
+def set_backend(backend):
+    """Sets the backend used for list / tuple arguments: either 'list'
+    (the default, pure Python) or 'numpy'."""
+    global _numpy
+    if backend == 'list':
+        _numpy = None
+    elif backend == 'numpy':
+        import numpy
+        _numpy = numpy
+    else:
+        raise ValueError("Invalid backend "+str(backend)+", must be 'list' or 'numpy'")
+
+def get_backend():
+    """Returns the current backend, 'list' or 'numpy'."""
+    return 'list' if _numpy is None else 'numpy'
+
+def _numpy_args(*items):
+    """Returns (numpy,is_array) if the numpy versions should be used for the
+    given arguments, where is_array is True if any of them is an array with
+    at least one dimension.  Otherwise returns (None,False).  Numpy scalars
+    are treated like Python scalars."""
+    for v in items:
+        if getattr(v,'ndim',0) >= 1 and hasattr(v,'__array_interface__'):
+            import numpy
+            return numpy,True
+    return _numpy,False
+
+def _result(res,is_array):
+    return res if is_array else res.tolist()
+
 def add(*items):
     """Adds one or more vectors."""
     if len(items) == 0: return 0
@@ -9,16 +51,33 @@ def add(*items):
     for v in items:
         if n!=len(v):
             raise RuntimeError('Vector dimensions not equal')
+    if _numpy is not None or any(v.__class__ not in _LISTTYPES for v in items):
+        np,is_array = _numpy_args(*items)
+        if np is not None:
+            res = np.array(items[0],dtype=float)
+            for v in items[1:]:
+                res += v
+            return _result(res,is_array)
     return [sum([v[i] for v in items]) for i in range(n)]
 
 def madd(a,b,c):
     """Return a+c*b where a and b are vectors."""
     if len(a)!=len(b):
         raise RuntimeError('Vector dimensions not equal')
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            return _result(np.add(a,np.multiply(b,c)),is_array)
     return [ai+c*bi for ai,bi in zip(a,b)]
 
 def sub(a,b):
     """Subtract a vector b from a, or subtract a scalar"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTORSCALARTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            if hasattr(b,'__iter__') and len(a)!=len(b):
+                raise RuntimeError('Vector dimensions not equal')
+            return _result(np.subtract(a,b),is_array)
     if hasattr(b,'__iter__'):
         if len(a)!=len(b):
             raise RuntimeError('Vector dimensions not equal')
@@ -29,6 +88,12 @@ def sub(a,b):
 def mul(a,b):
     """Multiply a vector either elementwise with another vector, or with a
     scalar."""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTORSCALARTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            if hasattr(b,'__iter__') and len(a)!=len(b):
+                raise RuntimeError('Vector dimensions not equal')
+            return _result(np.multiply(a,b),is_array)
     if hasattr(b,'__iter__'):
         if len(a)!=len(b):
             raise RuntimeError('Vector dimensions not equal')
@@ -38,6 +103,12 @@ def mul(a,b):
 
 def div(a,b):
     """Elementwise division with another vector, or with a scalar."""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTORSCALARTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            if hasattr(b,'__iter__') and len(a)!=len(b):
+                raise RuntimeError('Vector dimensions not equal')
+            return _result(np.true_divide(a,b),is_array)
     if hasattr(b,'__iter__'):
         if len(a)!=len(b):
             raise RuntimeError('Vector dimensions not equal')
@@ -47,6 +118,10 @@ def div(a,b):
 
 def maximum(a,b):
     """Elementwise max"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTORSCALARTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            return _result(np.maximum(a,b),is_array)
     if hasattr(b,'__iter__'):
         return [max(ai,bi) for ai,bi in zip(a,b)]
     else:
@@ -54,6 +129,10 @@ def maximum(a,b):
 
 def minimum(a,b):
     """Elementwise min"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTORSCALARTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            return _result(np.minimum(a,b),is_array)
     if hasattr(b,'__iter__'):
         return [min(ai,bi) for ai,bi in zip(a,b)]
     else:
@@ -63,10 +142,19 @@ def dot(a,b):
     """Dot product."""
     if len(a)!=len(b):
         raise RuntimeError('Vector dimensions not equal')
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            return float(np.dot(a,b))
     return sum([a[i]*b[i] for i in range(len(a))])
 
 def normSquared(a):
     """Returns the norm of a, squared."""
+    if _numpy is not None or a.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a)
+        if np is not None:
+            a = np.asarray(a)
+            return float(np.dot(a,a))
     return sum(ai*ai for ai in a)
 
 def norm(a):
@@ -79,21 +167,34 @@ def unit(a,epsilon=1e-5):
     n = norm(a)
     if n > epsilon:
         return mul(a,1.0/n)
-    return a[:]
+    return a[:] if not hasattr(a,'copy') else a.copy()
 
 norm_L2 = norm
 
 def norm_L1(a):
     """L1 norm"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a)
+        if np is not None:
+            return float(np.sum(np.abs(a)))
     return sum(abs(ai) for ai in a)
 
 def norm_Linf(a):
     """L-infinity norm"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a)
+        if np is not None:
+            return float(np.max(np.abs(a)))
     return max(abs(ai) for ai in a)
 
 def distanceSquared(a,b):
     """Squared L2 distance"""
     if len(a)!=len(b): raise RuntimeError('Vector dimensions not equal')
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            d = np.subtract(a,b)
+            return float(np.dot(d,d))
     sum=0
     for i in range(len(a)):
         sum = sum + (a[i]-b[i])*(a[i]-b[i])
@@ -116,4 +217,9 @@ def cross(a,b):
 
 def interpolate(a,b,u):
     """Linear interpolation between a and b"""
+    if _numpy is not None or a.__class__ not in _LISTTYPES or b.__class__ not in _LISTTYPES:
+        np,is_array = _numpy_args(a,b)
+        if np is not None:
+            a = np.asarray(a,dtype=float)
+            return _result(a + u*(np.asarray(b)-a),is_array)
     return madd(a,sub(b,a),u)
@@ -1,17 +1,30 @@
 """Functions and classes for managing collision tests between multiple objects.
 
 This module defines the :class:`WorldCollider` class, which makes it easy to
-ignore various collision pairs in a WorldModel.
+ignore various collision pairs in a WorldModel.  Its broad phase is a
+:class:`SweepAndPrune` structure that is updated incrementally as objects
+move.
 
 For groups of objects, the :meth:`self_collision_iter` and
 :meth:`group_collision_iter` functions perform broad-phase collision detection
 to speed up collision testing.
 
 The :meth:`ray_cast` function is a convenient way to return the first point of
-intersection for a ray and a group of objects.
+intersection for a ray and a group of objects, and :meth:`ray_cast_batch`
+does the same for many rays at once.
+
+The :meth:`prune_self_collisions` function disables robot self-collision pairs
+that never (or always) collide, and caches the result on disk.
+
+The :class:`RobotSphereModel` class approximates robot links by spheres for
+fast, conservative checking of many configurations at once.
 """
 
 
+import os
+import json
+import hashlib
+import warnings
 from ..robotsim import *
 from ..math import vectorops,se3
 
@@ -53,6 +66,65 @@ def bb_union(*bbs):
     return [min(x) for x in zip(*[b[0] for b in bbs])],[max(x) for x in zip(*[b[1] for b in bbs])]
 
 
+class SweepAndPrune:
+    """Broad phase collision detection for a set of bounding boxes using the
+    sort-and-sweep method along the x axis.
+
+    The sorted order is kept between queries, so when only a few boxes move
+    re-sorting is nearly linear, and finding the overlapping pairs takes
+    O(n + k) time where k is the number of pairs overlapping along x.
+
+    Attributes:
+        bbs (list): the (bmin,bmax) bounding boxes.
+    """
+    def __init__(self,bblist=()):
+        self.bbs = list(bblist)
+        self._order = list(range(len(self.bbs)))
+        self._sorted = False
+
+    def add(self,bb):
+        """Adds a bounding box and returns its index."""
+        self.bbs.append(bb)
+        self._order.append(len(self.bbs)-1)
+        self._sorted = False
+        return len(self.bbs)-1
+
+    def update(self,index,bb):
+        """Sets the bounding box of the given index."""
+        self.bbs[index] = bb
+        self._sorted = False
+
+    def overlaps(self,active=None):
+        """Returns the list of all index pairs (i,j), i < j, whose bounding
+        boxes intersect.
+
+        Args:
+            active (list of bool, optional): if given, only the indices
+                i with active[i] = True are considered.
+        """
+        bbs = self.bbs
+        if not self._sorted:
+            #nearly sorted lists are sorted in close to linear time
+            self._order.sort(key=lambda i:bbs[i][0][0])
+            self._sorted = True
+        res = []
+        sweep = []
+        for i in self._order:
+            if active is not None and not active[i]: continue
+            bmin,bmax = bbs[i]
+            x = bmin[0]
+            remaining = []
+            for j in sweep:
+                bjmin,bjmax = bbs[j]
+                if bjmax[0] < x: continue
+                remaining.append(j)
+                if bjmin[1] <= bmax[1] and bmin[1] <= bjmax[1] and bjmin[2] <= bmax[2] and bmin[2] <= bjmax[2]:
+                    res.append((j,i) if j < i else (i,j))
+            remaining.append(i)
+            sweep = remaining
+        return res
+
+
 def self_collision_iter(geomlist,pairs='all'):
     """Performs efficient self collision testing for a list of geometries.
 
@@ -222,6 +294,542 @@ def ray_cast(geomlist,s,d):
     return res
 
 
+_ray_cast_batch_state = None
+
+def _ray_cast_batch(geomlist,bbs,s,d):
+    """Casts the rays with N x 3 source and unit direction arrays s and d.
+    Geometries are tested in order of the distance at which each ray enters
+    their bounding boxes, and testing stops once a hit is closer than the
+    next bounding box."""
+    import numpy as np
+    dist = np.full(len(s),np.inf)
+    index = np.full(len(s),-1,dtype=int)
+    if len(geomlist) == 0:
+        return dist,index
+    bmin = np.array([bb[0] for bb in bbs],dtype=float)
+    bmax = np.array([bb[1] for bb in bbs],dtype=float)
+    nonempty = np.all(bmin <= bmax,axis=1)
+    #limit the size of the rays x geometries arrays
+    chunk = max(1,100000//len(geomlist))
+    for start in range(0,len(s),chunk):
+        sc = s[start:start+chunk,np.newaxis,:]
+        dc = d[start:start+chunk,np.newaxis,:]
+        #slab test
+        with np.errstate(divide='ignore',invalid='ignore'):
+            t1 = (bmin-sc)/dc
+            t2 = (bmax-sc)/dc
+        tlo = np.minimum(t1,t2)
+        thi = np.maximum(t1,t2)
+        parallel = (dc == 0)
+        if np.any(parallel):
+            inside = (bmin <= sc) & (sc <= bmax)
+            tlo = np.where(parallel,np.where(inside,-np.inf,np.inf),tlo)
+            thi = np.where(parallel,np.where(inside,np.inf,-np.inf),thi)
+        tenter = np.maximum(tlo.max(axis=2),0.0)
+        texit = thi.min(axis=2)
+        hits = (tenter <= texit) & nonempty
+        for k in np.nonzero(hits.any(axis=1))[0]:
+            candidates = np.nonzero(hits[k])[0]
+            candidates = candidates[np.argsort(tenter[k,candidates])]
+            sk = s[start+k].tolist()
+            dk = d[start+k].tolist()
+            best = np.inf
+            for g in candidates.tolist():
+                if tenter[k,g] > best: break
+                (coll,pt) = geomlist[g].rayCast(sk,dk)
+                if coll:
+                    dg = vectorops.dot(dk,vectorops.sub(pt,sk))
+                    if dg < best:
+                        best = dg
+                        index[start+k] = g
+            dist[start+k] = best
+    return dist,index
+
+def _ray_cast_batch_worker(args):
+    geomlist,bbs = _ray_cast_batch_state
+    return _ray_cast_batch(geomlist,bbs,args[0],args[1])
+
+def ray_cast_batch(geomlist,s,d,processes=None,bblist=None):
+    """Finds the first collision among the geometries in geomlist for each
+    of many rays.  Each geometry is only tested against the rays that pass
+    through its bounding box, nearest boxes first.
+
+    Args:
+        geomlist (list of Geometry3D): the geometries
+        s (array-like): an N x 3 array of ray sources
+        d (array-like): an N x 3 array of ray directions.  These do not
+            need to be normalized.
+        processes (int, optional): if > 1, the rays are split among this
+            many worker processes, which inherit the geometries from this
+            process.  This requires the 'fork' start method of
+            multiprocessing.
+        bblist (list, optional): the bounding boxes of the geometries, if
+            already known.
+
+    Returns:
+        tuple: a pair (distances,indices) of length N arrays.  distances
+        gives the distance along each ray to its first hit, or inf if
+        nothing is hit, and indices gives the index of the hit geometry in
+        geomlist, or -1.
+    """
+    import numpy as np
+    global _ray_cast_batch_state
+    s = np.asarray(s,dtype=float).reshape((-1,3))
+    d = np.asarray(d,dtype=float).reshape((-1,3))
+    if len(s) != len(d):
+        raise ValueError("Must provide the same number of ray sources and directions")
+    d = d / np.linalg.norm(d,axis=1)[:,np.newaxis]
+    if bblist is None:
+        bblist = [g.getBB() for g in geomlist]
+    if processes is not None and processes > 1 and len(s) > processes:
+        import multiprocessing
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except ValueError:
+            warnings.warn("ray_cast_batch: 'fork' start method not available, running in a single process")
+            ctx = None
+        if ctx is not None:
+            #forked workers inherit the geometries
+            _ray_cast_batch_state = (geomlist,bblist)
+            try:
+                with ctx.Pool(processes) as pool:
+                    results = pool.map(_ray_cast_batch_worker,list(zip(np.array_split(s,processes*4),np.array_split(d,processes*4))))
+            finally:
+                _ray_cast_batch_state = None
+            return np.concatenate([r[0] for r in results]),np.concatenate([r[1] for r in results])
+    return _ray_cast_batch(geomlist,bblist,s,d)
+
+def _robot_hash(robot,robotFile=None):
+    """Returns a hash identifying the robot for the self-collision cache.
+    If robotFile is given, the hash is computed from its contents.
+    Otherwise, it is computed from the robot's links, joint limits, and
+    self-collision pairs.  In both cases, each link's parent transform and
+    geometry are also hashed, since the geometry files that a robot file
+    refers to may change."""
+    from ..io import loader
+    h = hashlib.sha1()
+    n = robot.numLinks()
+    if robotFile is not None:
+        with open(robotFile,'rb') as f:
+            h.update(f.read())
+    else:
+        desc = [robot.getName(),
+                [robot.link(i).getName() for i in range(n)],
+                [robot.link(i).getParent() for i in range(n)],
+                robot.getJointLimits(),
+                [(i,j) for i in range(n) for j in range(i) if robot.selfCollisionEnabled(i,j)]]
+        h.update(json.dumps(desc).encode('utf-8'))
+    for i in range(n):
+        link = robot.link(i)
+        h.update(json.dumps(link.getParentTransform()).encode('utf-8'))
+        geom = link.geometry()
+        if not geom.empty():
+            h.update(json.dumps(loader.toJson(geom,'Geometry3D')).encode('utf-8'))
+    return h.hexdigest()
+
+def prune_self_collisions(robot,numSamples=1000,robotFile=None,cacheDir='~/.klampt/cache',disable=True):
+    """Finds the enabled self-collision pairs of a robot that never collide
+    or always collide at random configurations within its joint limits,
+    and disables them.  This is the Python counterpart of the C++
+    RandomizedSelfCollisions routine.
+
+    Pairs that always collide are typically adjacent links whose geometries
+    overlap, and pairs that never collide are usually unable to touch, so
+    disabling them can greatly speed up :meth:`RobotModel.selfCollides` and
+    :meth:`WorldCollider.robotSelfCollisions`.  Since it is based on
+    sampling, a rarely colliding pair may be missed if numSamples is too
+    small.
+
+    Call this before constructing a :class:`WorldCollider` or a
+    :class:`~klampt.plan.robotcspace.RobotCSpace` for the robot.
+
+    Args:
+        robot (RobotModel): the robot.  Its configuration is restored
+            afterwards.
+        numSamples (int, optional): the number of configurations sampled.
+        robotFile (str, optional): the file the robot was loaded from.  If
+            given, the cache is keyed by a hash of its contents.  Otherwise
+            the key is computed from the robot's link names, parents, joint
+            limits, and enabled self-collision pairs.  The links' parent
+            transforms and geometries are hashed in both cases.
+        cacheDir (str, optional): a directory in which results are saved and
+            looked up, or None to disable caching.  Cached results computed
+            with at least numSamples samples are reused.
+        disable (bool, optional): if True, the pairs are disabled with
+            :meth:`RobotModel.enableSelfCollision`.
+
+    Returns:
+        tuple: a pair (never,always) of lists of (i,j) link index pairs.
+    """
+    n = robot.numLinks()
+    cacheFile = None
+    res = None
+    if cacheDir is not None:
+        cacheDir = os.path.expanduser(cacheDir)
+        cacheFile = os.path.join(cacheDir,'selfcollision_'+_robot_hash(robot,robotFile)+'.json')
+        if os.path.exists(cacheFile):
+            with open(cacheFile,'r') as f:
+                cached = json.load(f)
+            if cached['numSamples'] >= numSamples:
+                res = [tuple(p) for p in cached['never']],[tuple(p) for p in cached['always']]
+    if res is None:
+        geoms = [robot.link(i).geometry() for i in range(n)]
+        pairs = [(i,j) for i in range(n) for j in range(i)
+                 if robot.selfCollisionEnabled(i,j) and not geoms[i].empty() and not geoms[j].empty()]
+        #candidates that haven't collided yet / have collided every time
+        never = set(pairs)
+        always = set(pairs)
+        qorig = robot.getConfig()
+        try:
+            for sample in range(numSamples):
+                robot.randomizeConfig()
+                for (i,j) in list(never | always):
+                    if geoms[i].collides(geoms[j]):
+                        never.discard((i,j))
+                    else:
+                        always.discard((i,j))
+                if not never and not always:
+                    break
+        finally:
+            robot.setConfig(qorig)
+        res = sorted(never),sorted(always)
+        if cacheFile is not None:
+            if not os.path.exists(cacheDir):
+                os.makedirs(cacheDir)
+            with open(cacheFile,'w') as f:
+                json.dump({'numSamples':numSamples,'never':res[0],'always':res[1]},f)
+    if disable:
+        for (i,j) in res[0]+res[1]:
+            robot.enableSelfCollision(i,j,False)
+    return res
+
+
+def geometry_spheres(geom,radius=None,maxDepth=10):
+    """Computes a set of spheres covering a geometry's surface, in its local
+    coordinates.  The triangles of the geometry's mesh are split
+    recursively along the longest axis of their bounding box until each
+    group fits in a sphere of the given radius, and each group gives one
+    sphere containing all of its triangles.
+
+    Since the spheres cover the surface, two geometries cannot collide
+    unless their spheres overlap.
+
+    Args:
+        geom (Geometry3D): the geometry.  Non-mesh geometries are converted
+            to triangle meshes.
+        radius (float, optional): the target sphere radius.  By default,
+            1/4 of the radius of the sphere bounding the whole geometry.
+            Spheres may be larger if a single triangle doesn't fit.
+        maxDepth (int, optional): the maximum depth of splitting, so at
+            most 2^maxDepth spheres are produced.
+
+    Returns:
+        tuple: (centers,radii), an N x 3 array and a length N array.
+    """
+    import numpy as np
+    if geom.type() != 'TriangleMesh':
+        geom = geom.convert('TriangleMesh')
+    tm = geom.getTriangleMesh()
+    V = np.array(tm.vertices,dtype=float).reshape((-1,3))
+    tris = V[np.array(tm.indices,dtype=int).reshape((-1,3))]
+    if len(tris) == 0:
+        return np.zeros((0,3)),np.zeros(0)
+    def bound(group):
+        pts = tris[group].reshape((-1,3))
+        c = 0.5*(pts.min(axis=0)+pts.max(axis=0))
+        return c,np.sqrt(((pts-c)**2).sum(axis=1).max())
+    if radius is None:
+        radius = bound(np.arange(len(tris)))[1]*0.25
+    centroids = tris.mean(axis=1)
+    centers,radii = [],[]
+    stack = [(np.arange(len(tris)),0)]
+    while stack:
+        group,depth = stack.pop()
+        c,r = bound(group)
+        if r > radius and len(group) > 1 and depth < maxDepth:
+            gc = centroids[group]
+            axis = np.argmax(gc.max(axis=0)-gc.min(axis=0))
+            order = np.argsort(gc[:,axis],kind='stable')
+            half = len(group)//2
+            stack.append((group[order[:half]],depth+1))
+            stack.append((group[order[half:]],depth+1))
+        else:
+            centers.append(c)
+            radii.append(r)
+    return np.array(centers),np.array(radii)
+
+
+class RobotSphereModel:
+    """Approximates the links of a robot by spheres covering their
+    geometries (see :func:`geometry_spheres`), for fast conservative
+    collision checking of many configurations at once.
+
+    Self-collision and environment checks are vectorized over
+    configurations.  Each link also has a bounding sphere, which is checked
+    before its individual spheres.  :meth:`collisions` falls back to exact
+    Geometry3D collision checks only for the links whose spheres overlap.
+
+    Sphere sets are cached on disk, keyed by the robot hash used by
+    :func:`prune_self_collisions`.
+
+    Attributes:
+        robot (RobotModel): the robot
+        links (list of int): the indices of links with spheres
+        centers (list of arrays): the k x 3 local sphere centers of each
+            link in links
+        radii (list of arrays): the length k sphere radii of each link in
+            links
+        selfPairs (list of pairs): the (a,b) indices into links of the
+            link pairs with self-collision enabled.
+    """
+    def __init__(self,robot,radius=None,robotFile=None,cacheDir='~/.klampt/cache'):
+        """
+        Args:
+            robot (RobotModel): the robot
+            radius (float, optional): the target sphere radius, see
+                :func:`geometry_spheres`.
+            robotFile (str, optional): the file the robot was loaded from,
+                used for the cache key.
+            cacheDir (str, optional): a directory in which sphere sets are
+                saved and looked up, or None to disable caching.
+        """
+        import numpy as np
+        self.robot = robot
+        n = robot.numLinks()
+        cacheFile = None
+        loaded = False
+        if cacheDir is not None:
+            cacheDir = os.path.expanduser(cacheDir)
+            key = _robot_hash(robot,robotFile)+'_'+repr(None if radius is None else float(radius))
+            cacheFile = os.path.join(cacheDir,'spheres_'+hashlib.sha1(key.encode('utf-8')).hexdigest()+'.npz')
+            if os.path.exists(cacheFile):
+                with np.load(cacheFile) as data:
+                    counts = data['counts']
+                    splits = np.cumsum(counts)[:-1]
+                    self.links = data['links'].tolist()
+                    self.centers = np.split(data['centers'],splits)
+                    self.radii = np.split(data['radii'],splits)
+                loaded = True
+        if not loaded:
+            self.links,self.centers,self.radii = [],[],[]
+            for i in range(n):
+                g = robot.link(i).geometry()
+                if g.empty(): continue
+                c,r = geometry_spheres(g,radius)
+                if len(r) == 0: continue
+                self.links.append(i)
+                self.centers.append(c)
+                self.radii.append(r)
+            if cacheFile is not None:
+                if not os.path.exists(cacheDir):
+                    os.makedirs(cacheDir)
+                np.savez(cacheFile,links=np.array(self.links,dtype=int),counts=np.array([len(r) for r in self.radii],dtype=int),
+                         centers=np.concatenate(self.centers) if self.links else np.zeros((0,3)),
+                         radii=np.concatenate(self.radii) if self.links else np.zeros(0))
+        #bounding spheres of each link's spheres
+        self._rootCenters = np.array([0.5*((c-r[:,np.newaxis]).min(axis=0)+(c+r[:,np.newaxis]).max(axis=0)) for (c,r) in zip(self.centers,self.radii)]).reshape((-1,3))
+        self._rootRadii = np.array([(np.linalg.norm(c-rc,axis=1)+r).max() for (c,r,rc) in zip(self.centers,self.radii,self._rootCenters)])
+        self.selfPairs = [(a,b) for a in range(len(self.links)) for b in range(a)
+                          if robot.selfCollisionEnabled(self.links[a],self.links[b])]
+        #local obstacle spheres, indexed by WorldCollider geomList index
+        self._obstacleSpheres = {}
+
+    def sphere_centers(self,configs):
+        """Returns the world-space sphere centers at each configuration.
+
+        Args:
+            configs (array-like): an N x n array of configurations
+
+        Returns:
+            tuple: (centers,rootCenters), where centers is a list giving an
+            N x k x 3 array for each link, and rootCenters is an N x L x 3
+            array of the centers of the links' bounding spheres.
+        """
+        import numpy as np
+        from .trajectory import _link_transforms
+        configs = np.asarray(configs,dtype=float).reshape((-1,self.robot.numLinks()))
+        qorig = self.robot.getConfig()
+        try:
+            T = _link_transforms(self.robot,[self.robot.link(i) for i in self.links],configs)
+        finally:
+            self.robot.setConfig(qorig)
+        #row-major interpretation of column-major R is R^T
+        R = T[:,:,:9].reshape((len(self.links),len(configs),3,3))
+        t = T[:,:,9:]
+        centers = [np.matmul(c,R[i]) + t[i][:,np.newaxis,:] for i,c in enumerate(self.centers)]
+        roots = np.matmul(self._rootCenters[:,np.newaxis,np.newaxis,:],R)[:,:,0,:] + t
+        return centers,roots.transpose((1,0,2))
+
+    def self_overlaps(self,configs,margin=0):
+        """Returns the link pairs whose spheres overlap at each configuration.
+
+        Args:
+            configs (array-like): an N x n array of configurations
+            margin (float, optional): spheres closer than this are
+                considered overlapping.
+
+        Returns:
+            ndarray: an N x len(selfPairs) bool array, True where the link
+            pair's spheres overlap.
+        """
+        import numpy as np
+        centers,roots = self.sphere_centers(configs)
+        return self._self_overlaps(centers,roots,self.selfPairs,margin)
+
+    def _self_overlaps(self,centers,roots,pairs,margin):
+        import numpy as np
+        res = np.zeros((len(roots),len(pairs)),dtype=bool)
+        for p,(a,b) in enumerate(pairs):
+            cand = np.linalg.norm(roots[:,a]-roots[:,b],axis=1) < self._rootRadii[a] + self._rootRadii[b] + margin
+            if not np.any(cand): continue
+            d = np.linalg.norm(centers[a][cand][:,:,np.newaxis,:]-centers[b][cand][:,np.newaxis,:,:],axis=3)
+            d -= self.radii[a][:,np.newaxis] + self.radii[b][np.newaxis,:]
+            res[cand,p] = (d < margin).any(axis=(1,2))
+        return res
+
+    def environment_overlaps(self,configs,obstacles,margin=0):
+        """Returns the links whose spheres overlap obstacles at each
+        configuration.
+
+        Args:
+            configs (array-like): an N x n array of configurations
+            obstacles (list): the obstacles, each either a (centers,radii)
+                pair of world-space sphere arrays, or an object with a
+                distance(pts) method, like
+                :class:`~klampt.model.geometry.SignedDistanceField`.
+            margin (float, optional): spheres closer than this are
+                considered overlapping.
+
+        Returns:
+            ndarray: an N x len(links) x len(obstacles) bool array, True
+            where the link's spheres overlap the obstacle.
+        """
+        centers,roots = self.sphere_centers(configs)
+        return self._environment_overlaps(centers,roots,obstacles,margin)
+
+    def _environment_overlaps(self,centers,roots,obstacles,margin):
+        import numpy as np
+        res = np.zeros((len(roots),len(self.links),len(obstacles)),dtype=bool)
+        for o,obs in enumerate(obstacles):
+            if hasattr(obs,'distance'):
+                for a,c in enumerate(centers):
+                    d = obs.distance(c.reshape((-1,3))).reshape(c.shape[:2]) - self.radii[a]
+                    res[:,a,o] = (d < margin).any(axis=1)
+                continue
+            oc,orad = np.asarray(obs[0]).reshape((-1,3)),np.asarray(obs[1]).reshape(-1)
+            if len(orad) == 0: continue
+            obmin = (oc-orad[:,np.newaxis]).min(axis=0) - margin
+            obmax = (oc+orad[:,np.newaxis]).max(axis=0) + margin
+            for a,c in enumerate(centers):
+                #quick reject by the bounding spheres vs the obstacle's box
+                rc = roots[:,a]
+                cand = np.all((rc + self._rootRadii[a] >= obmin) & (rc - self._rootRadii[a] <= obmax),axis=1)
+                if not np.any(cand): continue
+                d = np.linalg.norm(c[cand][:,:,np.newaxis,:]-oc[np.newaxis,np.newaxis,:,:],axis=3)
+                d -= self.radii[a][:,np.newaxis] + orad[np.newaxis,:]
+                res[cand,a,o] = (d < margin).any(axis=(1,2))
+        return res
+
+    def collisions(self,configs,collider=None):
+        """Checks collisions of the robot at many configurations, using the
+        spheres as a broad phase.  Exact Geometry3D checks are only run on
+        pairs whose spheres overlap.
+
+        Args:
+            configs (array-like): an N x n array of configurations
+            collider (WorldCollider, optional): if given, the robot is
+                checked against the collider's terrains and rigid objects,
+                and the collider's collision mask is used.  Otherwise only
+                self-collisions are checked.
+
+        Returns:
+            ndarray: a length N bool array indicating which configurations
+            collide.
+        """
+        import numpy as np
+        configs = np.asarray(configs,dtype=float).reshape((-1,self.robot.numLinks()))
+        centers,roots = self.sphere_centers(configs)
+        geoms = [self.robot.link(i).geometry() for i in self.links]
+        selfPairs = self.selfPairs
+        #(link,geomList index) pairs to check against the environment
+        envPairs = []
+        if collider is not None:
+            rindices = collider.robots[self.robot.index]
+            selfPairs = [(a,b) for (a,b) in selfPairs if rindices[self.links[b]] in collider.mask[rindices[self.links[a]]]]
+            obstacles = [i for i in collider.terrains+collider.rigidObjects
+                         if i >= 0 and any(i in collider.mask[rindices[l]] for l in self.links)]
+            obstacleSpheres = []
+            for i in obstacles:
+                if i not in self._obstacleSpheres:
+                    self._obstacleSpheres[i] = geometry_spheres(collider.geomList[i][1])
+                c,r = self._obstacleSpheres[i]
+                R,t = collider.geomList[i][1].getCurrentTransform()
+                obstacleSpheres.append((c.dot(np.array(R).reshape((3,3)))+t,r))
+            envOverlaps = self._environment_overlaps(centers,roots,obstacleSpheres,0)
+            for a,l in enumerate(self.links):
+                for o,i in enumerate(obstacles):
+                    if i in collider.mask[rindices[l]]:
+                        envPairs.append((a,o,i))
+        selfOverlaps = self._self_overlaps(centers,roots,selfPairs,0)
+        candidates = selfOverlaps.any(axis=1)
+        if envPairs:
+            envOverlaps = envOverlaps[:,[a for (a,o,i) in envPairs],[o for (a,o,i) in envPairs]]
+            candidates |= envOverlaps.any(axis=1)
+        res = np.zeros(len(configs),dtype=bool)
+        if not np.any(candidates):
+            return res
+        qorig = self.robot.getConfig()
+        try:
+            for k in np.nonzero(candidates)[0]:
+                self.robot.setConfig(configs[k].tolist())
+                for p in np.nonzero(selfOverlaps[k])[0]:
+                    a,b = selfPairs[p]
+                    if geoms[a].collides(geoms[b]):
+                        res[k] = True
+                        break
+                if res[k] or not envPairs: continue
+                for p in np.nonzero(envOverlaps[k])[0]:
+                    a,o,i = envPairs[p]
+                    if geoms[a].collides(collider.geomList[i][1]):
+                        res[k] = True
+                        break
+        finally:
+            self.robot.setConfig(qorig)
+        return res
+
+
+_collisions_batch_state = None
+
+def _set_body_config(body,q):
+    if isinstance(body,RigidObjectModel):
+        body.setTransform(q[:9],q[9:])
+    else:
+        body.setConfig(q)
+
+def _collisions_batch(collider,body,configs,f1,f2,pairs,offset=0):
+    """Runs the collision tests of :meth:`WorldCollider.collisions_batch`
+    for the rows of configs, whose indices start at offset."""
+    import numpy as np
+    geomList = collider.geomList
+    res = ([] if pairs else np.zeros(len(configs),dtype=bool))
+    for k,q in enumerate(configs.tolist()):
+        _set_body_config(body,q)
+        for (i,j) in collider._collisionTestIndices(f1,f2):
+            if geomList[i][1].collides(geomList[j][1]):
+                if not pairs:
+                    res[k] = True
+                    break
+                res.append((k+offset,i,j))
+    if pairs:
+        return np.array(res,dtype=int).reshape((-1,3))
+    return res
+
+def _collisions_batch_worker(args):
+    offset,configs = args
+    collider,body,f1,f2,pairs = _collisions_batch_state
+    return _collisions_batch(collider,body,configs,f1,f2,pairs,offset)
+
+
 class WorldCollider:
     """
     Used in planning routines to mask out objects in the world to check /
@@ -255,6 +863,9 @@ class WorldCollider:
         self.world = world
         #a list of (object,geom) pairs
         self.geomList = []
+        #broad phase structure, and the transforms of its bounding boxes
+        self._broadphase = None
+        self._bbtransforms = []
         #self collision mask (2-D array)
         self.mask = []
         #indexing lists
@@ -339,6 +950,42 @@ class WorldCollider:
                         
         for i in ignore:
             self.ignoreCollision(i)
+
+    def _updateBroadPhase(self):
+        """Recomputes the bounding boxes of geometries whose transforms have
+        changed since the last call.
+
+        Returns:
+            SweepAndPrune: the broad phase structure, whose indices are
+            geomList indices.
+        """
+        if self._broadphase is None:
+            self._broadphase = SweepAndPrune([g.getBB() for (o,g) in self.geomList])
+            self._bbtransforms = [g.getCurrentTransform() for (o,g) in self.geomList]
+            return self._broadphase
+        for i,(o,g) in enumerate(self.geomList):
+            T = g.getCurrentTransform()
+            if T != self._bbtransforms[i]:
+                self._bbtransforms[i] = T
+                self._broadphase.update(i,g.getBB())
+        return self._broadphase
+
+    def invalidateBroadPhase(self,object=None):
+        """Marks bounding boxes as out of date.  Bounding boxes are updated
+        automatically when objects move, but this must be called if a
+        geometry's contents are modified.
+
+        Args:
+            object (optional): the RobotModelLink, RigidObjectModel, or
+                TerrainModel whose geometry was modified, or None if all
+                geometries should be updated.
+        """
+        if object is None:
+            self._broadphase = None
+            return
+        i = self._getGeomIndex(object)
+        if i is not None and self._broadphase is not None:
+            self._bbtransforms[i] = None
                 
     def _getGeomIndex(self,object):
         """Finds the geomList index corresponding to an object
@@ -431,6 +1078,12 @@ class WorldCollider:
         See :meth:`collisions` for an explanation of how filter1 and filter2
         are interpreted
 
+        Each pair of objects is returned at most once.  If filter1 and
+        filter2 are both given, object1 satisfies filter1 and object2
+        satisfies filter2, and bb_reject applies as in the other cases.
+        (Earlier versions returned each such pair twice and ignored
+        bb_reject.)
+
         Returns:
             iterator of tuple: Iterates over
             ((object1,geom1),(object2,geom2)) pairs indicating which objects
@@ -441,38 +1094,59 @@ class WorldCollider:
                 - geom1, geom2: Geometry3D corresponding to those objects.
 
         """
-        res = []
-        if filter1 is None: #all pairs
-            if bb_reject: bblist = [g[1].getBB() for g in self.geomList]
-            for (i,(g,objs)) in enumerate(zip(self.geomList,self.mask)):
-                for objIndex in objs:
-                    #already checked
-                    if objIndex < i: continue
-                    if bb_reject and not bb_intersect(bblist[i],bblist[objIndex]): continue
-                    yield (g,self.geomList[objIndex])
-        elif filter2 is None: #self collision with objects passing filter1
-            if bb_reject:
-                #TODO: bounding box rejection, if requested
-                pass
-            for (i,(g,objs)) in enumerate(zip(self.geomList,self.mask)):
-                if not filter1(g[0]): continue
-                for objIndex in objs:
-                    #already checked
-                    if objIndex < i: continue
-                    if not filter1(self.geomList[objIndex][0]): continue
-                    yield (g,self.geomList[objIndex])
+        f1,f2 = self._evalFilters(filter1,filter2)
+        for (i,j) in self._collisionTestIndices(f1,f2,bb_reject):
+            yield (self.geomList[i],self.geomList[j])
+
+    def _evalFilters(self,filter1,filter2):
+        """Evaluates filter1 and filter2 on each entry of geomList.  Returns
+        a pair of lists of bools (or None, if the filter is None)."""
+        f1 = (None if filter1 is None else [bool(filter1(g[0])) for g in self.geomList])
+        f2 = (None if filter2 is None else [bool(filter2(g[0])) for g in self.geomList])
+        return f1,f2
+
+    def _collisionTestIndices(self,f1,f2,bb_reject=True):
+        """Same as :meth:`collisionTests`, but iterates over geomList index
+        pairs given the filter values returned by _evalFilters."""
+        if f1 is None: #all pairs
+            active = None
+        elif f2 is None: #self collision with objects passing filter1
+            active = f1
         else:  #checks everything
-            for (i,(g,objs)) in enumerate(zip(self.geomList,self.mask)):
-                f1 = filter1(g[0])
-                f2 = filter2(g[0])
-                for objIndex in objs:
-                    #already checked
-                    if self.geomList[objIndex][0]==g[0]:
-                        continue
-                    if f1 and filter2(self.geomList[objIndex][0]):
-                        yield (g,self.geomList[objIndex])
-                    elif f2 and filter1(self.geomList[objIndex][0]):
-                        yield (self.geomList[objIndex],g)
+            active = [a or b for (a,b) in zip(f1,f2)]
+        if bb_reject:
+            pairs = self._pairsOverlapping(active)
+        else:
+            pairs = self._pairsEnabled(active)
+        if f1 is None or f2 is None:
+            for (i,j) in pairs:
+                yield (i,j)
+        else:
+            for (i,j) in pairs:
+                if self.geomList[i][0]==self.geomList[j][0]:
+                    continue
+                if f1[i] and f2[j]:
+                    yield (i,j)
+                elif f2[i] and f1[j]:
+                    yield (j,i)
+
+    def _pairsEnabled(self,active=None):
+        """Iterates over the enabled (i,j) geomList index pairs, i < j,
+        optionally restricted to the indices for which active[i] is True."""
+        for (i,objs) in enumerate(self.mask):
+            if active is not None and not active[i]: continue
+            for objIndex in objs:
+                #already checked
+                if objIndex < i: continue
+                if active is not None and not active[objIndex]: continue
+                yield (i,objIndex)
+
+    def _pairsOverlapping(self,active=None):
+        """Returns the enabled (i,j) geomList index pairs, i < j, whose
+        bounding boxes overlap, optionally restricted to the indices for
+        which active[i] is True."""
+        mask = self.mask
+        return [(i,j) for (i,j) in self._updateBroadPhase().overlaps(active) if j in mask[i]]
 
     def collisions(self,filter1=None,filter2=None):
         """Returns an iterator over the colliding pairs of objects,
@@ -494,13 +1168,82 @@ class WorldCollider:
 
         If filter1 and filter2 are provided, then objects that
         satisfy filter1 will be collided against objects that satisfy
-        filter2.  (Note: in this case there is no checking of duplicates,
-        i.e., the sets should be disjoint to avoid duplicating work).
+        filter2.  Each colliding pair is reported once, even if the sets
+        overlap.
         """
         for (g0,g1) in self.collisionTests(filter1,filter2):
             if g0[1].collides(g1[1]):
                 yield (g0[0],g1[0])
 
+    def collisions_batch(self,configs,body=0,filter1=None,filter2=None,pairs=False,processes=None):
+        """Checks collisions at many configurations of a robot, or many
+        transforms of a rigid object.  The body is restored to its current
+        configuration afterwards.
+
+        Args:
+            configs (array-like): an N x n array of robot configurations, or
+                if body is a RigidObjectModel, an N x 12 array of flattened
+                transforms (R + t).
+            body (int, RobotModel, or RigidObjectModel, optional): the body
+                to move.  An int gives a robot index.
+            filter1 (function, optional): see :meth:`collisions`
+            filter2 (function, optional): see :meth:`collisions`
+            pairs (bool, optional): if True, all colliding pairs are
+                returned.  Otherwise, testing stops at the first collision
+                for each configuration.
+            processes (int, optional): if > 1, the configurations are split
+                among this many worker processes, which inherit the world
+                from this process.  This requires the 'fork' start method of
+                multiprocessing.
+
+        Returns:
+            ndarray: if pairs=False, a length N bool array indicating which
+            configurations collide.  Otherwise, an M x 3 int array whose
+            rows (k,i,j) indicate that geomList[i] and geomList[j] collide at
+            configs[k].
+        """
+        import numpy as np
+        global _collisions_batch_state
+        if isinstance(body,int):
+            body = self.world.robot(body)
+        if isinstance(body,RigidObjectModel):
+            R,t = body.getTransform()
+            qorig = list(R)+list(t)
+        else:
+            qorig = body.getConfig()
+        configs = np.asarray(configs,dtype=float)
+        configs = configs.reshape((-1,len(qorig)))
+        f1,f2 = self._evalFilters(filter1,filter2)
+        res = None
+        if processes is not None and processes > 1 and len(configs) > processes:
+            import multiprocessing
+            try:
+                ctx = multiprocessing.get_context('fork')
+            except ValueError:
+                warnings.warn("WorldCollider.collisions_batch: 'fork' start method not available, running in a single process")
+                ctx = None
+            if ctx is not None:
+                #more chunks than processes, for load balancing
+                nchunks = min(len(configs),processes*4)
+                bounds = np.linspace(0,len(configs),nchunks+1).astype(int)
+                chunks = [(a,configs[a:b]) for (a,b) in zip(bounds[:-1],bounds[1:])]
+                #bounding boxes are computed once before forking
+                self._updateBroadPhase()
+                #forked workers inherit the world and collider
+                _collisions_batch_state = (self,body,f1,f2,pairs)
+                try:
+                    with ctx.Pool(processes) as pool:
+                        results = pool.map(_collisions_batch_worker,chunks)
+                finally:
+                    _collisions_batch_state = None
+                res = np.concatenate(results)
+        if res is None:
+            try:
+                res = _collisions_batch(self,body,configs,f1,f2,pairs)
+            finally:
+                _set_body_config(body,qorig)
+        return res
+
     def robotSelfCollisions(self,robot=None):
         """Yields an iterator over robot self collisions.
 
@@ -679,6 +1422,31 @@ class WorldCollider:
                     dmin,res = dist,(g[0],pt)
         return res
                 
+    def rayCast_batch(self,s,d,indices=None,processes=None):
+        """Finds the first collision between each of many rays and objects
+        in the world.  See :func:`ray_cast_batch`.
+
+        Args:
+            s (array-like): an N x 3 array of ray sources
+            d (array-like): an N x 3 array of ray directions
+            indices (list of ints, optional): if given, the indices of
+                geometries in geomList to test.
+            processes (int, optional): if > 1, the number of worker
+                processes used.
+
+        Returns:
+            tuple: a pair (distances,indices) of length N arrays, giving the
+            distance to the first hit (inf if there is no hit) and the
+            geomList index of the hit object (-1 if there is no hit).
+        """
+        import numpy as np
+        bbs = self._updateBroadPhase().bbs
+        if indices is None:
+            return ray_cast_batch([g[1] for g in self.geomList],s,d,processes,bbs)
+        dist,hit = ray_cast_batch([self.geomList[i][1] for i in indices],s,d,processes,[bbs[i] for i in indices])
+        indices = np.asarray(list(indices)+[-1],dtype=int)
+        return dist,indices[hit]
+
     def rayCastRobot(self,robot,s,d):
         """Finds the first collision between a ray and a robot.
 
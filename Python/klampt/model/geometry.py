@@ -25,10 +25,19 @@ with plane estimation.
 :func:`point_cloud_colors` and :func:`point_cloud_set_colors` sets / gets 
 colors from a PointCloud.
 
+Signed distance fields
+======================
+
+:class:`SignedDistanceField` precomputes a signed distance grid for a static
+geometry, caches it on disk, and answers batched distance and gradient
+queries by trilinear interpolation.
+
 """
 
-from ..robotsim import Geometry3D,PointCloud
+from ..robotsim import Geometry3D,PointCloud,VolumeGrid
+import os
 import math
+import hashlib
 from .create import primitives
 from ..math import vectorops,so3,se3
 
@@ -638,3 +647,125 @@ def point_cloud_set_colors(pc,colors,color_format='rgb',pc_property='auto'):
             pc.setProperties(alphachannel[1],packed)
         else:
             pc.addProperty(pc_property,packed)
+
+
+class SignedDistanceField:
+    """A signed distance field of a static geometry, for fast approximate
+    distance queries.  The field is computed once by converting the
+    geometry to a VolumeGrid, and is cached on disk keyed by a hash of the
+    geometry's triangle mesh and the resolution.
+
+    Distances and gradients are interpolated trilinearly between the grid's
+    cell centers.  Outside the grid, the distance is approximated by the
+    distance to the closest point in the grid plus the distance at that
+    point.  The conversion only gives good results for watertight meshes.
+
+    Attributes:
+        bmin (array): the lower bound of the grid, in local coordinates
+        bmax (array): the upper bound of the grid, in local coordinates
+        values (array): the dims[0] x dims[1] x dims[2] array of distances
+            at the cell centers
+        T (se3 element): the geometry's transform, from local to world
+            coordinates
+    """
+    def __init__(self,geom,resolution=0,cacheDir='~/.klampt/cache'):
+        """
+        Args:
+            geom (Geometry3D, TerrainModel, or RigidObjectModel): the
+                geometry, whose current transform is used for all queries.
+            resolution (float, optional): the grid cell size.  0 uses the
+                average triangle diameter.
+            cacheDir (str, optional): a directory in which grids are saved
+                and looked up, or None to disable caching.
+        """
+        _try_numpy_import()
+        if hasattr(geom,'geometry'):
+            geom = geom.geometry()
+        self.T = geom.getCurrentTransform()
+        if geom.type() == 'VolumeGrid':
+            self._setGrid(geom.getVolumeGrid())
+            return
+        mesh = (geom if geom.type() == 'TriangleMesh' else geom.convert('TriangleMesh',resolution))
+        cacheFile = None
+        if cacheDir is not None:
+            tm = mesh.getTriangleMesh()
+            h = hashlib.sha1()
+            h.update(np.array(tm.vertices,dtype=float).tobytes())
+            h.update(np.array(tm.indices,dtype=np.int64).tobytes())
+            h.update(repr(float(resolution)).encode('utf-8'))
+            cacheDir = os.path.expanduser(cacheDir)
+            cacheFile = os.path.join(cacheDir,'sdf_'+h.hexdigest()+'.npz')
+            if os.path.exists(cacheFile):
+                with np.load(cacheFile) as data:
+                    self.bmin,self.bmax,self.values = data['bmin'],data['bmax'],data['values']
+                return
+        src = (geom if geom.type() == 'GeometricPrimitive' else mesh)
+        self._setGrid(src.convert('VolumeGrid',resolution).getVolumeGrid())
+        if cacheFile is not None:
+            if not os.path.exists(cacheDir):
+                os.makedirs(cacheDir)
+            np.savez(cacheFile,bmin=self.bmin,bmax=self.bmax,values=self.values)
+
+    def _setGrid(self,grid):
+        bbox = list(grid.bbox)
+        self.bmin = np.array(bbox[:3])
+        self.bmax = np.array(bbox[3:])
+        self.values = np.array(grid.values,dtype=float).reshape([int(d) for d in grid.dims])
+
+    def volume_grid(self):
+        """Returns the field as a VolumeGrid, in local coordinates."""
+        grid = VolumeGrid()
+        grid.setBounds(self.bmin.tolist(),self.bmax.tolist())
+        grid.resize(*self.values.shape)
+        grid.values = self.values.ravel().tolist()
+        return grid
+
+    def distance(self,pts):
+        """Returns the approximate signed distances from the world-space
+        points pts (an N x 3 array) to the geometry."""
+        return self.distance_and_gradient(pts)[0]
+
+    def gradient(self,pts):
+        """Returns the N x 3 array of approximate gradients of the signed
+        distance at the world-space points pts."""
+        return self.distance_and_gradient(pts)[1]
+
+    def distance_and_gradient(self,pts):
+        """Returns a pair (d,g) of the approximate signed distances (a
+        length N array) and their gradients (an N x 3 array) at the
+        world-space points pts (an N x 3 array)."""
+        R = np.array(self.T[0]).reshape((3,3))
+        #rows of pts.dot(R.T) are R^T*p, since R is column major
+        plocal = (np.asarray(pts,dtype=float).reshape((-1,3)) - self.T[1]).dot(R.T)
+        dims = np.array(self.values.shape)
+        h = (self.bmax-self.bmin)/dims
+        #clamp to the cell centers
+        cmin = self.bmin + 0.5*h
+        cmax = self.bmax - 0.5*h
+        pclamp = np.minimum(np.maximum(plocal,cmin),cmax)
+        u = (pclamp - cmin)/h
+        i0 = np.minimum(np.floor(u).astype(int),np.maximum(dims-2,0))
+        f = u - i0
+        i1 = np.minimum(i0+1,dims-1)
+        V = self.values
+        c = [[[V[(i1[:,0] if a else i0[:,0]),(i1[:,1] if b else i0[:,1]),(i1[:,2] if e else i0[:,2])] for e in (0,1)] for b in (0,1)] for a in (0,1)]
+        fx,fy,fz = f[:,0],f[:,1],f[:,2]
+        #interpolate along z, then y, then x
+        cz = [[c[a][b][0]*(1-fz) + c[a][b][1]*fz for b in (0,1)] for a in (0,1)]
+        dz = [[c[a][b][1]-c[a][b][0] for b in (0,1)] for a in (0,1)]
+        cy = [cz[a][0]*(1-fy) + cz[a][1]*fy for a in (0,1)]
+        d = cy[0]*(1-fx) + cy[1]*fx
+        gx = cy[1]-cy[0]
+        gy = (cz[0][1]-cz[0][0])*(1-fx) + (cz[1][1]-cz[1][0])*fx
+        gz = (dz[0][0]*(1-fy) + dz[0][1]*fy)*(1-fx) + (dz[1][0]*(1-fy) + dz[1][1]*fy)*fx
+        grad = np.column_stack((gx,gy,gz))/h
+        #outside of the grid
+        offset = plocal - pclamp
+        outside = np.any(offset != 0,axis=1)
+        if np.any(outside):
+            grad[offset != 0] = 0
+            dout = np.linalg.norm(offset[outside],axis=1)
+            d[outside] += dout
+            grad[outside] += offset[outside]/dout[:,np.newaxis]
+        #back to world coordinates
+        return d,grad.dot(R)
@@ -271,7 +271,10 @@ class MultiPath:
         self.holdSet.update(newholds)
 
     def save(self,fn):
-        """Saves this  multipath to an xml file."""
+        """Saves this  multipath to an xml file, or if fn has the extension
+        .npz, saves with :meth:`saveNpz`."""
+        if fn.endswith('.npz'):
+            return self.saveNpz(fn)
         tree = self.saveXML()
         f = open(fn,'w')
         f.write('<?xml version="1.0"?>\n')
@@ -280,10 +283,55 @@ class MultiPath:
         f.close()
 
     def load(self,fn):
-        """Loads this  multipath from a multipath xml file."""
+        """Loads this  multipath from a multipath xml file, or if fn has the
+        extension .npz, loads with :meth:`loadNpz`."""
+        if fn.endswith('.npz'):
+            return self.loadNpz(fn)
         tree = ET.parse(fn)
         return self.loadXML(tree)
 
+    def saveNpz(self,fn):
+        """Saves this multipath to an uncompressed binary .npz file.  The
+        configs, times, and velocities of section i are stored in the arrays
+        'configs_i', 'times_i', and 'velocities_i', and everything else is
+        stored as xml in the 'multipath' entry."""
+        import numpy as np
+        tree = self.saveXML()
+        for xs in tree.getroot().findall('section'):
+            for xm in xs.findall('milestone'):
+                xs.remove(xm)
+        arrays = {'multipath':np.array(ET.tostring(tree.getroot(),encoding='unicode'))}
+        for i,sec in enumerate(self.sections):
+            n = len(sec.configs)
+            arrays['configs_%d'%i] = np.asarray(sec.configs,dtype=float).reshape((n,-1)) if n > 0 else np.zeros((0,0))
+            if sec.times is not None:
+                arrays['times_%d'%i] = np.asarray(sec.times,dtype=float)
+            if sec.velocities is not None:
+                arrays['velocities_%d'%i] = np.asarray(sec.velocities,dtype=float).reshape((n,-1))
+        with open(fn,'wb') as f:
+            np.savez(f,**arrays)
+
+    def loadNpz(self,fn,mmap=True):
+        """Loads this multipath from a binary .npz file written by
+        :meth:`saveNpz`.  The configs, times, and velocities of each section
+        are list-compatible views of arrays, see
+        :class:`~klampt.model.trajectory.ArrayListView`.
+
+        If mmap=True, these arrays are memory-mapped from the file rather than
+        read.
+        """
+        from .trajectory import ArrayListView,_load_npz
+        arrays = _load_npz(fn,mmap)
+        if 'multipath' not in arrays:
+            raise ValueError("File "+fn+" does not contain a MultiPath")
+        self.loadXML(ET.ElementTree(ET.fromstring(str(arrays['multipath']))))
+        for i,sec in enumerate(self.sections):
+            sec.configs = ArrayListView(arrays['configs_%d'%i])
+            if 'times_%d'%i in arrays:
+                sec.times = ArrayListView(arrays['times_%d'%i])
+            if 'velocities_%d'%i in arrays:
+                sec.velocities = ArrayListView(arrays['velocities_%d'%i])
+
     def saveXML(self):
         """Saves this multipath to a multipath xml tree (ElementTree)"""
         from ..io import loader
@@ -31,6 +31,14 @@ The :class:`ProjectiveCameraModel`, :func:`camera_to_viewport`, and
 :func:`camera_ray`, and :func:`camera_project` convert to/from image points.
 :func:`visible` determines whether a point or object is visible from a camera.
 
+Emulating range sensors
+=======================
+
+:func:`lidar_rays` generates the rays of a scanning range sensor, and
+:func:`lidar_scan` casts them into a world using
+:meth:`~klampt.model.collide.WorldCollider.rayCast_batch` to produce a range
+image.
+
 """
 
 from ..robotsim import *
@@ -770,3 +778,81 @@ def visible(camera,object,full=True,robot=None):
         raise ValueError("Object must be a point, sphere, bounding box, or Geometry3D")
     return visible(camera,object.getBB(),full,robot)
 
+
+
+def lidar_rays(T,hres=1024,vres=32,hfov=math.pi*2,vfov=math.radians(30)):
+    """Returns the rays of a scanning range sensor (LiDAR) with transform T.
+    The sensor scans hres azimuths over the horizontal field of view hfov,
+    centered on its local x axis and rotating about its local z axis, and
+    vres elevations over the vertical field of view vfov, centered on its
+    local x-y plane.
+
+    Args:
+        T (se3 element): the world transform of the sensor
+        hres (int, optional): the number of azimuths
+        vres (int, optional): the number of elevations
+        hfov (float, optional): the horizontal field of view, in radians
+        vfov (float, optional): the vertical field of view, in radians
+
+    Returns:
+        tuple: (sources,directions), two (vres*hres) x 3 numpy arrays in
+        world coordinates.  Row i*hres+j gives the ray for the i'th
+        elevation (from bottom to top) and the j'th azimuth.
+    """
+    if not _try_numpy_import():
+        raise ImportError("lidar_rays requires numpy")
+    if hfov >= math.pi*2:
+        #don't duplicate the ray at the seam
+        azimuths = np.linspace(-math.pi,math.pi,hres,endpoint=False)
+    else:
+        azimuths = np.linspace(-hfov*0.5,hfov*0.5,hres)
+    elevations = (np.linspace(-vfov*0.5,vfov*0.5,vres) if vres > 1 else np.zeros(1))
+    el,az = np.meshgrid(elevations,azimuths,indexing='ij')
+    dlocal = np.column_stack((np.cos(el.ravel())*np.cos(az.ravel()),np.cos(el.ravel())*np.sin(az.ravel()),np.sin(el.ravel())))
+    R = np.array(T[0]).reshape((3,3))
+    directions = dlocal.dot(R)
+    sources = np.tile(np.asarray(T[1],dtype=float),(len(directions),1))
+    return sources,directions
+
+
+def lidar_scan(world,T,hres=1024,vres=32,hfov=math.pi*2,vfov=math.radians(30),rmin=0,rmax=float('inf'),ignore=(),points=False,processes=None):
+    """Emulates a scanning range sensor (LiDAR) by casting rays into a
+    world.  See :func:`lidar_rays` for the arrangement of rays.
+
+    Args:
+        world (WorldModel or WorldCollider): the world.  If many scans are
+            taken, pass a WorldCollider to avoid rebuilding it each call.
+        T (se3 element): the world transform of the sensor
+        hres, vres, hfov, vfov: see :func:`lidar_rays`
+        rmin (float, optional): hits closer than this are ignored
+        rmax (float, optional): hits farther than this are ignored
+        ignore (list, optional): bodies (RobotModelLink, RigidObjectModel,
+            or TerrainModel) that are not sensed, e.g., the links of the
+            robot carrying the sensor.
+        points (bool, optional): if True, also returns the hit points.
+        processes (int, optional): if > 1, the number of worker processes
+            used to cast rays.
+
+    Returns:
+        ndarray or tuple: a vres x hres array of ranges, with inf for rays
+        that don't hit anything.  If points=True, a pair (ranges,pts) where
+        pts is a vres x hres x 3 array of world coordinates of the hit
+        points, with nan for rays that don't hit anything.
+    """
+    from .collide import WorldCollider
+    if not isinstance(world,WorldCollider):
+        world = WorldCollider(world)
+    indices = None
+    if len(ignore) > 0:
+        ignored = set(world._getGeomIndex(o) for o in ignore)
+        indices = [i for i in range(len(world.geomList)) if i not in ignored]
+    sources,directions = lidar_rays(T,hres,vres,hfov,vfov)
+    ranges,hits = world.rayCast_batch(sources,directions,indices,processes)
+    ranges[(ranges < rmin) | (ranges > rmax)] = np.inf
+    ranges = ranges.reshape((vres,hres))
+    if not points:
+        return ranges
+    hit = np.isfinite(ranges.ravel())
+    pts = np.full(sources.shape,np.nan)
+    pts[hit] = sources[hit] + directions[hit]*ranges.ravel()[hit,np.newaxis]
+    return ranges,pts.reshape((vres,hres,3))
@@ -3,6 +3,9 @@
 * For piecewise-linear interpolation in cartesian space, use :class:`~klampt.model.trajectory.Trajectory`.
 * For piecewise-linear interpolation on a robot, use :class:`~klampt.model.trajectory.RobotTrajectory`.
 * For Hermite interpolation in cartesian space, use :class:`~klampt.model.trajectory.HermiteTrajectory`.
+* For receding-horizon control, where milestones are continually appended
+  and discarded, use :class:`~klampt.model.trajectory.StreamingTrajectory` or
+  :class:`~klampt.model.trajectory.StreamingHermiteTrajectory`.
 
 """
 
@@ -12,6 +15,136 @@ from ..math import spline
 from ..math.geodesic import *
 import warnings
 
+def _rowwise(func,a,b,u,dt):
+    """Applies a per-milestone state function func(a,b,u,dt) to the rows of
+    N x d arrays.  Used by the batch evaluators of subclasses that don't
+    provide a vectorized implementation."""
+    import numpy as np
+    res = [func(ai,bi,ui,dti) for (ai,bi,ui,dti) in zip(a.tolist(),b.tolist(),u.tolist(),dt.tolist())]
+    if len(res)==0:
+        return np.zeros(a.shape)
+    return np.array(res,dtype=float)
+
+def _so3_batch_difference(a,b):
+    """Row-wise equivalent of SO3Space.difference for N x 9 arrays"""
+    from ..math import so3_batch
+    return so3_batch.mul(so3_batch.cross_product(so3_batch.error(a,b)),b)
+
+def _is_ndarray(x):
+    """Returns True if x is a numpy array (or memmap), without importing
+    numpy."""
+    return hasattr(x,'__array_interface__')
+
+
+def _load_npz(fn,mmap=False):
+    """Returns a dict of the arrays stored in the .npz file fn.
+
+    If mmap=True, uncompressed numeric arrays are memory-mapped from the file
+    in copy-on-write mode rather than read into memory.
+    """
+    import numpy as np
+    if not mmap:
+        with np.load(fn) as data:
+            return dict((k,data[k]) for k in data.files)
+    import zipfile
+    import struct
+    res = dict()
+    with zipfile.ZipFile(fn) as zf, open(fn,'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type == zipfile.ZIP_STORED:
+                #the array data follows the local file header and .npy header
+                f.seek(info.header_offset)
+                header = struct.unpack('<IHHHHHIIIHH',f.read(30))
+                f.seek(info.header_offset + 30 + header[9] + header[10])
+                version = np.lib.format.read_magic(f)
+                if version == (1,0):
+                    shape,fortran,dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape,fortran,dtype = np.lib.format.read_array_header_2_0(f)
+                if len(shape) > 0 and np.prod(shape) > 0 and not dtype.hasobject:
+                    res[name] = np.memmap(fn,dtype=dtype,mode='c',offset=f.tell(),shape=shape,order='F' if fortran else 'C')
+                    continue
+            with zf.open(info) as member:
+                res[name] = np.lib.format.read_array(member)
+    return res
+
+
+class _ArrayRow(list):
+    """A copy of a row of an :class:`ArrayListView`.  Raises an error on
+    modification, because the modification would not reach the array."""
+    def _readonly(self,*args,**kwargs):
+        raise TypeError("Rows of a compact trajectory are read-only copies, assign whole rows instead, e.g., traj.milestones[i] = q")
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+    def __reduce__(self):
+        return (list,(list(self),))
+
+
+class ArrayListView:
+    """A list-compatible view of a contiguous numpy array, used for the
+    times (1-D) and milestones (2-D) of trajectories in compact storage
+    mode.  See :meth:`Trajectory.compact`.
+
+    Indexing with an integer returns a float (1-D) or a list (2-D), so
+    existing code that expects lists of lists keeps working.  The lists
+    are read-only copies: assigning to their elements raises a TypeError,
+    whereas assigning a whole row, ``view[i] = q``, writes to the array.
+    Slicing
+    returns another ArrayListView that shares memory with this one, like a
+    numpy slice.  append, insert, and ``+`` produce new contiguous arrays.
+
+    The underlying array is available as the ``array`` attribute, and
+    ``numpy.asarray(view)`` returns it without copying.
+    """
+    def __init__(self,array):
+        self.array = array
+    def __len__(self):
+        return len(self.array)
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return ArrayListView(self.array[index])
+        if self.array.ndim > 1:
+            return _ArrayRow(self.array[index].tolist())
+        return self.array[index].tolist()
+    def __setitem__(self,index,value):
+        self.array[index] = value
+    def __iter__(self):
+        return iter(self.array.tolist())
+    def __array__(self,dtype=None,copy=None):
+        if dtype is not None and dtype != self.array.dtype:
+            return self.array.astype(dtype)
+        if copy:
+            return self.array.copy()
+        return self.array
+    def _as_rows(self,items):
+        import numpy as np
+        if isinstance(items,ArrayListView):
+            return items.array
+        return np.asarray(items,dtype=self.array.dtype).reshape((-1,)+self.array.shape[1:])
+    def __add__(self,other):
+        import numpy as np
+        return ArrayListView(np.concatenate((self.array,self._as_rows(other))))
+    def __radd__(self,other):
+        import numpy as np
+        return ArrayListView(np.concatenate((self._as_rows(other),self.array)))
+    def __eq__(self,other):
+        try:
+            return len(self)==len(other) and all(a == b for (a,b) in zip(self,other))
+        except TypeError:
+            return False
+    __hash__ = None
+    def __repr__(self):
+        return 'ArrayListView(%r)'%(self.array,)
+    def append(self,item):
+        self.array = (self + [item]).array
+    def insert(self,index,item):
+        import numpy as np
+        self.array = np.insert(self.array,index,self._as_rows([item]),axis=0)
+    def tolist(self):
+        return self.array.tolist()
+
+
 class Trajectory:
     """A basic piecewise-linear trajectory class, which can be overloaded
     to provide different functionality.  A plain Trajectory interpolates
@@ -24,6 +157,10 @@ class Trajectory:
         times (list of floats): a list of times at which the milestones are met.
         milestones (list of Configs): a list of milestones that are interpolated.
 
+    In compact storage mode (see :meth:`compact`), times and milestones are
+    :class:`ArrayListView` objects backed by a length-N array and an N x d
+    array, respectively.
+
     """
         
     def __init__(self,times=None,milestones=None):
@@ -34,6 +171,9 @@ class Trajectory:
             milestones (list of Configs, optional): if provided, initializes
                 the self.milestones attribute.  Otherwise milestones is empty.
 
+        If times and milestones are numpy arrays, the trajectory uses the
+        compact storage mode and refers to the arrays without copying them.
+
         Does not perform error checking.  The caller must be sure that
         the lists have the same size, the times are non-decreasing, and the configs
         are equally-sized (you can call checkValid() for this).
@@ -41,10 +181,49 @@ class Trajectory:
         if milestones is None:
             milestones = []
         if times is None:
-            times = list(range(len(milestones)))
+            if _is_ndarray(milestones):
+                import numpy as np
+                times = np.arange(len(milestones),dtype=float)
+            else:
+                times = list(range(len(milestones)))
+        if _is_ndarray(times):
+            times = ArrayListView(times)
+        if _is_ndarray(milestones):
+            milestones = ArrayListView(milestones)
         self.times = times
         self.milestones = milestones
 
+    def compact(self):
+        """Switches this trajectory to the compact storage mode, in which
+        the times and milestones are stored in a contiguous float64 vector
+        and an N x d array.  The times and milestones attributes become
+        :class:`ArrayListView` objects, which behave like lists, and
+        :func:`klampt.io.numpy_convert.to_numpy` returns the arrays without
+        copying.
+
+        Note that slices of the milestones share memory with this
+        trajectory, as with numpy arrays.  However, each milestone
+        ``traj.milestones[i]`` is a read-only copy, and in-place edits such
+        as ``traj.milestones[i][j] = v`` raise a TypeError.  Assign whole
+        milestones instead, e.g., ``traj.milestones[i] = q``.
+
+        Returns:
+            Trajectory: self
+        """
+        import numpy as np
+        times = np.ascontiguousarray(self.times,dtype=float)
+        if len(times) == 0:
+            milestones = np.zeros((0,0))
+        else:
+            milestones = np.ascontiguousarray(self.milestones,dtype=float).reshape((len(times),-1))
+        self.times = ArrayListView(times)
+        self.milestones = ArrayListView(milestones)
+        return self
+
+    def isCompact(self):
+        """Returns True if this trajectory uses the compact storage mode."""
+        return isinstance(self.milestones,ArrayListView)
+
     def load(self,fn):
         """Reads from a whitespace-separated file in the format::
 
@@ -54,7 +233,12 @@ class Trajectory:
 
         where each [qi] is a Klamp't formatted length-n configuration, written
         in the form ``n qi1 ... qin``.
+
+        If fn has the extension .npz, it is read with :meth:`loadNpz`.
         """
+        if fn.endswith('.npz'):
+            self.loadNpz(fn)
+            return
         fin = open(fn, 'r')
         self.times = []
         self.milestones = []
@@ -65,7 +249,11 @@ class Trajectory:
         fin.close()
 
     def save(self,fn):
-        """Writes to a whitespace-separated file"""
+        """Writes to a whitespace-separated file, or if fn has the extension
+        .npz, writes with :meth:`saveNpz`."""
+        if fn.endswith('.npz'):
+            self.saveNpz(fn)
+            return
         fout = open(fn, 'w')
         for t,x in zip(self.times,self.milestones):
             fout.write('%f\t%d '%(t,len(x)))
@@ -73,6 +261,32 @@ class Trajectory:
             fout.write('\n')
         fout.close()
 
+    def loadNpz(self,fn,mmap=True):
+        """Reads from a binary .npz file written by :meth:`saveNpz`.  The
+        trajectory uses the compact storage mode.
+
+        If mmap=True, the times and milestones are memory-mapped from the
+        file rather than read, so evaluating a long trajectory only touches
+        the parts of the file that are needed.  Changes to the milestones
+        are not written back to the file.
+        """
+        arrays = _load_npz(fn,mmap)
+        self.times = ArrayListView(arrays['times'])
+        self.milestones = ArrayListView(arrays['milestones'])
+
+    def saveNpz(self,fn):
+        """Writes to an uncompressed binary .npz file with the arrays
+        'times' and 'milestones', which can also be read by ``numpy.load``.
+        """
+        import numpy as np
+        times = np.asarray(self.times,dtype=float)
+        if len(times) == 0:
+            milestones = np.zeros((0,0))
+        else:
+            milestones = np.asarray(self.milestones,dtype=float).reshape((len(times),-1))
+        with open(fn,'wb') as f:
+            np.savez(f,times=times,milestones=milestones,type=np.array(self.__class__.__name__))
+
     def startTime(self):
         """Returns the initial time."""
         try: return self.times[0]
@@ -147,7 +361,45 @@ class Trajectory:
                 return (-1,0)
         assert u >= 0 and u <= 1
         return (p,u)
-    
+
+    def getSegment_batch(self,ts,endBehavior='halt'):
+        """Vectorized version of :meth:`getSegment` that resolves many times
+        at once using ``numpy.searchsorted``.
+
+        Args:
+            ts (array-like of floats): The times at which to evaluate the
+                segments.
+            endBehavior (str): If 'loop' then the trajectory loops forever.
+
+        Returns:
+            (tuple): (indices,params), two length-N numpy arrays giving the
+            segment index and interpolation parameter for each time, with the
+            same conventions as :meth:`getSegment`.
+        """
+        import numpy as np
+        times = np.asarray(self.times,dtype=float)
+        ts = np.asarray(ts,dtype=float).reshape(-1)
+        if len(times)==0:
+            raise ValueError("Empty trajectory")
+        indices = np.full(len(ts),-1,dtype=int)
+        params = np.zeros(len(ts))
+        if len(times)==1:
+            return (indices,params)
+        if endBehavior == 'loop':
+            over = ts > times[-1]
+            if times[-1] == 0:
+                ts = np.where(over,0.0,ts)
+            else:
+                ts = np.where(over,np.mod(ts,times[-1]),ts)
+        last = ts >= times[-1]
+        mid = np.logical_and(ts > times[0],np.logical_not(last))
+        indices[last] = len(times)-1
+        tmid = ts[mid]
+        i = np.searchsorted(times,tmid,side='right')
+        indices[mid] = i-1
+        params[mid] = (tmid-times[i-1])/(times[i]-times[i-1])
+        return (indices,params)
+
     def eval(self,t,endBehavior='halt'):
         """Evaluates the trajectory using piecewise linear
         interpolation. 
@@ -174,6 +426,44 @@ class Trajectory:
         """
         return self.deriv_state(t,endBehavior)
 
+    def cursor(self,endBehavior='halt'):
+        """Returns a :class:`TrajectoryCursor` that evaluates this trajectory
+        efficiently at monotonically increasing times, e.g., in a real-time
+        control loop.
+
+        Args:
+            endBehavior (str): If 'loop' then the trajectory loops forever.
+        """
+        return TrajectoryCursor(self,endBehavior)
+
+    def eval_batch(self,ts,endBehavior='halt'):
+        """Evaluates the trajectory at many times at once.
+
+        Args:
+            ts (array-like of floats): The times at which to evaluate the
+                trajectory.
+            endBehavior (str): If 'loop' then the trajectory loops forever.
+
+        Returns:
+            (numpy.ndarray): an N x d array whose rows are the configurations
+            at each time in ts.
+        """
+        return self.eval_state_batch(ts,endBehavior)
+
+    def deriv_batch(self,ts,endBehavior='halt'):
+        """Evaluates the trajectory velocity at many times at once.
+
+        Args:
+            ts (array-like of floats): The times at which to evaluate the
+                trajectory.
+            endBehavior (str): If 'loop' then the trajectory loops forever.
+
+        Returns:
+            (numpy.ndarray): an N x d array whose rows are the velocities at
+            each time in ts.
+        """
+        return self.deriv_state_batch(ts,endBehavior)
+
     def waypoint(self,state):
         """Returns the primary configuration corresponding to the given state.
 
@@ -198,6 +488,38 @@ class Trajectory:
         elif i+1>=len(self.milestones): return [0.0]*len(self.milestones[-1])
         return self.difference_state(self.milestones[i+1],self.milestones[i],u,self.times[i+1]-self.times[i])
 
+    def eval_state_batch(self,ts,endBehavior='halt'):
+        """Internal batch eval, used on the underlying state representation.
+        Returns an N x d numpy array."""
+        import numpy as np
+        indices,params = self.getSegment_batch(ts,endBehavior)
+        milestones = np.asarray(self.milestones,dtype=float)
+        times = np.asarray(self.times,dtype=float)
+        res = np.empty((len(indices),milestones.shape[1]))
+        first = indices < 0
+        last = indices+1 >= len(milestones)
+        res[first] = milestones[0]
+        res[last] = milestones[-1]
+        mid = np.logical_not(np.logical_or(first,last))
+        if mid.any():
+            i = indices[mid]
+            res[mid] = self.interpolate_state_batch(milestones[i],milestones[i+1],params[mid],times[i+1]-times[i])
+        return res
+
+    def deriv_state_batch(self,ts,endBehavior='halt'):
+        """Internal batch deriv, used on the underlying state representation.
+        Returns an N x d numpy array."""
+        import numpy as np
+        indices,params = self.getSegment_batch(ts,endBehavior)
+        milestones = np.asarray(self.milestones,dtype=float)
+        times = np.asarray(self.times,dtype=float)
+        res = np.zeros((len(indices),milestones.shape[1]))
+        mid = np.logical_and(indices >= 0,indices+1 < len(milestones))
+        if mid.any():
+            i = indices[mid]
+            res[mid] = self.difference_state_batch(milestones[i+1],milestones[i],params[mid],times[i+1]-times[i])
+        return res
+
     def interpolate_state(self,a,b,u,dt):
         """Can override this to implement non-cartesian spaces.
         Interpolates along the geodesic from a to b.  dt is the 
@@ -209,7 +531,33 @@ class Trajectory:
         spaces.  Returns the time derivative along the geodesic from b to
         a.  dt is the duration of the segment form a to b"""
         return vectorops.mul(vectorops.sub(a,b),1.0/dt)
-    
+
+    def interpolate_state_batch(self,a,b,u,dt):
+        """Vectorized version of :meth:`interpolate_state`.  a and b are
+        N x d arrays, u and dt are length-N arrays, and the result is an
+        N x d array.
+
+        Subclasses that override interpolate_state should override this as
+        well.  Otherwise, this falls back to calling interpolate_state once
+        per row."""
+        import numpy as np
+        if type(self).interpolate_state is not Trajectory.interpolate_state:
+            return _rowwise(self.interpolate_state,a,b,u,dt)
+        return a + u[:,np.newaxis]*(b-a)
+
+    def difference_state_batch(self,a,b,u,dt):
+        """Vectorized version of :meth:`difference_state`.  a and b are
+        N x d arrays, u and dt are length-N arrays, and the result is an
+        N x d array.
+
+        Subclasses that override difference_state should override this as
+        well.  Otherwise, this falls back to calling difference_state once
+        per row."""
+        import numpy as np
+        if type(self).difference_state is not Trajectory.difference_state:
+            return _rowwise(self.difference_state,a,b,u,dt)
+        return (a-b)/dt[:,np.newaxis]
+
     def concat(self,suffix,relative=False,jumpPolicy='strict'):
         """Returns a new trajectory with another trajectory
         concatenated onto self.
@@ -247,13 +595,28 @@ class Trajectory:
                     raise ValueError("Concatenation would cause a jump in configuration")
                 if jumpPolicy=='strict' or (jumpPolicy=='blend' and suffix.milestones[0] != self.milestones[-1]):
                     #discard last milestone of self
+                    if self.isCompact() or suffix.isCompact():
+                        return self._concat_arrays(suffix,offset,len(self.times)-1)
                     times = self.times[:-1] + [t+offset for t in suffix.times]
                     milestones = self.milestones[:-1] + suffix.milestones
                     return self.constructor()(times,milestones)
+        if self.isCompact() or suffix.isCompact():
+            return self._concat_arrays(suffix,offset,len(self.times))
         times = self.times + [t+offset for t in suffix.times]
         milestones = self.milestones + suffix.milestones
         return self.constructor()(times,milestones)
 
+    def _concat_arrays(self,suffix,offset,n):
+        """Compact storage version of concat, keeping the first n milestones
+        of self."""
+        import numpy as np
+        times = np.asarray(suffix.times,dtype=float) + offset
+        milestones = np.asarray(suffix.milestones,dtype=float)
+        if n > 0:
+            times = np.concatenate((np.asarray(self.times,dtype=float)[:n],times))
+            milestones = np.concatenate((np.asarray(self.milestones,dtype=float)[:n],milestones))
+        return self.constructor()(times,milestones)
+
     def insert(self,time):
         """Inserts a milestone and keyframe at the given time.  Returns the index of the new
         milestone, or if a milestone already exists, then it returns that milestone index.
@@ -289,12 +652,17 @@ class Trajectory:
     def split(self,time):
         """Returns a pair of trajectories obtained from splitting this
         one at the given time"""
-        if time <= self.times[0]:
-            #split before start of trajectory
-            return self.constructor()([time],[self.milestones[0]]),self.constructor()([time]+self.times,[self.milestones[0]]+self.milestones)
-        elif time >= self.times[-1]:
-            #split after end of trajectory
-            return self.constructor()(self.times+[time],self.milestones+[self.milestones[-1]]),self.constructor()([time],self.milestones[-1])
+        if time <= self.times[0] or time >= self.times[-1]:
+            if time <= self.times[0]:
+                #split before start of trajectory
+                front,back = self.constructor()([time],[self.milestones[0]]),self.constructor()([time]+self.times,[self.milestones[0]]+self.milestones)
+            else:
+                #split after end of trajectory
+                front,back = self.constructor()(self.times+[time],self.milestones+[self.milestones[-1]]),self.constructor()([time],[self.milestones[-1]])
+            if self.isCompact():
+                front.compact()
+                back.compact()
+            return (front,back)
         i,u = self.getSegment(time)
         assert i >= 0,"getSegment returned -1? something must be wrong with the times"
         #split in middle of trajectory
@@ -360,15 +728,17 @@ class Trajectory:
     def discretize_state(self,dt):
         """Returns a copy of this but with uniformly defined milestones at
         resolution dt.  Start and goal are maintained exactly"""
+        import numpy as np
         assert dt > 0,"dt must be positive"
-        t = self.times[0]
-        new_milestones = [self.milestones[0][:]]
-        new_times = [self.times[0]]
-        #TODO: (T/dt) log n time, can be done in (T/dt) time
-        while t+dt < self.times[-1]:
-            t += dt
-            new_times.append(t)
-            new_milestones.append(self.eval_state(t))
+        ts = self.times[0] + dt*np.arange(1,int(math.ceil((self.times[-1]-self.times[0])/dt))+1)
+        ts = ts[ts < self.times[-1]]
+        if self.isCompact():
+            new_milestones = ArrayListView(np.vstack((self.milestones.array[:1],self.eval_state_batch(ts))))
+            new_times = ArrayListView(np.concatenate((self.times.array[:1],ts)))
+        else:
+            new_milestones = [self.milestones[0][:]] + self.eval_state_batch(ts).tolist()
+            new_times = [self.times[0]] + ts.tolist()
+        t = new_times[-1]
         if abs(t-self.times[-1]) > 1e-6:
             new_times.append(self.times[-1])
             new_milestones.append(self.milestones[-1][:])
@@ -399,6 +769,8 @@ class Trajectory:
 
         The end behavior is assumed to be 'halt'.
         """
+        newtimes = list(newtimes)
+        newvalues = self.eval_state_batch(newtimes).tolist()
         sorter = [(t,-1-i) for (i,t) in enumerate(self.times)]  + [(t,i) for (i,t) in enumerate(newtimes)]
         sorter = sorted(sorter)
         res = self.constructor()(None,None)
@@ -421,13 +793,14 @@ class Trajectory:
             if idx >= 0:
                 if t == res.times[-1]:
                     resindices.append(len(res.times)-1)
+                    firstold = lastold+1
                     continue
                 #it's a new mesh point, add it and check whether previous old milestones should be added
                 if self.times[lastold] == t:
                     #matched the last old mesh point, no need to call eval_state()
                     newx = self.milestones[lastold]
                 else:
-                    newx = self.eval_state(t)
+                    newx = newvalues[idx]
                 res.times.append(t)
                 res.milestones.append(newx)
                 for j in range(firstold,lastold):
@@ -470,7 +843,9 @@ class Trajectory:
         for d in dofs:
             if abs(d) >= n:
                 raise ValueError("Invalid dof")
-        return self.constructor([t for t in self.times],[[m[j] for j in dofs] for m in self.milestones])
+        if self.isCompact():
+            return self.constructor()(self.times[:],self.milestones.array[:,list(dofs)])
+        return self.constructor()([t for t in self.times],[[m[j] for j in dofs] for m in self.milestones])
 
     def stackDofs(self,trajs,strict=True):
         """Stacks the degrees of freedom of multiple trajectories together.
@@ -499,14 +874,39 @@ class Trajectory:
             for t in traj.times:
                 alltimes.add(t)
         self.times = sorted(alltimes)
-        stacktrajs = [traj.remesh(self.times) for traj in trajs]
+        stacktrajs = [traj.remesh(self.times)[0] for traj in trajs]
         for traj in stacktrajs:
             assert len(traj.milestones) == len(self.times)
+        if self.isCompact() or any(traj.isCompact() for traj in trajs):
+            import numpy as np
+            self.times = ArrayListView(np.array(self.times,dtype=float))
+            self.milestones = ArrayListView(np.hstack([np.asarray(traj.milestones,dtype=float) for traj in stacktrajs]))
+            return
         self.milestones = []
         for i,t in enumerate(self.times):
             self.milestones.append(sum([list(traj.milestones[i]) for traj in stacktrajs],[]))
 
 
+_link_transforms_state = None
+
+def _link_transforms(robot,links,configs):
+    """Returns a len(links) x N x 12 array of the flattened transforms of
+    the links at each row of the N x n array configs."""
+    import numpy as np
+    res = np.empty((len(links),len(configs),12))
+    for i,q in enumerate(configs.tolist()):
+        robot.setConfig(q)
+        for j,link in enumerate(links):
+            R,t = link.getTransform()
+            res[j,i,:9] = R
+            res[j,i,9:] = t
+    return res
+
+def _link_transforms_worker(configs):
+    robot,links = _link_transforms_state
+    return _link_transforms(robot,links,configs)
+
+
 class RobotTrajectory(Trajectory):
     """A trajectory that performs interpolation according to the robot's
     interpolation scheme."""
@@ -550,6 +950,57 @@ class RobotTrajectory(Trajectory):
             self.robot.setConfig(m)
             Rmilestones.append(link.getTransform())
         return SE3Trajectory(self.times[:],Rmilestones)
+    def getLinkTrajectories(self,links,times=None,asArrays=False,processes=None):
+        """Returns the poses of several links along the robot's trajectory,
+        running forward kinematics only once per sample.
+
+        Args:
+            links (list): the links, given as indices, names, or
+                RobotModelLink objects.
+            times (list of floats, optional): the times at which the poses
+                are sampled.  If None, the milestones are used.
+            asArrays (bool, optional): if True, returns N x 12 arrays whose
+                rows are flattened se3 elements (R + t).  Otherwise, returns
+                SE3Trajectory objects in the compact storage mode.
+            processes (int, optional): if > 1, the samples are split among
+                this many worker processes.  This requires the 'fork' start
+                method of multiprocessing, and is only worthwhile for very
+                long trajectories.
+
+        Returns:
+            list: an N x 12 array or SE3Trajectory for each link.
+        """
+        import numpy as np
+        global _link_transforms_state
+        links = [(self.robot.link(link) if isinstance(link,(int,str)) else link) for link in links]
+        if times is None:
+            times = np.asarray(self.times,dtype=float)
+            configs = np.asarray(self.milestones,dtype=float).reshape((len(times),-1))
+        else:
+            times = np.asarray(times,dtype=float)
+            configs = self.eval_batch(times)
+        res = None
+        if processes is not None and processes > 1 and len(configs) > processes:
+            import multiprocessing
+            try:
+                ctx = multiprocessing.get_context('fork')
+            except ValueError:
+                warnings.warn("RobotTrajectory.getLinkTrajectories: 'fork' start method not available, running in a single process")
+                ctx = None
+            if ctx is not None:
+                #forked workers inherit the robot and links
+                _link_transforms_state = (self.robot,links)
+                try:
+                    with ctx.Pool(processes) as pool:
+                        chunks = pool.map(_link_transforms_worker,np.array_split(configs,processes))
+                finally:
+                    _link_transforms_state = None
+                res = np.concatenate(chunks,axis=1)
+        if res is None:
+            res = _link_transforms(self.robot,links,configs)
+        if asArrays:
+            return list(res)
+        return [SE3Trajectory(times.copy(),X) for X in res]
     def length(self,metric=None):
         if metric is None:
             return Trajectory.length(self,self.robot.distance)
@@ -574,6 +1025,8 @@ class RobotTrajectory(Trajectory):
         subrob = SubRobotModel(self.robot,dofs)
         if len(self.times)==0:
             return RobotTrajectory(subrob)
+        if self.isCompact():
+            return RobotTrajectory(subrob,self.times[:],self.milestones.array[:,subrob._links])
         return RobotTrajectory(subrob,[t for t in self.times],[[m[j] for j in subrob._links] for m in self.milestones])
     def stackDofs(self,trajs):
         Trajectory.stackDofs(self,trajs,strict=False)
@@ -646,6 +1099,14 @@ class SO3Trajectory(GeodesicTrajectory):
         """Returns a Trajectory describing the movement of the point localPt
         attached to this rotating frame. """
         return Trajectory(self.times,[so3.apply(m,localPt) for m in self.milestones])
+    def interpolate_state_batch(self,a,b,u,dt):
+        from ..math import so3_batch
+        return so3_batch.interpolate(a,b,u)
+    def difference_state_batch(self,a,b,u,dt):
+        import numpy as np
+        from ..math import so3_batch
+        x = so3_batch.interpolate(a,b,u)
+        return (_so3_batch_difference(b,x)-_so3_batch_difference(a,x))/dt[:,np.newaxis]
     def checkValid(self):
         Trajectory.checkValid(self)
         for m in self.milestones:
@@ -688,6 +1149,25 @@ class SE3Trajectory(GeodesicTrajectory):
         (angular velocity,velocity) vector."""
         dT = self.deriv(t,endBehavior)
         return so3.deskew(dT[0])+dT[1]
+    def eval_batch(self,ts,endBehavior='halt'):
+        """Returns an N x 12 array of flattened SE3 elements, i.e., the
+        concatenation of R + t for each time in ts."""
+        return self.eval_state_batch(ts,endBehavior)
+    def deriv_batch(self,ts,endBehavior='halt'):
+        """Returns the derivatives as an N x 12 array of flattened SE3
+        element derivatives."""
+        return self.deriv_state_batch(ts,endBehavior)
+    def interpolate_state_batch(self,a,b,u,dt):
+        from ..math import se3_batch
+        return se3_batch.interpolate(a,b,u)
+    def difference_state_batch(self,a,b,u,dt):
+        import numpy as np
+        from ..math import so3_batch
+        def difference(a,b):
+            w = so3_batch.error(a[:,:9],b[:,:9])
+            return np.hstack((so3_batch.mul(b[:,:9],so3_batch.cross_product(w)),a[:,9:]-b[:,9:]))
+        x = self.interpolate_state_batch(a,b,u,dt)
+        return (difference(b,x)-difference(a,x))/dt[:,np.newaxis]
     def preTransform(self,T):
         """Premultiplies every transform in self by the se3 element
         T. In other words, if T transforms a local frame F to frame F',
@@ -766,8 +1246,11 @@ class HermiteTrajectory(Trajectory):
     def __init__(self,times=None,milestones=None,dmilestones=None):
         if dmilestones is None:
             Trajectory.__init__(self,times,milestones)
+        elif _is_ndarray(milestones) and _is_ndarray(dmilestones):
+            import numpy as np
+            Trajectory.__init__(self,times,np.hstack((milestones,dmilestones)))
         else:
-            assert milestones != None
+            assert milestones is not None
             #interpret as config/velocity
             self.times = times
             self.milestones = [q+dq for (q,dq) in zip(milestones,dmilestones)]
@@ -956,6 +1439,24 @@ class HermiteTrajectory(Trajectory):
         res = Trajectory.deriv_state(self,t,endBehavior)
         return res[len(res)//2:]
 
+    def eval_batch(self,ts,endBehavior='halt'):
+        """Returns just the configuration components of the result, as an
+        N x d array"""
+        res = Trajectory.eval_state_batch(self,ts,endBehavior)
+        return res[:,:res.shape[1]//2]
+
+    def deriv_batch(self,ts,endBehavior='halt'):
+        """Returns just the velocity components of the result, as an N x d
+        array"""
+        res = Trajectory.eval_state_batch(self,ts,endBehavior)
+        return res[:,res.shape[1]//2:]
+
+    def eval_accel_batch(self,ts,endBehavior='halt'):
+        """Returns just the acceleration components of the derivative, as an
+        N x d array"""
+        res = Trajectory.deriv_state_batch(self,ts,endBehavior)
+        return res[:,res.shape[1]//2:]
+
     def interpolate_state(self,a,b,u,dt):
         assert len(a)==len(b)
         x1,v1 = a[:len(a)//2],vectorops.mul(a[len(a)//2:],dt)
@@ -972,12 +1473,39 @@ class HermiteTrajectory(Trajectory):
         ddx = vectorops.mul(spline.hermite_deriv(x1,v1,x2,v2,u,order=2),1.0/pow(dt,2))
         return dx+ddx
 
+    def interpolate_state_batch(self,a,b,u,dt):
+        import numpy as np
+        n = a.shape[1]//2
+        dt = dt[:,np.newaxis]
+        u = u[:,np.newaxis]
+        x1,v1 = a[:,:n],a[:,n:]*dt
+        x2,v2 = b[:,:n],b[:,n:]*dt
+        u2 = u*u
+        u3 = u2*u
+        x = (2.0*u3-3.0*u2+1.0)*x1 + (-2.0*u3+3.0*u2)*x2 + (u3-2.0*u2+u)*v1 + (u3-u2)*v2
+        dx = (6.0*u2-6.0*u)*(x1-x2) + (3.0*u2-4.0*u+1.0)*v1 + (3.0*u2-2.0*u)*v2
+        return np.hstack((x,dx/dt))
+
+    def difference_state_batch(self,a,b,u,dt):
+        import numpy as np
+        n = a.shape[1]//2
+        dt = dt[:,np.newaxis]
+        u = u[:,np.newaxis]
+        x1,v1 = a[:,:n],a[:,n:]*dt
+        x2,v2 = b[:,:n],b[:,n:]*dt
+        u2 = u*u
+        dx = (6.0*u2-6.0*u)*(x1-x2) + (3.0*u2-4.0*u+1.0)*v1 + (3.0*u2-2.0*u)*v2
+        ddx = (12.0*u-6.0)*(x1-x2) + (6.0*u-4.0)*v1 + (6.0*u-2.0)*v2
+        return np.hstack((dx/dt,ddx/dt**2))
+
     def discretize(self,dt):
         """Creates a discretized piecewise linear Trajectory in config space
         that approximates this curve with resolution dt.
         """
         res = self.discretize_state(dt)
         n = len(res.milestones[0])//2
+        if res.isCompact():
+            return Trajectory(res.times,res.milestones.array[:,:n])
         return Trajectory(res.times,[m[:n] for m in res.milestones])
 
     def length(self):
@@ -1018,7 +1546,9 @@ class HermiteTrajectory(Trajectory):
         for d in dofs:
             if abs(d) >= n:
                 raise ValueError("Invalid dof")
-        return self.constructor([t for t in self.times],[[m[j] for j in dofs] + [m[n+j] for j in dofs] for m in self.milestones])
+        if self.isCompact():
+            return self.constructor()(self.times[:],self.milestones.array[:,list(dofs)+[n+j for j in dofs]])
+        return self.constructor()([t for t in self.times],[[m[j] for j in dofs] + [m[n+j] for j in dofs] for m in self.milestones])
 
     def stackDofs(self,trajs,strict=True):
         """Stacks the degrees of freedom of multiple trajectories together.
@@ -1045,9 +1575,15 @@ class HermiteTrajectory(Trajectory):
             for t in traj.times:
                 alltimes.add(t)
         self.times = sorted(alltimes)
-        stacktrajs = [traj.remesh(self.times) for traj in trajs]
+        stacktrajs = [traj.remesh(self.times)[0] for traj in trajs]
         for traj in stacktrajs:
             assert len(traj.milestones) == len(self.times)
+        if self.isCompact() or any(traj.isCompact() for traj in trajs):
+            import numpy as np
+            arrays = [np.asarray(traj.milestones,dtype=float) for traj in stacktrajs]
+            self.times = ArrayListView(np.array(self.times,dtype=float))
+            self.milestones = ArrayListView(np.hstack([a[:,:a.shape[1]//2] for a in arrays] + [a[:,a.shape[1]//2:] for a in arrays]))
+            return
         self.milestones = []
         for i,t in enumerate(self.times):
             q = []
@@ -1230,6 +1766,16 @@ class GeodesicHermiteTrajectory(Trajectory):
         """Returns the velocity at time t"""
         res = Trajectory.eval_state(self,t,endBehavior)
         return res[len(res)//2:]
+    def eval_batch(self,ts,endBehavior='halt'):
+        """Evaluates the configurations at many times, as an N x d array"""
+        self._skip_deriv = True
+        res = Trajectory.eval_state_batch(self,ts,endBehavior)
+        self._skip_deriv = False
+        return res[:,:res.shape[1]//2]
+    def deriv_batch(self,ts,endBehavior='halt'):
+        """Returns the velocities at many times, as an N x d array"""
+        res = Trajectory.eval_state_batch(self,ts,endBehavior)
+        return res[:,res.shape[1]//2:]
     def length(self,metric=None):
         """Upper bound on the length"""
         if metric is None:
@@ -1400,6 +1946,375 @@ class SE3HermiteTrajectory(GeodesicHermiteTrajectory):
         return SE3HermiteTrajectory
 
 
+class StreamingTrajectory(Trajectory):
+    """A piecewise-linear trajectory with a bounded capacity, to which
+    milestones are appended at the end and dropped from the start, as in
+    receding-horizon control.  :meth:`append` and :meth:`drop_before` are
+    O(1) amortized, and when the capacity is reached the oldest milestone is
+    dropped.
+
+    The milestones are kept in a ring buffer in which each entry is written
+    twice, so the current window is always a contiguous array. The times
+    and milestones attributes are :class:`ArrayListView` objects referring
+    to this window, so eval, deriv, the batch evaluators, and
+    :func:`execute_trajectory` work as with a compact Trajectory.  They
+    should not be modified except through append, drop_before, and clear.
+
+    Example::
+
+        traj = StreamingTrajectory(100)
+        traj.append(0.0,q0)
+        traj.append(0.1,q1)
+        ...
+        traj.drop_before(t)  #keeps the milestone active at time t
+        q = traj.eval(t)
+
+    """
+    def __init__(self,capacity=1000):
+        Trajectory.__init__(self)
+        assert capacity >= 2,"Capacity must be at least 2"
+        self.capacity = capacity
+        self._times = None
+        self._milestones = None
+        self._start = 0
+        self._count = 0
+        self._update_views()
+
+    def _update_views(self):
+        if self._times is None:
+            self.times = []
+            self.milestones = []
+        else:
+            self.times = ArrayListView(self._times[self._start:self._start+self._count])
+            self.milestones = ArrayListView(self._milestones[self._start:self._start+self._count])
+
+    def compact(self):
+        return self
+
+    def isCompact(self):
+        return self._times is not None
+
+    def append(self,t,q,dq=None):
+        """Appends the milestone q at time t, which must be no earlier than
+        endTime().  If dq is given, the milestone stored is q + dq.
+        """
+        import numpy as np
+        x = q if dq is None else list(q)+list(dq)
+        if self._times is None:
+            self._times = np.zeros(self.capacity*2)
+            self._milestones = np.zeros((self.capacity*2,len(x)))
+        elif t < self._times[self._start+self._count-1]:
+            raise ValueError("Can't append a milestone at time %f before the end time %f"%(t,self.endTime()))
+        if self._count == self.capacity:
+            self._start = (self._start+1) % self.capacity
+            self._count -= 1
+        i = (self._start+self._count) % self.capacity
+        self._times[i] = self._times[i+self.capacity] = t
+        self._milestones[i] = self._milestones[i+self.capacity] = x
+        self._count += 1
+        self._update_views()
+
+    def drop_before(self,t):
+        """Drops all milestones that are no longer needed to evaluate the
+        trajectory at times >= t, i.e., those before the segment containing
+        t.
+        """
+        if self._count == 0:
+            return
+        import numpy as np
+        k = np.searchsorted(self.times.array,t,'right')-1
+        if k > 0:
+            k = min(k,self._count-1)
+            self._start = (self._start+k) % self.capacity
+            self._count -= k
+            self._update_views()
+
+    def clear(self):
+        """Removes all milestones."""
+        self._start = 0
+        self._count = 0
+        if self._times is not None:
+            self._update_views()
+
+
+class StreamingHermiteTrajectory(StreamingTrajectory,HermiteTrajectory):
+    """A :class:`StreamingTrajectory` with the cubic Hermite interpolation
+    of :class:`HermiteTrajectory`.  Each milestone is appended along with its
+    derivative using ``append(t,q,dq)``.
+    """
+    def __init__(self,capacity=1000):
+        StreamingTrajectory.__init__(self,capacity)
+
+    def append(self,t,q,dq):
+        """Appends the milestone q with derivative dq at time t, which must
+        be no earlier than endTime()."""
+        assert len(q) == len(dq),"Milestone and derivative must have the same size"
+        StreamingTrajectory.append(self,t,q,dq)
+
+
+class TrajectoryCursor:
+    """Evaluates a trajectory at times that (mostly) move forward, such as
+    in a real-time playback or servo loop.
+
+    The cursor remembers the last segment index, so that advancing to the
+    next time takes amortized O(1) time rather than the O(log n) bisection
+    used by :meth:`Trajectory.getSegment`.  For looping trajectories, the
+    start time of the current loop is also cached.  If the time jumps
+    backward, or far ahead, the cursor falls back to bisection.
+
+    eval and deriv return the same values as the trajectory's eval and
+    deriv methods.
+
+    If the trajectory's times are modified, call :meth:`reset`.
+
+    Attributes:
+        traj (Trajectory): the trajectory being evaluated.
+        endBehavior (str): either 'halt' or 'loop'.
+        index (int): the current segment index.
+    """
+    def __init__(self,traj,endBehavior='halt'):
+        self.traj = traj
+        self.endBehavior = endBehavior
+        self.reset()
+
+    def reset(self):
+        """Forgets the current segment index."""
+        self.index = 0
+        self.loopStart = 0.0
+
+    def getSegment(self,t):
+        """Returns the index and interpolation parameter for the segment at
+        time t, like :meth:`Trajectory.getSegment`."""
+        times = self.traj.times
+        n = len(times)
+        if n==0:
+            raise ValueError("Empty trajectory")
+        if n==1:
+            return (-1,0)
+        if t > times[-1]:
+            if self.endBehavior == 'loop':
+                if times[-1] == 0:
+                    t = 0
+                else:
+                    if not (self.loopStart <= t < self.loopStart + times[-1]):
+                        self.loopStart = math.floor(t/times[-1])*times[-1]
+                    t = t - self.loopStart
+            else:
+                return (n-1,0)
+        if t >= times[-1]:
+            return (n-1,0)
+        if t <= times[0]:
+            return (-1,0)
+        i = self.index
+        if i < 0 or i+1 >= n or t < times[i]:
+            #jumped backward or the trajectory changed
+            i = bisect.bisect_right(times,t)-1
+        else:
+            steps = 0
+            while times[i+1] <= t:
+                i += 1
+                steps += 1
+                if steps >= 4:
+                    #jumped far ahead
+                    i = bisect.bisect_right(times,t,i)-1
+                    break
+        self.index = i
+        return (i,(t-times[i])/(times[i+1]-times[i]))
+
+    def eval_state(self,t):
+        """Returns the trajectory's state at time t."""
+        traj = self.traj
+        i,u = self.getSegment(t)
+        if i<0: return traj.milestones[0]
+        elif i+1>=len(traj.milestones): return traj.milestones[-1]
+        return traj.interpolate_state(traj.milestones[i],traj.milestones[i+1],u,traj.times[i+1]-traj.times[i])
+
+    def deriv_state(self,t):
+        """Returns the derivative of the trajectory's state at time t."""
+        traj = self.traj
+        i,u = self.getSegment(t)
+        if i<0: return [0.0]*len(traj.milestones[0])
+        elif i+1>=len(traj.milestones): return [0.0]*len(traj.milestones[-1])
+        return traj.difference_state(traj.milestones[i+1],traj.milestones[i],u,traj.times[i+1]-traj.times[i])
+
+    def eval(self,t):
+        """Evaluates the trajectory at time t, like ``traj.eval(t)``."""
+        if isinstance(self.traj,GeodesicHermiteTrajectory):
+            self.traj._skip_deriv = True
+            try:
+                res = self.eval_state(t)
+            finally:
+                self.traj._skip_deriv = False
+            return self.traj.waypoint(res)
+        return self.traj.waypoint(self.eval_state(t))
+
+    def deriv(self,t):
+        """Evaluates the trajectory velocity at time t, like
+        ``traj.deriv(t)``."""
+        if isinstance(self.traj,(HermiteTrajectory,GeodesicHermiteTrajectory)):
+            res = self.eval_state(t)
+            res = res[len(res)//2:]
+        else:
+            res = self.deriv_state(t)
+        if isinstance(self.traj,(SE3Trajectory,SE3HermiteTrajectory)):
+            return self.traj.to_se3(res)
+        return res
+
+
+def _time_optimal_trajectory(milestones,smoothing,vmax,amax):
+    """Time-optimal parameterization of the path through milestones under
+    velocity limits vmax and acceleration limits amax, using reachability
+    analysis (TOPP-RA) on a grid over the path.  The path starts and ends at
+    rest.  Helper for path_to_trajectory(...,timing='optimal').
+
+    Each grid point i has path parameter s[i], and the squared path
+    speed x = ds/dt^2 and path acceleration u = d^2s/dt^2 are subject to
+    linear constraints.  A backward pass computes the largest x from which
+    the end of the path can be reached, and a forward pass greedily picks
+    the largest u that stays within these sets.  Since the limits are only
+    imposed at the grid points, the passes are repeated with lower speeds
+    wherever the Hermite segments between grid points violate them.
+
+    Returns:
+        HermiteTrajectory
+    """
+    import numpy as np
+    qs = np.asarray(milestones,dtype=float)
+    #repeated milestones have no extent along the path
+    qs = qs[np.concatenate(([True],np.any(qs[1:] != qs[:-1],axis=1)))]
+    d = qs.shape[1]
+    if len(qs) == 1:
+        return HermiteTrajectory([0.0],[qs[0].tolist()],[[0.0]*d])
+    lengths = np.linalg.norm(qs[1:]-qs[:-1],axis=1)
+    sknots = np.concatenate(([0.0],np.cumsum(lengths)))
+    #about 100 grid points over the whole path, and at least 2 per segment
+    nsub = np.maximum(2,np.ceil(lengths*(100.0/sknots[-1])).astype(int))
+    seg = np.repeat(np.arange(len(lengths)),nsub)
+    u = (np.arange(len(seg)) - np.repeat(np.cumsum(nsub)-nsub,nsub))/nsub[seg]
+    seg = np.concatenate((seg,[len(lengths)-1]))
+    u = np.concatenate((u,[1.0]))
+    s = sknots[seg] + lengths[seg]*u
+    L = lengths[seg][:,np.newaxis]
+    stop = np.zeros(len(s),dtype=bool)
+    if smoothing == 'spline':
+        spath = HermiteTrajectory()
+        spath.makeSpline(Trajectory(sknots.tolist(),qs.tolist()))
+        V = np.asarray(spath.milestones)[:,d:]
+        x1,x2 = qs[seg],qs[seg+1]
+        v1,v2 = V[seg]*L,V[seg+1]*L
+        U = u[:,np.newaxis]
+        q = (2*U**3-3*U**2+1)*x1 + (3*U**2-2*U**3)*x2 + (U**3-2*U**2+U)*v1 + (U**3-U**2)*v2
+        dq = ((6*U**2-6*U)*(x1-x2) + (3*U**2-4*U+1)*v1 + (3*U**2-2*U)*v2)/L
+        ddq = ((12*U-6)*(x1-x2) + (6*U-4)*v1 + (6*U-2)*v2)/L**2
+    else:
+        dirs = (qs[1:]-qs[:-1])/lengths[:,np.newaxis]
+        q = qs[seg] + (qs[seg+1]-qs[seg])*u[:,np.newaxis]
+        dq = dirs[seg]
+        ddq = np.zeros(q.shape)
+        #stop at the corners of a piecewise linear path
+        corners = np.sum(dirs[1:]*dirs[:-1],axis=1) < 1.0-1e-8
+        stop[np.cumsum(nsub)[:-1][corners]] = True
+
+    if hasattr(vmax,'__iter__'):
+        vlim,vnorm = np.asarray(vmax,dtype=float),float('inf')
+    else:
+        vlim,vnorm = np.full(d,float('inf')),float(vmax)
+    if hasattr(amax,'__iter__'):
+        alim = np.asarray(amax,dtype=float)
+    else:
+        alim = np.full(d,float(amax)/math.sqrt(d))
+    N = len(s)-1
+    c = 0.5/np.diff(s)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        absdq = np.abs(dq)
+        moving = absdq > 1e-9
+        #velocity limits: |dq| sqrt(x) <= vmax
+        xmax = np.min(np.where(moving,(vlim/absdq)**2,np.inf),axis=1)
+        xmax = np.minimum(xmax,vnorm**2/np.sum(dq**2,axis=1))
+        xmax[stop] = 0.0
+        #acceleration limits: |dq u + ddq x| <= amax, i.e., u in [-w-r*x,w-r*x]
+        w = np.where(moving,alim/absdq,np.inf)
+        r = np.where(moving,ddq/dq,0.0)
+        xmax = np.minimum(xmax,np.min(np.where(moving,np.inf,alim/np.abs(ddq)),axis=1))
+        #the u intervals of all axes must intersect
+        dr = r[:,:,np.newaxis] - r[:,np.newaxis,:]
+        wsum = w[:,:,np.newaxis] + w[:,np.newaxis,:]
+        xmax = np.minimum(xmax,np.min(np.where(dr > 0,wsum/dr,np.inf),axis=(1,2)))
+        #the next state must have x >= 0
+        rc = r[:N] - c[:,np.newaxis]
+        xmax[:N] = np.minimum(xmax[:N],np.min(np.where(rc > 0,w[:N]/rc,np.inf),axis=1))
+    #the Hermite segments between grid points may exceed the limits even if
+    #the grid points satisfy them, e.g., where the spline nearly stops at a
+    #milestone.  The path speed is lowered at the ends of such segments until
+    #all segments satisfy the limits.
+    for iters in range(50):
+        #backward pass: controllable sets [0,K[i]]
+        K = np.empty(N+1)
+        K[N] = 0.0
+        for i in range(N-1,-1,-1):
+            den = c[i] - r[i]
+            with np.errstate(divide='ignore',invalid='ignore'):
+                bound = np.where(den > 0,(K[i+1]*c[i] + w[i])/den,np.inf)
+            K[i] = min(xmax[i],bound.min())
+        #forward pass: greedy maximum path acceleration
+        x = np.zeros(N+1)
+        for i in range(N):
+            umax = min(np.min(w[i] - r[i]*x[i]),(K[i+1]-x[i])*c[i])
+            x[i+1] = min(max(x[i] + umax/c[i],0.0),K[i+1])
+        sdot = np.sqrt(x)
+        spd = sdot[:-1] + sdot[1:]
+        with np.errstate(divide='ignore'):
+            #an interval can always be traversed from rest to rest by a cubic
+            #with peak acceleration 6*ds/dt^2, which is faster for (nearly)
+            #stopped intervals
+            wrest = np.minimum(np.min(w[:-1],axis=1),np.min(w[1:],axis=1))
+            dts = np.minimum(1.0/(c*spd),np.sqrt(3.0/(c*wrest)))
+        if not np.all(np.isfinite(dts) & (dts > 0)):
+            raise ValueError("Could not find a feasible timing, vmax and amax may be too small")
+        vel = dq*sdot[:,np.newaxis]
+        ratio = _hermite_limit_ratio(q,vel,dts,vlim,vnorm,alim)
+        bad = ratio > 1.0 + 1e-6
+        if not np.any(bad):
+            break
+        #scaling the path speed by 1/sqrt(ratio) scales the accelerations by
+        #about 1/ratio
+        xmax[:-1][bad] = np.minimum(xmax[:-1][bad],x[:-1][bad]/ratio[bad])
+        xmax[1:][bad] = np.minimum(xmax[1:][bad],x[1:][bad]/ratio[bad])
+    else:
+        #fall back to slowing down the whole trajectory
+        scale = math.sqrt(ratio.max())
+        dts *= scale
+        vel /= scale
+    times = np.concatenate(([0.0],np.cumsum(dts)))
+    return HermiteTrajectory(times.tolist(),q.tolist(),vel.tolist())
+
+def _hermite_limit_ratio(x,v,dts,vlim,vnorm,alim):
+    """For the cubic Hermite segments with endpoints x[i],x[i+1], endpoint
+    velocities v[i],v[i+1], and durations dts[i], returns the factor by which
+    each segment's squared velocity or acceleration exceeds the limits, or
+    less than 1 if the segment satisfies them.
+    """
+    import numpy as np
+    h = dts[:,np.newaxis]
+    dx = (x[1:]-x[:-1])/h
+    v0,v1 = v[:-1],v[1:]
+    #the acceleration is linear, so it is largest at the endpoints
+    a0 = (6*dx - 4*v0 - 2*v1)/h
+    a1 = (-6*dx + 2*v0 + 4*v1)/h
+    ratio = np.max(np.maximum(np.abs(a0),np.abs(a1))/alim,axis=1)
+    #the velocity is quadratic, so check its extrema and a few samples for
+    #the norm
+    c2 = 3*(v0 + v1) - 6*dx
+    c1 = 6*dx - 4*v0 - 2*v1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        tex = np.clip(np.where(c2 != 0,-0.5*c1/c2,0.0),0.0,1.0)
+    vex = (c2*tex + c1)*tex + v0
+    ratio = np.maximum(ratio,np.max(np.abs(vex)/vlim,axis=1)**2)
+    if vnorm < float('inf'):
+        for u in np.linspace(0,1,9):
+            vu = (c2*u + c1)*u + v0
+            ratio = np.maximum(ratio,np.sum(vu**2,axis=1)/vnorm**2)
+    return ratio
 
 def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline',
     stoptol=None,vmax='auto',amax='auto',
@@ -1458,6 +2373,10 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
 
           In these cases, vmax and amax are ignored.
 
+        - timing='optimal': computes the time-optimal timing along the
+          (smoothed) path subject to vmax and amax, and returns a
+          HermiteTrajectory.  velocities is ignored.
+
         - If path uses non-Euclidean interpolation, then smoothing=None should be
           provided.  Smoothing is not yet supported for non-Euclidean spaces (e.g.,
           robots with special joints, SO3, SE3).
@@ -1504,6 +2423,13 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
             - 'sqrt-L2', 'sqrt-Linf', or 'sqrt-robot': base timing is set
               proportional to the square root of the L2, Linf, or robot
               distance between milestones
+            - 'optimal': time-optimal path parameterization under the vmax
+              and amax limits, computed by reachability analysis (TOPP-RA)
+              on a grid over the path. The path starts and stops at rest.
+              If smoothing=None, the trajectory also stops at each corner
+              of the path.  Limits are enforced at the grid points, so a
+              smoothed path may slightly exceed amax between them. Running
+              time is linear in the number of milestones.
             - a list or tuple: the base timing is given in this list
             - callable function f(a,b): sets the normalization to the function
               f(a,b).
@@ -1517,7 +2443,8 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
             end of the path.  If 0, it pauses at every milestone. Otherwise,
             it pauses if the curvature at the milestone exceeds stoptol.
 
-        vmax (optional): only meaningful if timing=='limited'. Can be:
+        vmax (optional): only meaningful if timing=='limited' or 'optimal'.
+            Can be:
 
             - 'auto' (default): either 1 or the robot's joint velocity limits
               if a RobotTrajectory is provided
@@ -1526,12 +2453,14 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
             - a list of positive floats: the element-wise derivative of the
               result trajectory is limited to this value
 
-        amax (optional): only meaningful if timing=='limited'. Can be:
+        amax (optional): only meaningful if timing=='limited' or 'optimal'.
+            Can be:
 
             - 'auto' (default): either 4 or the robot's joint acceleration
               limits if a RobotTrajectory is provided
             - a positive number: the L2 norm of the acceleration of the result
-              trajectory is limited to this value
+              trajectory is limited to this value.  (With timing='optimal',
+              each element is conservatively limited to amax/sqrt(d).)
             - a list of positive floats: the element-wise acceleration of the
               result trajectory is limited to this value.
 
@@ -1565,12 +2494,12 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
             and respects the limits defined in the arguments.
     """
     assert dt > 0.0,"dt has to be positive"
-    if vmax == 'auto' and (timing == 'limited' or speed == 'limited'):
+    if vmax == 'auto' and (timing in ['limited','optimal'] or speed == 'limited'):
         if isinstance(path,RobotTrajectory):
             vmax = path.robot.getVelocityLimits()
         else:
             vmax = 1.0
-    if amax == 'auto' and (timing == 'limited' or speed == 'limited'):
+    if amax == 'auto' and (timing in ['limited','optimal'] or speed == 'limited'):
         if isinstance(path,RobotTrajectory):
             amax = path.robot.getAccelerationLimits()
         else:
@@ -1596,7 +2525,7 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
             if timing == 'path':
                 _durations = [(b-a) for a,b in zip(path.times[:-1],path.times[1:])]
         if _durations is None:
-            if timing == 'limited':
+            if timing in ['limited','optimal']:
                 if hasattr(vmax,'__iter__'):
                     if not all(v >= 0 for v in vmax):
                         raise ValueError("Invalid value for vmax, must be positive")
@@ -1610,6 +2539,10 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
                 else:
                     if not amax >= 0:
                         raise ValueError("Invalid value for amax, must be positive")
+            if timing == 'optimal':
+                #only used to determine stop milestones
+                _durations = [vectorops.distance(a,b) for a,b in zip(milestones[:-1],milestones[1:])]
+            elif timing == 'limited':
                 _durations = [0.0]*(len(milestones)-1)
                 for i in range(len(milestones)-1):
                     q,n = milestones[i],milestones[i+1]
@@ -1703,6 +2636,16 @@ def path_to_trajectory(path,velocities='auto',timing='limited',smoothing='spline
     #milestones and _durations are lists
     #start and stop at beginning / end
     #speed = 1 or 'limited'
+    if timing == 'optimal':
+        if startvel != 0.0 or endvel != 0.0:
+            print("path_to_trajectory(): WARNING: respecting nonzero start/end velocity not implemented yet")
+        res = _time_optimal_trajectory(milestones,smoothing,vmax,amax)
+        if verbose >= 1:
+            print("path_to_trajectory(): Time-optimal duration",res.times[-1])
+        if isinstance(speed,(int,float)) and speed != 1.0:
+            res.times = vectorops.mul(res.times,1.0/speed)
+            res.milestones = [m[:len(m)//2]+vectorops.mul(m[len(m)//2:],speed) for m in res.milestones]
+        return res
     normalizedPath = Trajectory()
     if isinstance(path,RobotTrajectory):
         normalizedPath = RobotTrajectory(path.robot)
@@ -1950,7 +2893,8 @@ def execute_trajectory(trajectory,controller,speed=1.0,smoothing=None,activeDofs
     """Sends a timed trajectory to a controller.
 
     Args:
-        trajectory (Trajectory): a Trajectory, RobotTrajectory, or HermiteTrajectory instance
+        trajectory (Trajectory): a Trajectory, RobotTrajectory, or HermiteTrajectory instance,
+            including a StreamingTrajectory or StreamingHermiteTrajectory
         controller (SimRobotController): the controller to execute the trajectory
         speed (float, optional): modulates the speed of the path.
         smoothing (str, optional): any smoothing applied to the path.  Only valid for piecewise
@@ -6,6 +6,7 @@ classes.
 from . import motionplanning
 import random
 import warnings
+import time
 
 class CSpace:
     """Used alongside :class:`MotionPlan` to define a configuration space for
@@ -152,23 +153,32 @@ class CSpace:
         """
         return [random.uniform(max(b[0],ci-r),min(b[1],ci+r)) for ci,b in zip(c,self.bound)]
 
-    def addFeasibilityTest(self,func,name=None,dependencies=None):
+    def addFeasibilityTest(self,func,name=None,dependencies=None,batch=None):
         """Adds a new feasibility test with the given function func(x) and the specified name.
         If name is not provided (default) a default name is generated.
 
         If dependencies is provided, it can be a string or a list of strings, 
         indicating that this test must be called after some other test(s).
+
+        If batch is provided, it is a vectorized version of func that takes
+        an N x d numpy array and returns a length-N bool array.  It is used
+        by :meth:`feasible_batch`.
         """
         if self.feasibilityTests is None:
             self.feasibilityTests = []
             self.feasibilityTestNames = []
             self.feasibilityTestDependencies = []
+        if batch is not None:
+            if not hasattr(self,'feasibilityTestBatches'):
+                self.feasibilityTestBatches = {}
         assert name is None or isinstance(name,str),"Name argument 'name' must be a string"
         assert callable(func),"Feasibility test 'func' must be a callable object"
         self.feasibilityTests.append(func)
         if name is None:
             name = "test_"+str(len(self.feasibilityTests)-1)
         self.feasibilityTestNames.append(name)
+        if batch is not None:
+            self.feasibilityTestBatches[name] = batch
         if dependencies is not None:
             if isinstance(dependencies,(list,tuple)):
                 for d in dependencies:
@@ -191,6 +201,59 @@ class CSpace:
                 if not test(x): return False
             return True
 
+    def feasible_batch(self,X,stats=False):
+        """Tests the feasibility of many configurations at once.
+
+        Each feasibility test is run only on the configurations that passed
+        the previous tests.  Tests with a vectorized version (see the batch
+        argument of :meth:`addFeasibilityTest`) process all remaining
+        configurations at once, while others are called per configuration.
+        Tests that have dependencies or are depended on may have side
+        effects (e.g., setting a robot's configuration), so they are run
+        in sequence for each configuration, after the independent tests.
+
+        Args:
+            X (array-like): an N x d array of configurations.
+            stats (bool, optional): if True, also returns the per-test
+                statistics of this call, in the format of :meth:`getStats`.
+
+        Returns:
+            array: a length-N bool array, or a pair (feasible,stats) if
+            stats=True.
+        """
+        import numpy as np
+        X = np.asarray(X,dtype=float)
+        t0 = time.time()
+        if self.feasibilityTests is None:
+            tests,names,deps = [self.feasible],['feasible'],[]
+        else:
+            tests,names,deps = self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies
+        batches = getattr(self,'feasibilityTestBatches',{})
+        chained = set([a for (a,b) in deps] + [b for (a,b) in deps])
+        counter = _FeasibilityBatchStats(names)
+        alive = np.arange(len(X))
+        for f,n in zip(tests,names):
+            if n in chained or len(alive) == 0:
+                continue
+            t = time.time()
+            if n in batches:
+                res = np.asarray(batches[n](X[alive]),dtype=bool)
+            else:
+                res = np.array([bool(f(x)) for x in X[alive].tolist()],dtype=bool)
+            counter.add(n,len(alive),int(np.count_nonzero(res)),time.time()-t)
+            alive = alive[res]
+        chain = [(f,n) for (f,n) in zip(tests,names) if n in chained]
+        if len(chain) > 0:
+            res = np.zeros(len(alive),dtype=bool)
+            for k,x in enumerate(X[alive].tolist()):
+                res[k] = counter.chain(chain,x)
+            alive = alive[res]
+        feasible = np.zeros(len(X),dtype=bool)
+        feasible[alive] = True
+        if stats:
+            return feasible,counter.stats(len(X),len(alive),time.time()-t0)
+        return feasible
+
     def isFeasible(self,x):
         """An overload for self.cspace.isFeasible.  Use this to test feasibility of a configuration
         (rather than feasible()) if you wish to take advantage of adaptive feasibility testing and
@@ -210,6 +273,42 @@ class CSpace:
         if self.cspace is None: return {}
         return self.cspace.getStats()
 
+class _FeasibilityBatchStats:
+    """Accumulates per-test counts for :meth:`CSpace.feasible_batch`"""
+    def __init__(self,names):
+        self.names = names
+        self.counts = dict((n,[0,0,0.0]) for n in names)
+
+    def add(self,name,count,passed,time):
+        c = self.counts[name]
+        c[0] += count
+        c[1] += passed
+        c[2] += time
+
+    def chain(self,tests,x):
+        """Runs the tests on x in sequence, returning True if all pass"""
+        for f,n in tests:
+            t = time.time()
+            res = f(x)
+            self.add(n,1,1 if res else 0,time.time()-t)
+            if not res:
+                return False
+        return True
+
+    def stats(self,count,passed,time):
+        """Returns the statistics in the format of CSpace.getStats()"""
+        res = {'feasible_count':str(count),
+               'feasible_probability':str(float(passed)/count if count > 0 else 0.0),
+               'feasible_time':str(time/count if count > 0 else 0.0)}
+        for n in self.names:
+            c = self.counts[n]
+            if c[0] == 0: continue
+            res[n+'_count'] = str(c[0])
+            res[n+'_probability'] = str(float(c[1])/c[0])
+            res[n+'_time'] = str(c[2]/c[0])
+        return res
+
+
 class MotionPlan:
     """A motion planner instantiated on a space.  Currently supports
     only kinematic, point-to-point, or point-to-set plans.
@@ -423,6 +522,296 @@ class MotionPlan:
             c += sum(self.edgeCost(a,b) for (a,b) in zip(path[:-1],path[1:]))
         return c
 
+    async def plan_async(self,deadline,on_improve=None,optimizing=True,increment=10,process=False):
+        """Plans in the background without blocking the asyncio event loop,
+        e.g., ``path = await plan.plan_async(1.0,on_improve=cb)``.
+
+        Planning stops at the deadline, when the first path is found (if
+        not optimizing), or when the awaiting task is cancelled.  The plan
+        and its space must not be used elsewhere while planning.
+
+        By default, planning runs in a worker thread.  planMore holds the
+        GIL, except while it calls the space's Python callbacks, so the
+        event loop may lag by up to an increment's worth of planning;
+        decrease increment to make it more responsive.  If process=True,
+        planning runs in a forked process, which does not compete for the
+        GIL and is stopped exactly at the deadline.  However, the state of
+        this plan is not updated; only the paths are returned.
+
+        Args:
+            deadline (float): the time budget, in seconds.
+            on_improve (function, optional): called in the event loop as
+                on_improve(path,cost) each time a path of lower cost is found.
+                May be a coroutine function.
+            optimizing (bool): if False, returns the first path found.  If
+                True, keeps improving the path until the deadline.
+            increment (int): the number of iterations per call to planMore.
+                A thread checks the deadline and cancellation between calls.
+            process (bool): whether to plan in a forked process.
+
+        Returns:
+            list of configurations: the path of least cost, as measured by
+            :meth:`pathCost`, or None if no path was found.
+        """
+        import asyncio
+        import inspect
+        loop = asyncio.get_running_loop()
+        end = time.time() + deadline
+        messages = asyncio.Queue()
+        if process:
+            import multiprocessing
+            try:
+                ctx = multiprocessing.get_context('fork')
+            except ValueError:
+                warnings.warn("MotionPlan.plan_async: 'fork' start method not available, planning in a thread")
+                process = False
+        if process:
+            recv,send = ctx.Pipe(False)
+            worker = ctx.Process(target=_async_plan_worker,args=(self,end,optimizing,increment,send.send,None))
+            worker.daemon = True
+            worker.start()
+            send.close()
+            def onReadable():
+                try:
+                    messages.put_nowait(recv.recv())
+                except EOFError:
+                    loop.remove_reader(recv.fileno())
+                    messages.put_nowait(('done',None))
+            loop.add_reader(recv.fileno(),onReadable)
+        else:
+            import threading
+            stop = threading.Event()
+            post = lambda msg:loop.call_soon_threadsafe(messages.put_nowait,msg)
+            worker = threading.Thread(target=_async_plan_worker,args=(self,end,optimizing,increment,post,stop))
+            worker.daemon = True
+            worker.start()
+        bestpath,bestcost = None,None
+        try:
+            while True:
+                timeout = end - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    msg = await asyncio.wait_for(messages.get(),timeout)
+                except asyncio.TimeoutError:
+                    break
+                if msg[0] == 'done':
+                    break
+                if msg[0] == 'error':
+                    raise msg[1]
+                _,path,cost = msg
+                if bestcost is None or cost < bestcost:
+                    bestpath,bestcost = path,cost
+                    if on_improve is not None:
+                        res = on_improve(path,cost)
+                        if inspect.isawaitable(res):
+                            await res
+                if not optimizing:
+                    break
+        finally:
+            if process:
+                loop.remove_reader(recv.fileno())
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+                recv.close()
+            else:
+                stop.set()
+                #wait for the current planMore call, so that the plan can be reused
+                await loop.run_in_executor(None,worker.join)
+        return bestpath
+
+def _async_plan_worker(plan,deadline,optimizing,increment,post,stop):
+    """Runs in the worker thread or process of :meth:`MotionPlan.plan_async`.
+    Plans until the deadline, or until the threading.Event stop is set,
+    calling post(('path',path,cost)) for each improved path, and finally
+    post(('done',iterations)) or post(('error',exception))."""
+    iters = 0
+    try:
+        bestcost = float('inf')
+        while time.time() < deadline and (stop is None or not stop.is_set()):
+            plan.planMore(increment)
+            iters += increment
+            #costs are measured in the planner's space, before lifting
+            path = MotionPlan.getPath(plan)
+            if path is None or len(path) == 0:
+                continue
+            cost = plan.pathCost(path)
+            if cost < bestcost:
+                bestcost = cost
+                post(('path',plan.getPath(),cost))
+                if not optimizing:
+                    break
+    except Exception as e:
+        post(('error',e))
+        return
+    post(('done',iters))
+
+_parallel_plan_state = None
+
+def _parallel_plan_worker(index,seed,queue):
+    """Runs in a forked process.  Plans with the index'th plan of
+    :class:`ParallelMotionPlan` until a path is found (or, if optimizing,
+    until the deadline), reporting ('path',index,path,cost) messages for each
+    improved path and a final ('done',index,iterations) message."""
+    makePlan,deadline,best,increment = _parallel_plan_state
+    iters = 0
+    try:
+        random.seed(seed)
+        motionplanning.setRandomSeed(seed)
+        plan = makePlan(index)
+        if plan is None:
+            return
+        bestcost = float('inf')
+        while time.time() < deadline:
+            plan.planMore(increment)
+            iters += increment
+            #costs are measured in the planner's space, before lifting
+            path = MotionPlan.getPath(plan)
+            if path is None or len(path) == 0:
+                continue
+            cost = plan.pathCost(path)
+            if cost < bestcost:
+                bestcost = cost
+                queue.put(('path',index,plan.getPath(),cost))
+                if not best:
+                    return
+    finally:
+        queue.put(('done',index,iters))
+
+
+class ParallelMotionPlan:
+    """Races several independently seeded motion planners in separate
+    processes, which reduces the variance of planning time.
+
+    Each worker process calls ``makePlan(index)`` to build its own
+    :class:`MotionPlan` (including its space, and its world, if needed) and
+    runs ``planMore`` on it.  Planners are randomized with different seeds,
+    and makePlan may also create different planner types for different
+    indices.  Worker processes are forked, so makePlan may refer to
+    anything constructed in the calling process, e.g., a WorldModel.
+
+    Args:
+        makePlan (function): a function f(index) returning a MotionPlan with
+            its endpoints set, or None if planning is impossible.
+        processes (int): the number of planners to race.
+
+    Attributes:
+        path (list of configurations): the result of the last call to
+            :meth:`solve`, or None.
+        cost (float): the cost of path, as measured by
+            :meth:`MotionPlan.pathCost`.
+        index (int): the index of the planner that produced path.
+        stats (dict): the number of iterations run by each planner that
+            finished before it was cancelled, and the solution time.
+    """
+    def __init__(self,makePlan,processes):
+        self.makePlan = makePlan
+        self.processes = processes
+        self.path = None
+        self.cost = None
+        self.index = None
+        self.stats = {}
+
+    def solve(self,maxTime,optimizing=False,increment=10,seed=None):
+        """Runs the planners for up to maxTime seconds.
+
+        Args:
+            maxTime (float): the planning deadline, in seconds.
+            optimizing (bool): if False, returns the first path found by any
+                planner.  If True, planners keep improving their paths
+                until the deadline, and the path of least cost is returned.
+            increment (int): the number of iterations per call to planMore.
+                Planners check the deadline between calls.
+            seed (int, optional): the random seed of planner 0; planner k
+                uses seed+k.  If None, a random seed is chosen.
+
+        Returns:
+            list of configurations: the path, or None if no planner succeeded
+            before the deadline.  Remaining planners are cancelled when this
+            returns.
+        """
+        global _parallel_plan_state
+        if seed is None:
+            seed = random.randrange(1<<30)
+        t0 = time.time()
+        deadline = t0 + maxTime
+        self.path = None
+        self.cost = None
+        self.index = None
+        self.stats = {'iterations':{}}
+        import multiprocessing
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except ValueError:
+            warnings.warn("ParallelMotionPlan.solve: 'fork' start method not available, running a single planner")
+            ctx = None
+        if ctx is None:
+            plan = self.makePlan(0)
+            if plan is not None:
+                motionplanning.setRandomSeed(seed)
+                iters = 0
+                while time.time() < deadline:
+                    plan.planMore(increment)
+                    iters += increment
+                    path = MotionPlan.getPath(plan)
+                    if path is not None and len(path) > 0:
+                        cost = plan.pathCost(path)
+                        if self.cost is None or cost < self.cost:
+                            self.path,self.cost,self.index = plan.getPath(),cost,0
+                            self.stats['solution time'] = time.time()-t0
+                            if not optimizing: break
+                self.stats['iterations'][0] = iters
+                plan.close()
+            return self.path
+
+        queue = ctx.Queue()
+        _parallel_plan_state = (self.makePlan,deadline,optimizing,increment)
+        workers = []
+        try:
+            for k in range(self.processes):
+                p = ctx.Process(target=_parallel_plan_worker,args=(k,seed+k,queue))
+                p.daemon = True
+                p.start()
+                workers.append(p)
+        finally:
+            _parallel_plan_state = None
+        try:
+            running = len(workers)
+            while running > 0:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    msg = queue.get(timeout=timeout)
+                except Exception:
+                    #queue.Empty on timeout
+                    break
+                if msg[0] == 'done':
+                    running -= 1
+                    self.stats['iterations'][msg[1]] = msg[2]
+                else:
+                    _,index,path,cost = msg
+                    if self.cost is None or cost < self.cost:
+                        self.path,self.cost,self.index = path,cost,index
+                        self.stats['solution time'] = time.time()-t0
+                    if not optimizing:
+                        break
+        finally:
+            #cancel the remaining planners
+            for p in workers:
+                if p.is_alive():
+                    p.terminate()
+            for p in workers:
+                p.join()
+            queue.close()
+        return self.path
+
+    def getPath(self):
+        """Returns the path found by the last call to :meth:`solve`"""
+        return self.path
+
+
 optimizingPlanners = set(['fmm*','rrt*','prm*','lazyprm*','lazyrrg*'])
 """set: The set of natively optimizing planners. 
 
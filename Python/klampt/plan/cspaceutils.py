@@ -193,6 +193,15 @@ class EmbeddedCSpace(CSpace):
 
     def feasible(self,x):
         return self.ambientspace.feasible(self.lift(x))
+
+    def feasible_batch(self,X,stats=False):
+        """Lifts the N x k array X to the ambient space and calls its
+        feasible_batch method."""
+        import numpy as np
+        X = np.asarray(X,dtype=float)
+        Xamb = np.tile(np.asarray(self.xinit,dtype=float),(len(X),1))
+        Xamb[:,self.mapping] = X
+        return self.ambientspace.feasible_batch(Xamb,stats)
         
     def sample(self):
         return self.project(self.ambientspace.sample())
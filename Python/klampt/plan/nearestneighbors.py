@@ -0,0 +1,311 @@
+"""Nearest neighbor queries over configurations, for Python-side planners.
+
+:class:`NearestNeighbors` is an incremental KD-tree that supports the
+metrics of most configuration spaces: Euclidean, weighted Euclidean (see
+the 'metricWeights' CSpace property), and periodic dimensions, such as the
+spin joints of a :class:`~klampt.plan.robotcspace.RobotCSpace`.  Use
+:meth:`NearestNeighbors.fromSpace` to configure one for a CSpace.
+
+Points are inserted into a small buffer, which is merged into a set of
+static KD-trees whose sizes are powers of two (the logarithmic method), so
+that insertion and queries both take polylogarithmic time.  The
+``*_batch`` methods answer many queries at once with numpy.
+
+Example::
+
+    nn = NearestNeighbors.fromSpace(space)
+    for x in milestones:
+        nn.add(x)
+    d,i = nn.nearest(q)
+    close = nn.neighbors(q,0.5)
+
+Requires numpy.
+"""
+
+import math
+import heapq
+
+class _StaticTree:
+    """A KD-tree over a fixed set of points, with leaf buckets.  Nodes are
+    stored in flat lists.  Each node has a bounding box, and leaves hold
+    a range of self.index, the indices of the tree's points."""
+    def __init__(self,nn,index,leafSize):
+        import numpy as np
+        self.index = np.asarray(index)
+        Y = nn._Y[self.index]
+        self.lo = []
+        self.hi = []
+        self.children = []
+        self.range = []
+        order = np.arange(len(self.index))
+        stack = [(0,len(order),None,0)]
+        while stack:
+            start,end,parent,side = stack.pop()
+            node = len(self.lo)
+            if parent is not None:
+                self.children[parent][side] = node
+            pts = Y[order[start:end]]
+            lo = pts.min(axis=0)
+            hi = pts.max(axis=0)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.range.append((start,end))
+            if end - start <= leafSize:
+                self.children.append(None)
+                continue
+            self.children.append([None,None])
+            dim = int(np.argmax(hi - lo))
+            mid = (end - start)//2
+            part = np.argpartition(pts[:,dim],mid)
+            order[start:end] = order[start:end][part]
+            stack.append((start+mid,end,node,1))
+            stack.append((start,start+mid,node,0))
+        self.index = self.index[order]
+        self.Y = nn._Y[self.index]
+
+
+class NearestNeighbors:
+    """An incremental nearest neighbor index.
+
+    The distance between points a and b is
+    sqrt(sum_i w_i d_i(a_i,b_i)^2), where w are the weights and d_i is
+    |a_i-b_i|, or for a periodic dimension with period P,
+    min(|a_i-b_i| mod P, P - |a_i-b_i| mod P).
+
+    Args:
+        dim (int): the dimension of the points.
+        weights (list of float, optional): the metric weights w, which must
+            be nonnegative.  A dimension with weight 0 is ignored.  Defaults
+            to all 1.
+        periods (list of float, optional): the period of each dimension, or
+            0 for non-periodic dimensions.  Defaults to none periodic.
+        leafSize (int, optional): the maximum number of points in a
+            KD-tree leaf.
+        bufferSize (int, optional): the number of points inserted before
+            they are moved into a KD-tree.
+
+    Attributes:
+        dim (int): the dimension.
+        weights (ndarray): the metric weights.
+        periods (ndarray): the periods, 0 for non-periodic dimensions.
+    """
+    def __init__(self,dim,weights=None,periods=None,leafSize=16,bufferSize=64):
+        import numpy as np
+        self.dim = dim
+        self.weights = np.ones(dim) if weights is None else np.asarray(weights,dtype=float)
+        if np.any(self.weights < 0):
+            raise ValueError("Metric weights must be nonnegative")
+        self._scale = np.sqrt(self.weights)
+        self.periods = np.zeros(dim) if periods is None else np.asarray(periods,dtype=float)
+        self._periodic = np.nonzero((self.periods > 0) & (self.weights > 0))[0]
+        #periods in scaled coordinates
+        self._P = (self.periods*self._scale)[self._periodic]
+        self.leafSize = leafSize
+        self.bufferSize = bufferSize
+        #the points as given, and in scaled coordinates
+        self._X = np.empty((max(bufferSize,16),dim))
+        self._Y = np.empty((max(bufferSize,16),dim))
+        self._n = 0
+        self._trees = []
+        self._buffer = []
+
+    @staticmethod
+    def fromSpace(space,**options):
+        """Creates an index with the metric of a CSpace.  Uses the
+        'metricWeights' property, if present.  For a RobotCSpace, or an
+        EmbeddedCSpace of one, spin joints are treated as periodic
+        dimensions.
+
+        .. note::
+
+            Other non-Euclidean metrics, e.g., of free-floating bases, are
+            approximated by the (weighted) Euclidean metric.
+        """
+        x = space.sample()
+        dim = len(x)
+        weights = space.properties.get('metricWeights',None)
+        periods = None
+        robotspace = getattr(space,'ambientspace',space)
+        robot = getattr(robotspace,'robot',None)
+        if robot is not None and robotspace.properties.get('geodesic',0):
+            mapping = getattr(space,'mapping',list(range(dim)))
+            periods = [(2*math.pi if robot.getJointType(j) == 'spin' else 0) for j in mapping]
+        return NearestNeighbors(dim,weights,periods,**options)
+
+    def __len__(self):
+        return self._n
+
+    def point(self,index):
+        """Returns the point with the given index, as it was added"""
+        return self._X[index].tolist()
+
+    def _transform(self,X):
+        """Converts points to scaled coordinates, with periodic dimensions
+        in [0,P)"""
+        import numpy as np
+        Y = np.asarray(X,dtype=float)*self._scale
+        if len(self._periodic) > 0:
+            Y[...,self._periodic] = np.mod(Y[...,self._periodic],self._P)
+        return Y
+
+    def _diff(self,Y,y):
+        """Returns the per-dimension distances between the rows of Y and y"""
+        import numpy as np
+        D = np.abs(Y - y)
+        if len(self._periodic) > 0:
+            Dp = D[...,self._periodic]
+            D[...,self._periodic] = np.minimum(Dp,self._P - Dp)
+        return D
+
+    def add(self,x):
+        """Adds a point and returns its index.  Indices are consecutive,
+        starting from 0."""
+        import numpy as np
+        if self._n == len(self._Y):
+            self._X = np.vstack((self._X,np.empty(self._X.shape)))
+            self._Y = np.vstack((self._Y,np.empty(self._Y.shape)))
+        index = self._n
+        self._X[index] = x
+        self._Y[index] = self._transform(x)
+        self._n += 1
+        self._buffer.append(index)
+        if len(self._buffer) >= self.bufferSize:
+            #merge trees of at most the buffer's size (logarithmic method)
+            points = self._buffer
+            self._buffer = []
+            while len(self._trees) > 0 and len(self._trees[-1].index) <= len(points):
+                points = np.concatenate((self._trees.pop().index,points))
+            self._trees.append(_StaticTree(self,points,self.leafSize))
+        return index
+
+    def _boxDistance(self,tree,node,y):
+        """Returns a lower bound on the distance from y to the points in a
+        node's box"""
+        import numpy as np
+        lo = tree.lo[node]
+        hi = tree.hi[node]
+        g = np.maximum(lo - y,0) + np.maximum(y - hi,0)
+        if len(self._periodic) > 0:
+            p = self._periodic
+            yp = y[p]
+            #distance to the box's periodic images
+            below = yp < lo[p]
+            above = yp > hi[p]
+            gp = g[p]
+            gp[below] = np.minimum(gp[below],(yp + self._P - hi[p])[below])
+            gp[above] = np.minimum(gp[above],(lo[p] + self._P - yp)[above])
+            g[p] = gp
+        return math.sqrt(float(np.dot(g,g)))
+
+    def _search(self,y,k,r):
+        """Returns a list of (distance,index) pairs for the k nearest points
+        within distance r of y, in no particular order."""
+        import numpy as np
+        best = []   #max-heap of (-distance,index)
+        def bound():
+            return -best[0][0] if len(best) == k else r
+        def consider(D,indices):
+            d = np.sqrt(np.sum(D*D,axis=1))
+            for i in np.nonzero(d <= bound())[0]:
+                if len(best) < k:
+                    heapq.heappush(best,(-d[i],int(indices[i])))
+                elif d[i] < -best[0][0]:
+                    heapq.heapreplace(best,(-d[i],int(indices[i])))
+        if len(self._buffer) > 0:
+            consider(self._diff(self._Y[self._buffer],y),self._buffer)
+        for tree in self._trees:
+            stack = [(0.0,0)]
+            while stack:
+                lb,node = stack.pop()
+                if lb > bound():
+                    continue
+                children = tree.children[node]
+                if children is None:
+                    start,end = tree.range[node]
+                    consider(self._diff(tree.Y[start:end],y),tree.index[start:end])
+                    continue
+                b0 = self._boxDistance(tree,children[0],y)
+                b1 = self._boxDistance(tree,children[1],y)
+                #visit the nearer child first
+                if b0 <= b1:
+                    stack.append((b1,children[1]))
+                    stack.append((b0,children[0]))
+                else:
+                    stack.append((b0,children[0]))
+                    stack.append((b1,children[1]))
+        return [(-nd,i) for (nd,i) in best]
+
+    def nearest(self,x):
+        """Returns the (distance,index) pair of the point nearest to x, or
+        None if the index is empty."""
+        res = self.knearest(x,1)
+        return res[0] if len(res) > 0 else None
+
+    def knearest(self,x,k):
+        """Returns a list of (distance,index) pairs of the k points nearest
+        to x, sorted by increasing distance."""
+        return sorted(self._search(self._transform(x),k,float('inf')))
+
+    def neighbors(self,x,r):
+        """Returns a list of (distance,index) pairs of all points within
+        distance r of x, sorted by increasing distance."""
+        return sorted(self._search(self._transform(x),self._n,r))
+
+    def _distances_batch(self,Y):
+        """Returns the M x n matrix of distances from the rows of Y to all
+        points"""
+        import numpy as np
+        D2 = np.zeros((len(Y),self._n))
+        P = self._Y[:self._n]
+        pmap = dict((int(p),i) for i,p in enumerate(self._periodic))
+        for j in range(self.dim):
+            d = np.abs(Y[:,j,np.newaxis] - P[np.newaxis,:,j])
+            if j in pmap:
+                d = np.minimum(d,self._P[pmap[j]] - d)
+            D2 += d*d
+        return np.sqrt(D2)
+
+    def knearest_batch(self,X,k,chunk=256):
+        """Finds the k nearest points to each row of the M x dim array X.
+        Uses vectorized brute force, which is faster than tree search for
+        large numbers of queries.
+
+        Returns:
+            tuple: (D,I), M x k arrays of distances and indices, sorted by
+            increasing distance.  k is reduced to the number of points if
+            necessary.
+        """
+        import numpy as np
+        Y = self._transform(np.atleast_2d(X))
+        k = min(k,self._n)
+        D = np.empty((len(Y),k))
+        I = np.empty((len(Y),k),dtype=int)
+        for s in range(0,len(Y),chunk):
+            Dc = self._distances_batch(Y[s:s+chunk])
+            if k < self._n:
+                Ic = np.argpartition(Dc,k,axis=1)[:,:k]
+            else:
+                Ic = np.tile(np.arange(self._n),(len(Dc),1))
+            Dk = np.take_along_axis(Dc,Ic,axis=1)
+            order = np.argsort(Dk,axis=1)
+            D[s:s+chunk] = np.take_along_axis(Dk,order,axis=1)
+            I[s:s+chunk] = np.take_along_axis(Ic,order,axis=1)
+        return D,I
+
+    def neighbors_batch(self,X,r,chunk=256):
+        """Finds the points within distance r of each row of the M x dim
+        array X.
+
+        Returns:
+            list of arrays: the indices of the neighbors of each query,
+            sorted by increasing distance.
+        """
+        import numpy as np
+        Y = self._transform(np.atleast_2d(X))
+        res = []
+        for s in range(0,len(Y),chunk):
+            Dc = self._distances_batch(Y[s:s+chunk])
+            for d in Dc:
+                inds = np.nonzero(d <= r)[0]
+                res.append(inds[np.argsort(d[inds])])
+        return res
@@ -0,0 +1,291 @@
+"""Experience-based planning with a library of previously planned paths.
+
+A :class:`PathLibrary` stores the paths of past queries for a robot.  A new
+query retrieves the stored paths whose start and goal are nearest to its
+own, and repairs them: the path's endpoints are replaced by the query's,
+and the path is shortcut greedily, skipping waypoints that are infeasible
+or unnecessary.  A sampling-based planner is only run if no retrieved path
+can be repaired, and its result is added to the library.
+
+Example::
+
+    library = PathLibrary(robot,capacity=500,filename='paths.json')
+    path = library.planToConfig(world,robot,target,type='sbl')
+    library.save()
+
+Config queries are located with a
+:class:`~klampt.plan.nearestneighbors.NearestNeighbors` index over the
+concatenated start and goal configurations, in the metric of the robot's
+:class:`~klampt.plan.robotcspace.RobotCSpace`.  Cartesian queries are
+located by the end-effector poses at the end of the stored paths.  The
+library holds at most ``capacity`` paths, evicting the least recently used
+ones.
+"""
+
+from . import robotplanning
+from .robotcspace import RobotCSpace
+from .nearestneighbors import NearestNeighbors
+from .. import robotsim
+import os
+import json
+import collections
+
+class PathLibrary:
+    """A bounded, persistent library of robot paths.
+
+    Paths are lists of full robot configurations.  Each entry also stores
+    the link transforms at the path's end, which are used to answer
+    Cartesian queries.
+
+    Args:
+        robot (RobotModel): the robot.
+        capacity (int): the maximum number of stored paths.
+        filename (str, optional): a file from which the library is loaded,
+            if it exists, and to which :meth:`save` writes.
+    """
+    def __init__(self,robot,capacity=1000,filename=None):
+        self.robot = robot
+        self.capacity = capacity
+        self.filename = filename
+        self.entries = collections.OrderedDict()
+        self._nextId = 0
+        #the robot's metric, and an index of the concatenated start and goal
+        #configurations
+        self._metric = NearestNeighbors.fromSpace(RobotCSpace(robot))
+        self._nn = None
+        if filename is not None and os.path.exists(os.path.expanduser(filename)):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self,path,goalTransforms=None):
+        """Adds a path, evicting the least recently used one if the library
+        is full.  Returns the path's id.
+
+        goalTransforms are the link transforms at path[-1].  If None, they
+        are computed with the robot, whose configuration is restored
+        afterwards.
+        """
+        if goalTransforms is None:
+            qorig = self.robot.getConfig()
+            self.robot.setConfig(path[-1])
+            goalTransforms = [self.robot.link(i).getTransform() for i in range(self.robot.numLinks())]
+            self.robot.setConfig(qorig)
+        id = self._nextId
+        self._nextId += 1
+        self.entries[id] = {'path':[list(q) for q in path],
+                            'goalTransforms':[list(R)+list(t) for (R,t) in goalTransforms]}
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        if self._nn is not None:
+            ids,nn = self._nn
+            if len(ids) >= 2*len(self.entries):
+                #the index can't remove evicted paths, so it is rebuilt once
+                #they are the majority
+                self._nn = None
+            else:
+                ids.append(id)
+                nn.add(self.entries[id]['path'][0]+self.entries[id]['path'][-1])
+        return id
+
+    def touch(self,id):
+        """Marks a path as recently used"""
+        self.entries.move_to_end(id)
+
+    def nearest(self,start,goal,k=5):
+        """Returns the ids of the k paths whose start and goal configurations
+        are nearest to the given ones, nearest first."""
+        if len(self.entries) == 0:
+            return []
+        if self._nn is None:
+            #the robot's metric on both the start and the goal
+            metric = self._metric
+            nn = NearestNeighbors(2*metric.dim,list(metric.weights)*2,list(metric.periods)*2)
+            for e in self.entries.values():
+                nn.add(e['path'][0]+e['path'][-1])
+            self._nn = (list(self.entries.keys()),nn)
+        ids,nn = self._nn
+        #skip evicted paths
+        nevicted = len(ids) - len(self.entries)
+        res = [ids[i] for (d,i) in nn.knearest(list(start)+list(goal),k+nevicted)]
+        return [id for id in res if id in self.entries][:k]
+
+    def nearestCartesian(self,start,iktargets,k=5,startWeight=1.0):
+        """Returns the ids of the k paths whose end-effector positions at
+        the goal best match the position constraints of the IKObjectives
+        iktargets, plus startWeight times the distance between their start
+        configurations and start.  Nearest first."""
+        import numpy as np
+        if len(self.entries) == 0:
+            return []
+        ids = list(self.entries.keys())
+        cost = startWeight*np.linalg.norm(np.array([e['path'][0] for e in self.entries.values()]) - np.asarray(start),axis=1)
+        T = np.array([e['goalTransforms'] for e in self.entries.values()])
+        for obj in iktargets:
+            if obj.numPosDims() == 0:
+                continue
+            plocal,pworld = obj.getPosition()
+            Ti = T[:,obj.link()]
+            #column-major rotations
+            p = Ti[:,9:] + np.dot(Ti[:,:9].reshape((-1,3,3)).transpose((0,2,1)),plocal)
+            cost += np.linalg.norm(p - np.asarray(pworld),axis=1)
+        return [ids[i] for i in np.argsort(cost)[:k]]
+
+    def repair(self,plan,path,start,goal):
+        """Adapts a stored path to a new query in the space of a MotionPlan.
+
+        The path's endpoints are replaced by start and goal, its waypoints
+        are projected to the plan's space (e.g., DOFs outside the moving
+        subset are fixed), and it is shortcut greedily: from each waypoint,
+        the path proceeds to the last later waypoint that is feasible and
+        visible.  Fails if start or goal is infeasible.
+
+        Args:
+            plan (MotionPlan): the plan, typically a :class:`SubsetMotionPlan`
+                returned by :func:`robotplanning.planToConfig`.
+            path (list of configurations): a robot path.
+            start, goal (configurations): robot configurations.
+
+        Returns:
+            list of configurations: the repaired robot path, or None if it
+            cannot be repaired.
+        """
+        space = plan.space
+        project = getattr(plan,'project',lambda x:x)
+        lift = getattr(plan,'lift',lambda x:x)
+        waypoints = [project(start)] + [project(q) for q in path[1:-1]] + [project(goal)]
+        if not space.isFeasible(waypoints[0]) or not space.isFeasible(waypoints[-1]):
+            return None
+        res = [waypoints[0]]
+        i = 0
+        last = len(waypoints)-1
+        while i < last:
+            for j in range(last,i,-1):
+                if space.isFeasible(waypoints[j]) and space.isVisible(waypoints[i],waypoints[j]):
+                    break
+            else:
+                return None
+            res.append(waypoints[j])
+            i = j
+        return [lift(q) for q in res]
+
+    def _plan(self,plan,maxIters,increment):
+        """Runs a MotionPlan until a path is found, and returns it or None"""
+        for iters in range(0,maxIters,increment):
+            plan.planMore(increment)
+            path = plan.getPath()
+            if path is not None and len(path) > 0:
+                return path
+        return None
+
+    def planToConfig(self,world,robot,target,k=5,maxIters=1000,increment=100,**kwargs):
+        """Plans from the robot's current configuration to target, trying
+        to repair the k nearest stored paths before running a planner.
+
+        Args:
+            world, robot, target: as in :func:`robotplanning.planToConfig`.
+            k (int): the number of stored paths to try.
+            maxIters (int): the maximum number of planner iterations, if
+                repair fails.
+            increment (int): planner iterations between checks for a
+                solution.
+            kwargs: other arguments to :func:`robotplanning.planToConfig`,
+                including planner options.
+
+        Returns:
+            list of configurations: the path, or None if planning failed.
+        """
+        q0 = robot.getConfig()
+        plan = robotplanning.planToConfig(world,robot,target,**kwargs)
+        if plan is None:
+            return None
+        try:
+            for id in self.nearest(q0,target,k):
+                path = self.repair(plan,self.entries[id]['path'],q0,target)
+                if path is not None:
+                    self.touch(id)
+                    return path
+            path = self._plan(plan,maxIters,increment)
+            if path is not None:
+                self.add(path)
+            return path
+        finally:
+            plan.space.close()
+            plan.close()
+
+    def planToCartesianObjective(self,world,robot,iktargets,iktolerance=1e-3,k=5,maxIters=1000,increment=100,**kwargs):
+        """Plans from the robot's current configuration to a configuration
+        that meets the IKObjectives iktargets.  The k stored paths whose
+        goals best match the targets are repaired, after solving IK starting
+        from their final configurations.  If this fails, a planner is run.
+
+        Args:
+            world, robot, iktargets, iktolerance: as in
+                :func:`robotplanning.planToCartesianObjective`.
+            k (int): the number of stored paths to try.
+            maxIters (int): the maximum number of planner iterations, if
+                repair fails.
+            increment (int): planner iterations between checks for a
+                solution.
+            kwargs: other arguments to
+                :func:`robotplanning.planToCartesianObjective`, including
+                planner options.
+
+        Returns:
+            list of configurations: the path, or None if planning failed.
+        """
+        q0 = robot.getConfig()
+        plan = robotplanning.planToCartesianObjective(world,robot,iktargets,iktolerance,**kwargs)
+        if plan is None:
+            return None
+        try:
+            solver = robotsim.IKSolver(robot)
+            for obj in iktargets:
+                solver.add(obj)
+            solver.setTolerance(iktolerance)
+            if isinstance(plan,robotplanning.SubsetMotionPlan):
+                solver.setActiveDofs(plan.subset)
+            for id in self.nearestCartesian(q0,iktargets,k):
+                stored = self.entries[id]['path']
+                robot.setConfig(stored[-1])
+                solver.solve()
+                goal = robot.getConfig()
+                robot.setConfig(q0)
+                if max(abs(e) for e in solver.getResidual()) > iktolerance:
+                    continue
+                path = self.repair(plan,stored,q0,goal)
+                if path is not None:
+                    self.touch(id)
+                    return path
+            path = self._plan(plan,maxIters,increment)
+            if path is not None:
+                self.add(path)
+            return path
+        finally:
+            robot.setConfig(q0)
+            plan.space.close()
+            plan.close()
+
+    def save(self,filename=None):
+        """Saves the library, in least to most recently used order"""
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            raise ValueError("No filename given")
+        with open(os.path.expanduser(filename),'w') as f:
+            json.dump({'capacity':self.capacity,'entries':list(self.entries.values())},f)
+
+    def load(self,filename):
+        """Loads a library saved by :meth:`save`, keeping the capacity of
+        this library."""
+        with open(os.path.expanduser(filename),'r') as f:
+            data = json.load(f)
+        self.entries = collections.OrderedDict()
+        self._nextId = 0
+        for e in data['entries']:
+            self.entries[self._nextId] = e
+            self._nextId += 1
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        self._nn = None
@@ -0,0 +1,341 @@
+"""Real-time replanning for robots controlled through the Robot Interface
+Layer, in the style of the C++ RealTimePlanner.
+
+A :class:`RealTimePlanner` runs a fixed-rate loop against a
+:class:`~klampt.control.robotinterface.RobotInterfaceBase`.  At each cycle,
+it picks a splice time a little more than the planning budget in the
+future, plans from the configuration at which the robot will be at that
+time, and if the new path is better than the remainder of the executing
+trajectory, or the remainder has become infeasible, e.g., because obstacles
+moved, the new segment is spliced onto the executing trajectory at the
+splice time.  The robot keeps moving while planning.  New segments are
+blended with the robot's velocity at the splice time, and if the robot
+must stop, it slows down along the remainder under its acceleration limits.
+
+Example::
+
+    space = robotplanning.makeSpace(world,robot)
+    planner = RealTimePlanner(interface,space,rate=10,type='rrt')
+    planner.setGoal(qgoal)
+    planner.run(duration=20.0,callback=moveObstacles)
+    print(planner.getStats())
+
+The interface must provide clock(), commandedPosition(), and
+setPiecewiseLinear(); wrap it in a
+:class:`~klampt.control.robotinterfaceutils.RobotInterfaceCompleter` to
+emulate them if necessary.  Configurations in the planning space are
+configurations of the interface's Klamp't model.
+"""
+
+from .cspace import MotionPlan
+from ..model.trajectory import Trajectory,RobotTrajectory,HermiteTrajectory,path_to_trajectory
+from ..math import vectorops
+import math
+import time
+
+class RealTimePlanner:
+    """A fixed-rate replanning loop.
+
+    Subclasses may override :meth:`planSegment` to use a different planner,
+    e.g., an IK-based local planner, and :meth:`timeParameterize` to use a
+    different timing.
+
+    Args:
+        interface (RobotInterfaceBase): the robot's interface.
+        space (CSpace): the planning space, over configurations of the
+            interface's Klamp't model.  Its feasibility tests should check
+            the current positions of the obstacles.
+        rate (float): the replanning rate, in Hz.
+        budget (float, optional): the planning time per cycle, in seconds.
+            Defaults to half of the cycle.
+        margin (float): extra time, in seconds, between the end of the
+            budget and the splice time, which accounts for the latency of
+            sending commands to the robot.
+        speed (float): a speed multiplier for the timing of new segments.
+        amax (float or list, optional): the acceleration limits used to
+            blend the velocity at the splice time into new segments and to
+            slow down to a stop.  Defaults to the acceleration limits of the
+            space's robot.  If None and the space has no robot, the velocity
+            changes instantly at the splice time.
+        increment (int): the number of planner iterations between deadline
+            checks.
+        planOptions (keywords): options for the :class:`MotionPlan`, e.g.,
+            type='rrt'.
+
+    Attributes:
+        goal (configuration): the current goal, or None.
+        trajectory (Trajectory): the commanded trajectory in Klamp't
+            configurations, with times given by interface.clock(), or None if
+            nothing has been commanded yet.
+        stats (dict): cycle statistics.  See :meth:`getStats`.
+    """
+    def __init__(self,interface,space,rate=10.0,budget=None,margin=0.05,speed=1.0,amax=None,increment=10,**planOptions):
+        if space.cspace is None:
+            space.setup()
+        if amax is None and getattr(space,'robot',None) is not None:
+            amax = space.robot.getAccelerationLimits()
+        self.interface = interface
+        self.space = space
+        self.rate = rate
+        self.budget = budget if budget is not None else 0.5/rate
+        self.margin = margin
+        self.speed = speed
+        self.amax = amax
+        self.increment = increment
+        self.planOptions = planOptions
+        self.goal = None
+        self.trajectory = None
+        self._stop = False
+        self.reset()
+
+    def reset(self):
+        """Clears the statistics"""
+        self.stats = {'cycles':0,'successes':0,'failures':0,'late':0,'kept':0,
+                      'stops':0,'overruns':0,'plans':0,'total latency':0.0,
+                      'max latency':0.0}
+
+    def setGoal(self,goal):
+        """Sets the goal configuration, or None to stop replanning"""
+        self.goal = goal
+
+    def stop(self):
+        """Stops :meth:`run` at the end of the current cycle.  May be called
+        from a callback or another thread."""
+        self._stop = True
+
+    def planSegment(self,start,goal,deadline):
+        """Plans a path from start to goal, returning by the time.time()
+        deadline.  Returns a list of configurations, or None on failure.
+
+        The default implementation runs a new :class:`MotionPlan` with the
+        planOptions given to the constructor."""
+        plan = MotionPlan(self.space,**self.planOptions)
+        try:
+            plan.setEndpoints(start,goal)
+            path = None
+            while time.time() < deadline:
+                plan.planMore(self.increment)
+                path = plan.getPath()
+                if path is not None and len(path) > 0:
+                    return path
+            return None
+        finally:
+            plan.close()
+
+    def timeParameterize(self,path):
+        """Converts a path to a piecewise linear Trajectory starting at time
+        0.  The default implementation uses the robot's velocity and
+        acceleration limits, and starts and stops at rest."""
+        robot = getattr(self.space,'robot',None)
+        if robot is not None:
+            traj = RobotTrajectory(robot,milestones=path)
+        else:
+            traj = Trajectory(milestones=path)
+        traj = path_to_trajectory(traj,velocities='trapezoidal',timing='limited',smoothing=None,speed=self.speed)
+        if isinstance(traj,HermiteTrajectory):
+            traj = traj.discretize(0.01).configTrajectory()
+        return traj
+
+    def _remainder(self,tsplice):
+        """Returns the path of the commanded trajectory after tsplice"""
+        traj = self.trajectory
+        i,u = traj.getSegment(tsplice)
+        path = [traj.eval(tsplice)]
+        if i >= 0:
+            path += [list(q) for q in traj.milestones[i+1:]]
+        return path
+
+    def _pathValid(self,path):
+        space = self.space
+        if not all(space.isFeasible(q) for q in path):
+            return False
+        return all(space.isVisible(a,b) for (a,b) in zip(path[:-1],path[1:]))
+
+    def _pathLength(self,path):
+        return sum(self.space.cspace.distance(a,b) for (a,b) in zip(path[:-1],path[1:]))
+
+    def _rampTime(self,v):
+        """Returns the time needed to change the velocity by v under the
+        acceleration limits"""
+        if self.amax is None:
+            return 0.0
+        amax = self.amax if hasattr(self.amax,'__iter__') else [self.amax]*len(v)
+        return max([abs(vi)/ai for (vi,ai) in zip(v,amax) if vi != 0 and ai > 0] + [0.0])
+
+    def _blend(self,tsplice,segment):
+        """Returns the time-parameterized segment with its starting velocity
+        blended into the velocity of the commanded trajectory at tsplice, or
+        None if the blended path is infeasible."""
+        if self.trajectory is None:
+            return segment
+        if len(segment.times) < 2 or segment.times[1] <= 0:
+            return segment
+        dv = vectorops.sub(self.trajectory.deriv(tsplice),vectorops.div(vectorops.sub(segment.milestones[1],segment.milestones[0]),segment.times[1]))
+        #the offset dv*t*(1-t/T)^2 has velocity dv at t=0, vanishes with its
+        #velocity at t=T, and has acceleration at most 4|dv|/T
+        T = 4*self._rampTime(dv)
+        if T == 0:
+            return segment
+        n = int(math.ceil(T/0.01))
+        times = [T*k/n for k in range(n+1)] + [t for t in segment.times if t > T]
+        milestones = []
+        for t in times:
+            q = segment.eval(t)
+            if t < T:
+                u = 1.0 - t/T
+                q = vectorops.madd(q,dv,t*u*u)
+            milestones.append(q)
+        if not self._pathValid(milestones[:n+1]):
+            return None
+        return Trajectory(times,milestones)
+
+    def _brake(self,tsplice):
+        """Returns the times after tsplice and the milestones at which the
+        robot slows down to a stop along the commanded trajectory"""
+        #the time warp s = t - t^2/(2T) decelerates the path speed from 1 to
+        #0 over time T
+        T = self._rampTime(self.trajectory.deriv(tsplice))
+        if T == 0:
+            return [],[]
+        n = int(math.ceil(T/0.01))
+        times = [T*k/n for k in range(1,n+1)]
+        milestones = [self.trajectory.eval(tsplice + t - 0.5*t*t/T) for t in times]
+        return [tsplice+t for t in times],milestones
+
+    def _send(self,tnow,tsplice,segment):
+        """Commands the trajectory that follows the current one until tsplice
+        and the time-parameterized segment afterwards.  If segment is None,
+        the robot slows down to a stop from the splice point."""
+        if self.trajectory is None:
+            #wait at rest until the splice time
+            times,milestones = [tnow,tsplice],[segment.milestones[0],segment.milestones[0]]
+        else:
+            times,milestones = [tnow],[self.trajectory.eval(tnow)]
+            for (t,q) in zip(self.trajectory.times,self.trajectory.milestones):
+                if tnow < t < tsplice:
+                    times.append(t)
+                    milestones.append(list(q))
+            times.append(tsplice)
+            milestones.append(self.trajectory.eval(tsplice))
+        if segment is None:
+            tstop,qstop = self._brake(tsplice)
+            times += tstop
+            milestones += qstop
+        else:
+            for (t,q) in zip(segment.times[1:],segment.milestones[1:]):
+                times.append(tsplice+t)
+                milestones.append(list(q))
+        self.trajectory = Trajectory(times,milestones)
+        qs = [self.interface.configFromKlampt(q) for q in milestones[1:]]
+        self.interface.setPiecewiseLinear(times[1:],qs,relative=False)
+
+    def step(self):
+        """Runs one replanning cycle within the interface's current step,
+        i.e., between startStep() and endStep().  Returns True if a new
+        segment was spliced."""
+        t0 = time.time()
+        tnow = self.interface.clock()
+        self.stats['cycles'] += 1
+        if self.trajectory is None or tnow >= self.trajectory.endTime():
+            self.trajectory = None
+            tsplice = tnow
+            qsplice = self.interface.configToKlampt(self.interface.commandedPosition())
+            remainder = [qsplice]
+        else:
+            tsplice = max(tnow + self.budget + self.margin,self.trajectory.times[0])
+            remainder = self._remainder(tsplice)
+            qsplice = remainder[0]
+        if self.goal is None:
+            return False
+        valid = self._pathValid(remainder)
+        atGoal = self.space.cspace.distance(remainder[-1],self.goal) <= self.space.eps
+        if valid and atGoal and len(remainder) == 1:
+            #stopped at the goal
+            return False
+        if self.trajectory is None:
+            #the robot is at rest, so a new segment starts immediately
+            tsplice = tnow + self.budget + self.margin
+        path = self.planSegment(qsplice,self.goal,t0 + self.budget)
+        latency = time.time() - t0
+        self.stats['plans'] += 1
+        self.stats['total latency'] += latency
+        self.stats['max latency'] = max(self.stats['max latency'],latency)
+        if path is not None and latency > self.budget + self.margin:
+            #the splice point may have passed
+            self.stats['late'] += 1
+            path = None
+        if path is not None and valid and atGoal and self._pathLength(remainder) <= self._pathLength(path):
+            self.stats['kept'] += 1
+            return False
+        segment = None
+        if path is not None:
+            segment = self._blend(tsplice,self.timeParameterize(path))
+        if segment is None:
+            #planning failed, or the blend into the new segment is infeasible
+            self.stats['failures'] += 1
+            if not valid and self.trajectory is not None:
+                self.stats['stops'] += 1
+                self._send(tnow,tsplice,None)
+            return False
+        self.stats['successes'] += 1
+        self._send(tnow,tsplice,segment)
+        return True
+
+    def run(self,duration=None,callback=None):
+        """Runs the replanning loop at the given rate until :meth:`stop` is
+        called, duration seconds have elapsed, or the interface's status is
+        not 'ok'.
+
+        Args:
+            duration (float, optional): the maximum duration, in seconds.
+            callback (function, optional): called as callback(planner) at
+                the start of each cycle, e.g., to update obstacle positions
+                or the goal.
+        """
+        self._stop = False
+        dt = 1.0/self.rate
+        tstart = time.time()
+        while not self._stop:
+            t0 = time.time()
+            if duration is not None and t0 - tstart >= duration:
+                break
+            self.interface.startStep()
+            try:
+                if self.interface.status() != 'ok':
+                    break
+                if callback is not None:
+                    callback(self)
+                self.step()
+            finally:
+                self.interface.endStep()
+            telapsed = time.time() - t0
+            if telapsed > dt:
+                self.stats['overruns'] += 1
+            else:
+                time.sleep(dt - telapsed)
+
+    def getStats(self):
+        """Returns a dict of statistics:
+
+        - cycles: the number of cycles run.
+        - successes: the number of segments spliced.
+        - failures: the number of cycles in which planning failed, or was
+          late.
+        - late: the number of paths discarded because planning exceeded the
+          budget plus the margin.
+        - kept: the number of cycles that kept the current trajectory,
+          because it was valid and no shorter path was found.
+        - stops: the number of times the robot was slowed down to a stop
+          from the splice point, because the current trajectory was invalid
+          and planning failed.
+        - overruns: the number of cycles longer than 1/rate.
+        - plans: the number of planning cycles.
+        - success rate: successes / plans.
+        - total latency, mean latency, max latency: planning time per cycle,
+          in seconds.
+        """
+        res = dict(self.stats)
+        n = res['plans']
+        res['success rate'] = float(res['successes'])/n if n > 0 else 0.0
+        res['mean latency'] = res['total latency']/n if n > 0 else 0.0
+        return res
@@ -0,0 +1,372 @@
+"""Persistent roadmaps for multi-query planning in a static environment.
+
+A :class:`RoadmapCache` accumulates the roadmaps of PRM / SBL planners run
+in a fixed robot :class:`~klampt.plan.cspace.CSpace` (e.g., one created by
+:func:`~klampt.plan.robotplanning.makeSpace`) and saves them to disk.  New
+queries connect their start and goal to the cached graph and search it
+lazily, so that once the roadmap covers the free space, queries only
+require a handful of collision checks.
+
+Example::
+
+    space = robotplanning.makeSpace(world,robot)
+    cache = RoadmapCache(space,world)
+    path = cache.plan(robot.getConfig(),target,type='prm')
+    cache.save()
+
+Caches are keyed by a hash of the robot, the shapes of the world's
+geometries, and the space's collision checking resolution.  The poses of
+the geometries are not part of the key.  Instead, if some obstacles have
+moved since a vertex or edge was checked, it is marked unchecked and
+re-checked lazily the next time a search uses it.  Vertices and edges found
+to be infeasible are blocked, rather than removed, so that they are
+re-checked once the obstacles move again.
+"""
+
+from .cspace import MotionPlan
+from .nearestneighbors import NearestNeighbors
+from ..model import collide
+from ..io import loader
+import os
+import json
+import hashlib
+import heapq
+
+def _shapes(world,robot=None):
+    """Returns a hash of the shapes of all geometries in the world other than
+    the moving robot, in local coordinates."""
+    h = hashlib.sha1()
+    for i in range(world.numTerrains()):
+        h.update(json.dumps(loader.toJson(world.terrain(i).geometry(),'Geometry3D')).encode('utf-8'))
+    for i in range(world.numRigidObjects()):
+        h.update(json.dumps(loader.toJson(world.rigidObject(i).geometry(),'Geometry3D')).encode('utf-8'))
+    for i in range(world.numRobots()):
+        r = world.robot(i)
+        if robot is None or r.index != robot.index:
+            h.update(collide._robot_hash(r).encode('utf-8'))
+    return h.hexdigest()
+
+def _poses(world,robot=None):
+    """Returns the poses of all geometries in the world other than the moving
+    robot, as JSON-compatible lists."""
+    poses = []
+    for i in range(world.numTerrains()):
+        poses.append([list(v) for v in world.terrain(i).geometry().getCurrentTransform()])
+    for i in range(world.numRigidObjects()):
+        poses.append([list(v) for v in world.rigidObject(i).geometry().getCurrentTransform()])
+    for i in range(world.numRobots()):
+        r = world.robot(i)
+        if robot is None or r.index != robot.index:
+            poses.append(list(r.getConfig()))
+    return poses
+
+
+class RoadmapCache:
+    """A roadmap of feasible configurations and edges in a CSpace that
+    persists across queries and sessions.
+
+    Vertices and edges are stored with a flag indicating whether they were
+    checked in the current environment: True if they were found feasible,
+    False if they are unchecked, and None if they were found infeasible
+    (blocked).  Unchecked vertices and edges, e.g., those loaded from a
+    cache saved with obstacles in different poses, are checked lazily by
+    :meth:`query`, and blocked ones are skipped until the obstacles move.
+
+    Args:
+        space (CSpace): the planning space.  All configurations are given in
+            this space's coordinates.  The same space (or an equivalent one)
+            must be used in later sessions for the cache to be reused.
+        world (WorldModel, optional): the world, used to compute the cache
+            key and to detect moved obstacles.  If None, the cache is not
+            persisted and obstacles are assumed not to move.
+        robot (RobotModel, optional): the moving robot.  Defaults to
+            space.robot, if it exists.
+        robotFile (str, optional): the file the robot was loaded from, used
+            in the robot hash (see :func:`klampt.model.collide._robot_hash`).
+        cacheDir (str, optional): a directory in which roadmaps are saved and
+            looked up, or None to disable persistence.
+
+    Attributes:
+        V (list of configurations): the roadmap vertices.
+        adj (list of dict): adj[i] maps each neighbor j of vertex i to the
+            edge's [length,checked] pair, shared with adj[j][i].
+        checked (list): the flag of each vertex.
+        cacheFile (str): the file in which the roadmap is saved, or None.
+    """
+    def __init__(self,space,world=None,robot=None,robotFile=None,cacheDir='~/.klampt/cache'):
+        if space.cspace is None:
+            space.setup()
+        self.space = space
+        self.world = world
+        self.robot = robot if robot is not None else getattr(space,'robot',None)
+        self.V = []
+        self.adj = []
+        self.checked = []
+        self.cacheFile = None
+        self.poses = None
+        self._nn = None
+        if world is not None:
+            self.poses = _poses(world,self.robot)
+            if cacheDir is not None:
+                desc = [_shapes(world,self.robot),
+                        collide._robot_hash(self.robot,robotFile) if self.robot is not None else None,
+                        space.eps,
+                        getattr(space,'mapping',None),
+                        getattr(space,'xinit',None)]
+                key = hashlib.sha1(json.dumps(desc).encode('utf-8')).hexdigest()
+                self.cacheFile = os.path.join(os.path.expanduser(cacheDir),'roadmap_'+key+'.json')
+                if os.path.exists(self.cacheFile):
+                    self.load(self.cacheFile)
+
+    def numVertices(self):
+        return len(self.V)
+
+    def numEdges(self):
+        return sum(len(a) for a in self.adj)//2
+
+    def addVertex(self,x,checked=True):
+        """Adds a vertex and returns its index"""
+        i = self._appendVertex(x,checked)
+        if self._nn is not None:
+            self._nn.add(x)
+        return i
+
+    def _appendVertex(self,x,checked):
+        """Adds a vertex without adding it to the nearest neighbor index"""
+        self.V.append(list(x))
+        self.adj.append(dict())
+        self.checked.append(checked)
+        return len(self.V)-1
+
+    def _popVertex(self):
+        """Removes the last vertex, which must not be in the nearest
+        neighbor index"""
+        i = len(self.V)-1
+        for j in self.adj[i]:
+            del self.adj[j][i]
+        self.V.pop()
+        self.adj.pop()
+        self.checked.pop()
+
+    def addEdge(self,i,j,checked=True,length=None):
+        """Adds an edge between vertices i and j"""
+        if i == j or j in self.adj[i]:
+            return
+        if length is None:
+            length = self.space.cspace.distance(self.V[i],self.V[j])
+        e = [length,checked]
+        self.adj[i][j] = e
+        self.adj[j][i] = e
+
+    def removeEdge(self,i,j):
+        del self.adj[i][j]
+        del self.adj[j][i]
+
+    def addRoadmap(self,V,E,checkedVertices=True,checkedEdges=True):
+        """Adds a roadmap (V,E) in the format of
+        :meth:`MotionPlan.getRoadmap`, merging vertices that are already in
+        the cache."""
+        index = dict((tuple(v),i) for i,v in enumerate(self.V))
+        vmap = []
+        for v in V:
+            key = tuple(v)
+            if key not in index:
+                index[key] = self.addVertex(v,checkedVertices)
+            vmap.append(index[key])
+        for (i,j) in E:
+            self.addEdge(vmap[i],vmap[j],checkedEdges)
+
+    def addPlan(self,plan,checkedEdges=False):
+        """Adds the roadmap of a MotionPlan on this cache's space.  Lazy
+        planners like SBL return edges that have not been checked, so by
+        default edges are checked when they are first used."""
+        V,E = MotionPlan.getRoadmap(plan)
+        self.addRoadmap(V,E,True,checkedEdges)
+
+    def updateEnvironment(self):
+        """Checks whether any obstacles have moved since the roadmap was
+        checked.  If so, marks all vertices and edges as unchecked,
+        including blocked ones, and returns True.  Called automatically by
+        :meth:`query`."""
+        if self.world is None:
+            return False
+        poses = _poses(self.world,self.robot)
+        if poses == self.poses:
+            return False
+        self.poses = poses
+        self.checked = [False]*len(self.V)
+        for a in self.adj:
+            for e in a.values():
+                e[1] = False
+        return True
+
+    def nearest(self,x,k):
+        """Returns the indices of the k vertices nearest to x, in order of
+        increasing distance in the space's metric (see
+        :meth:`NearestNeighbors.fromSpace`)."""
+        if self._nn is None:
+            self._nn = NearestNeighbors.fromSpace(self.space)
+            for v in self.V:
+                self._nn.add(v)
+        return [i for (d,i) in self._nn.knearest(x,k)]
+
+    def _vertexFeasible(self,i):
+        """Checks vertex i if needed, blocking it if it is infeasible"""
+        if self.checked[i] is False:
+            self.checked[i] = True if self.space.isFeasible(self.V[i]) else None
+        return self.checked[i] is True
+
+    def _edgeFeasible(self,i,j):
+        """Checks edge i-j if needed, blocking it if it is infeasible"""
+        e = self.adj[i][j]
+        if e[1] is False:
+            e[1] = True if self.space.isVisible(self.V[i],self.V[j]) else None
+        return e[1] is True
+
+    def _connect(self,x,k):
+        """Adds x to the roadmap, connected to up to k of its nearest
+        visible vertices.  Returns its index.  x is not added to the nearest
+        neighbor index."""
+        candidates = self.nearest(x,k)
+        i = self._appendVertex(x,True)
+        for j in candidates:
+            if self._vertexFeasible(j) and self.space.isVisible(x,self.V[j]):
+                self.addEdge(i,j)
+        return i
+
+    def _shortestPath(self,start,goal):
+        """Dijkstra's algorithm over the roadmap, skipping blocked vertices
+        and edges.  Returns a list of vertex indices or None."""
+        dist = {start:0.0}
+        parent = {start:None}
+        q = [(0.0,start)]
+        done = set()
+        while q:
+            d,i = heapq.heappop(q)
+            if i in done:
+                continue
+            if i == goal:
+                path = [goal]
+                while parent[path[-1]] is not None:
+                    path.append(parent[path[-1]])
+                return path[::-1]
+            done.add(i)
+            for j,e in self.adj[i].items():
+                if e[1] is None or self.checked[j] is None:
+                    continue
+                nd = d + e[0]
+                if j not in dist or nd < dist[j]:
+                    dist[j] = nd
+                    parent[j] = i
+                    heapq.heappush(q,(nd,j))
+        return None
+
+    def query(self,start,goal,k=10,maxSearches=100,keepEndpoints=False):
+        """Finds a path between start and goal on the roadmap.  start and goal
+        are connected to their k nearest vertices, and the shortest path is
+        checked lazily: infeasible vertices and edges on it are blocked in
+        the current environment and the search is repeated.
+
+        Args:
+            start, goal (configurations): the endpoints, in the space's
+                coordinates.
+            k (int): the number of neighbors used to connect the endpoints.
+            maxSearches (int): the maximum number of searches.
+            keepEndpoints (bool): if True, start and goal are kept in the
+                roadmap.  Otherwise, they are removed after the query.
+
+        Returns:
+            list of configurations: the path, or None if the roadmap does
+            not connect start and goal.
+        """
+        self.updateEnvironment()
+        if not self.space.isFeasible(start) or not self.space.isFeasible(goal):
+            return None
+        s = self._connect(start,k)
+        g = self._connect(goal,k)
+        try:
+            if self.space.isVisible(start,goal):
+                self.addEdge(s,g)
+            for iters in range(maxSearches):
+                path = self._shortestPath(s,g)
+                if path is None:
+                    return None
+                if all(self._vertexFeasible(b) and self._edgeFeasible(a,b) for a,b in zip(path[:-1],path[1:])):
+                    return [self.V[i] for i in path]
+            return None
+        finally:
+            if keepEndpoints:
+                if self._nn is not None:
+                    self._nn.add(start)
+                    self._nn.add(goal)
+            else:
+                self._popVertex()
+                self._popVertex()
+
+    def plan(self,start,goal,k=10,iterations=1000,increment=100,**planOptions):
+        """Answers a query with the roadmap, or if that fails, runs a new
+        planner on the space and adds its roadmap to the cache.
+
+        Args:
+            start, goal (configurations): the endpoints, in the space's
+                coordinates.
+            k (int): the number of neighbors used to connect the endpoints.
+            iterations (int): the maximum number of planner iterations.
+            increment (int): planner iterations between attempts to answer
+                the query.
+            planOptions (keywords): options for the :class:`MotionPlan`, e.g.
+                type='prm' or type='sbl'.
+
+        Returns:
+            list of configurations: the path, or None if planning failed.
+        """
+        path = self.query(start,goal,k)
+        if path is not None:
+            return path
+        plan = MotionPlan(self.space,**planOptions)
+        try:
+            plan.setEndpoints(start,goal)
+            for iters in range(0,iterations,increment):
+                plan.planMore(increment)
+                path = plan.getPath()
+                if path is not None and len(path) > 0:
+                    break
+            self.addPlan(plan)
+        finally:
+            plan.close()
+        if path is not None and len(path) > 0:
+            return path
+        return None
+
+    def save(self,fn=None):
+        """Saves the roadmap to fn, or the cache file if fn is None"""
+        if fn is None:
+            fn = self.cacheFile
+        if fn is None:
+            raise ValueError("No cache file, a world and cacheDir must be given")
+        E = []
+        for i,a in enumerate(self.adj):
+            for j,e in a.items():
+                if i < j:
+                    E.append((i,j,e[0],e[1]))
+        d = os.path.dirname(fn)
+        if d and not os.path.exists(d):
+            os.makedirs(d)
+        with open(fn,'w') as f:
+            json.dump({'V':self.V,'checked':self.checked,'E':E,'poses':self.poses},f)
+
+    def load(self,fn):
+        """Loads a roadmap saved by :meth:`save`.  If it was saved with the
+        obstacles in different poses, it is marked as unchecked."""
+        with open(fn,'r') as f:
+            data = json.load(f)
+        self.V = []
+        self.adj = []
+        self.checked = []
+        self._nn = None
+        for v,c in zip(data['V'],data['checked']):
+            self.addVertex(v,c)
+        for (i,j,length,c) in data['E']:
+            self.addEdge(i,j,c,length)
+        self.poses = data['poses']
+        self.updateEnvironment()
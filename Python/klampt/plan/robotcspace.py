@@ -1,9 +1,12 @@
-from .cspace import CSpace
+from .cspace import CSpace,_FeasibilityBatchStats
 from .. import robotsim
 from ..model import collide
 from .cspaceutils import EmbeddedCSpace
+from ..math import vectorops
 import math
 import random
+import heapq
+import time
 
 class RobotCSpace(CSpace):
     """A basic robot cspace that allows collision free motion.
@@ -23,6 +26,11 @@ class RobotCSpace(CSpace):
         floating base or continuously rotating (spin) joints, you may need to
         overload the :meth:`sample` method.  The default implementation
         assumes that everything with unbounded limits is a rotational joint.
+
+    By default, edges are checked by discretizing them at resolution
+    ``self.eps``.  Call :meth:`setContinuousEdgeChecking` to certify whole
+    edges with conservative advancement instead, and :meth:`setLazy` to
+    defer collision checks to the edges that the planner checks.
         
     """
     def __init__(self,robot,collider=None):
@@ -69,6 +77,11 @@ class RobotCSpace(CSpace):
             self.addFeasibilityTest((lambda x: not self.selfCollision()),"self collision",dependencies="setconfig")
 
         self.properties['geodesic'] = 1
+        #tests added after this point are checked by discretization in
+        #continuous edge checking
+        self._numCollisionTests = len(self.feasibilityTests)
+        self._continuous = None
+        self._lazy = None
 
     def addConstraint(self,checker,name=None):
         self.addFeasibilityTest(checker,name)
@@ -118,6 +131,377 @@ class RobotCSpace(CSpace):
     def distance(self,a,b):
         return self.robot.distance(a,b)
 
+    def setContinuousEdgeChecking(self,enabled=True,tol=1e-3):
+        """Enables or disables continuous collision checking of edges.
+
+        When enabled, :meth:`continuousVisible` is used as the visibility
+        test.  It certifies an edge by conservative advancement: the speed
+        of every point on link i, as the robot moves along the edge, is
+        bounded by sum_j |dq_j| R_ij, where R_ij bounds the distance from the
+        axis of an ancestor joint j to the link geometry (1 for prismatic
+        joints).  A pair of geometries separated by distance d therefore
+        cannot collide until the edge parameter has advanced by d divided by
+        the pair's speed bound, so each pair is only re-queried with
+        :meth:`Geometry3D.distance` when its certified interval runs out.
+
+        Constraints added with :meth:`addConstraint` are still checked by
+        discretizing the edge at resolution ``self.eps``.
+
+        Must be called before :meth:`setup` (i.e., before a planner is
+        created).  Statistics are reported in :meth:`getStats` under the key
+        'continuous collision'.
+
+        Args:
+            enabled (bool): whether to use continuous edge checking.
+            tol (float): edges where any pair comes closer than this
+                distance are considered infeasible.
+
+        .. note::
+
+            The motion bounds assume that interpolation is linear in the
+            DOFs, so this is not supported for closed-loop spaces or robots
+            with floating or ball-and-socket joints.  It also requires
+            geometry types for which :meth:`Geometry3D.distance` is
+            supported; edges for which a distance query fails are checked
+            by discretization.
+        """
+        if not enabled:
+            self._continuous = None
+            self._updateVisible()
+            return
+        if type(self).interpolate is not RobotCSpace.interpolate:
+            raise ValueError("Continuous edge checking requires straight-line interpolation")
+        robot = self.robot
+        n = robot.numLinks()
+        for i in range(n):
+            if robot.getJointType(i) not in ['normal','spin','weld']:
+                raise ValueError("Continuous edge checking does not support joint type "+robot.getJointType(i)+" of link "+str(i))
+        #radius of each link's geometry about its origin, and the length of
+        #the link's offset from its parent
+        radius = [0.0]*n
+        geoms = [None]*n
+        for i in range(n):
+            link = robot.link(i)
+            g = link.geometry()
+            if g.empty(): continue
+            geoms[i] = g
+            t = link.getTransform()[1]
+            bmin,bmax = g.getBB()
+            radius[i] = vectorops.norm([max(abs(bmin[k]-t[k]),abs(bmax[k]-t[k])) for k in range(3)])
+        #motion radii R_ij for the DOFs j that move link i, given as
+        #(j,r,prismatic) where R_ij = r + sum_p max(|a_p|,|b_p|) over the
+        #prismatic DOFs p between j and i
+        radii = []
+        for i in range(n):
+            Ri = []
+            if geoms[i] is not None:
+                r = radius[i]
+                prismatic = []
+                j = i
+                while j >= 0:
+                    if robot.link(j).isPrismatic():
+                        Ri.append((j,1.0,[]))
+                        prismatic = prismatic + [j]
+                    else:
+                        Ri.append((j,r,prismatic))
+                    r += vectorops.norm(robot.link(j).getParentTransform()[1])
+                    j = robot.link(j).getParent()
+            radii.append(Ri)
+        #self collision pairs follow robot.selfCollides(), environment pairs
+        #follow the collider's mask
+        pairs = []
+        for i in range(n):
+            if geoms[i] is None: continue
+            for j in range(i+1,n):
+                if geoms[j] is not None and robot.selfCollisionEnabled(i,j):
+                    pairs.append((i,j,geoms[i],geoms[j]))
+        if self.collider:
+            rindices = self.collider.robots[robot.index]
+            others = [self.collider.rigidObjects,self.collider.terrains]
+            for i in range(n):
+                if geoms[i] is None or rindices[i] < 0: continue
+                for olist in others:
+                    for o in olist:
+                        if o >= 0 and o in self.collider.mask[rindices[i]]:
+                            pairs.append((i,-1,geoms[i],self.collider.geomList[o][1]))
+        spin = [i for i in range(n) if robot.getJointType(i) == 'spin']
+        self._continuous = {'tol':tol,'radii':radii,'pairs':pairs,'spin':spin,
+            'stats':{'edges':0,'certified':0,'distance queries':0,'configs':0,'discretized':0}}
+        self._updateVisible()
+
+    def _updateVisible(self):
+        if self._lazy is not None:
+            self.visible = self.lazyVisible
+        elif self._continuous is not None:
+            self.visible = self.continuousVisible
+        elif 'visible' in self.__dict__:
+            del self.visible
+
+    def continuousVisible(self,a,b):
+        """Checks whether the straight-line edge between a and b is feasible
+        using conservative advancement.  The endpoints are assumed to be
+        feasible.  See :meth:`setContinuousEdgeChecking`.
+        """
+        if self._continuous is None:
+            raise RuntimeError("setContinuousEdgeChecking() must be called first")
+        data = self._continuous
+        stats = data['stats']
+        stats['edges'] += 1
+        if not self._visibleExtraTests(a,b):
+            return False
+        tol = data['tol']
+        dq = [abs(bi-ai) for (ai,bi) in zip(a,b)]
+        for j in data['spin']:
+            dq[j] = min(dq[j] % (math.pi*2),math.pi*2 - dq[j] % (math.pi*2))
+        qmax = [max(abs(ai),abs(bi)) for (ai,bi) in zip(a,b)]
+        speed = [sum(dq[j]*(r+sum(qmax[p] for p in prismatic)) for (j,r,prismatic) in Ri) for Ri in data['radii']]
+        pairs = data['pairs']
+        #(safe parameter,pair index) heap; all pairs are queried at u=0
+        heap = [(0.0,k) for k in range(len(pairs))]
+        while heap and heap[0][0] < 1.0:
+            u = heap[0][0]
+            self.robot.setConfig(self.robot.interpolate(a,b,u))
+            stats['configs'] += 1
+            while heap and heap[0][0] <= u:
+                k = heapq.heappop(heap)[1]
+                i,j,gi,gj = pairs[k]
+                v = speed[i] + (speed[j] if j >= 0 else 0.0)
+                try:
+                    d = gi.distance(gj)
+                    stats['distance queries'] += 1
+                    if not isinstance(d,(int,float)):
+                        d = d.d
+                except Exception:
+                    #unsupported geometry types
+                    stats['discretized'] += 1
+                    return self._visibleDiscretized(a,b,self.feasibilityTests)
+                if d <= tol:
+                    return False
+                if v > 0:
+                    heapq.heappush(heap,(u + d/v,k))
+        stats['certified'] += 1
+        return True
+
+    def _visibleExtraTests(self,a,b):
+        """Checks the tests added after construction along the edge a-b"""
+        tests = self.feasibilityTests[self._numCollisionTests:]
+        if len(tests) == 0:
+            return True
+        return self._visibleDiscretized(a,b,tests)
+
+    def _visibleDiscretized(self,a,b,tests):
+        """Checks the given feasibility tests at the interior points of the
+        edge a-b, discretized at resolution self.eps."""
+        nsegs = int(math.ceil(self.distance(a,b)/self.eps))
+        for k in range(1,nsegs):
+            x = self.interpolate(a,b,float(k)/nsegs)
+            self.robot.setConfig(x)
+            if not all(f(x) for f in tests):
+                return False
+        return True
+
+    def feasible_batch(self,X,stats=False):
+        """Tests the feasibility of many configurations at once, see
+        :meth:`CSpace.feasible_batch`.
+
+        Joint limits are tested as a numpy mask.  The remaining
+        configurations are then tested for self collision, which also
+        computes the robot's bounding box.  The bounding boxes are tested
+        against those of all objects and terrains as a single numpy mask, and
+        the narrow phase is only run on the overlapping pairs.  Finally,
+        constraints added with :meth:`addConstraint` are run.
+        """
+        import numpy as np
+        X = np.asarray(X,dtype=float)
+        t0 = time.time()
+        names = self.feasibilityTestNames
+        counter = _FeasibilityBatchStats(names)
+        bmin = np.array([b[0] for b in self.bound])
+        bmax = np.array([b[1] for b in self.bound])
+        ok = np.all((X >= bmin) & (X <= bmax),axis=1)
+        counter.add(names[0],len(X),int(np.count_nonzero(ok)),time.time()-t0)
+        alive = np.nonzero(ok)[0]
+
+        robot = self.robot
+        geoms = [robot.link(i).geometry() for i in range(robot.numLinks())]
+        geoms = [g for g in geoms if not g.empty()]
+        bbs = np.empty((len(alive),6))
+        ok = np.zeros(len(alive),dtype=bool)
+        for k,x in enumerate(X[alive].tolist()):
+            t = time.time()
+            robot.setConfig(x)
+            counter.add('setconfig',1,1,time.time()-t)
+            if self.collider:
+                t = time.time()
+                if len(geoms) > 0:
+                    gbbs = np.array([list(g.getBB()[0])+list(g.getBB()[1]) for g in geoms])
+                    bbs[k,:3] = gbbs[:,:3].min(axis=0)
+                    bbs[k,3:] = gbbs[:,3:].max(axis=0)
+                else:
+                    bbs[k] = [float('inf')]*3+[float('-inf')]*3
+                counter.add('calcbb',1,1,time.time()-t)
+            t = time.time()
+            ok[k] = not self.selfCollision()
+            counter.add('self collision',1,1 if ok[k] else 0,time.time()-t)
+        alive = alive[ok]
+        bbs = bbs[ok]
+
+        if self.collider and len(alive) > 0:
+            world = self.collider.world
+            obstacles = []
+            for o in range(world.numRigidObjects()):
+                obstacles.append(("obj collision "+str(o)+" "+world.rigidObject(o).getName(),world.rigidObject(o).geometry().getBB(),
+                                  (lambda o=o: any(True for _ in self.collider.robotObjectCollisions(robot.index,o)))))
+            for o in range(world.numTerrains()):
+                obstacles.append(("terrain collision "+str(o)+" "+world.terrain(o).getName(),world.terrain(o).geometry().getBB(),
+                                  (lambda o=o: any(True for _ in self.collider.robotTerrainCollisions(robot.index,o)))))
+            if len(obstacles) > 0:
+                obbs = np.array([list(bb[0])+list(bb[1]) for (n,bb,f) in obstacles])
+                overlap = np.all((bbs[:,np.newaxis,:3] <= obbs[np.newaxis,:,3:]) & (obbs[np.newaxis,:,:3] <= bbs[:,np.newaxis,3:]),axis=2)
+                ok = np.ones(len(alive),dtype=bool)
+                for k in range(len(alive)):
+                    if overlap[k].any():
+                        robot.setConfig(X[alive[k]].tolist())
+                    for m,(n,bb,collides) in enumerate(obstacles):
+                        if not overlap[k,m]:
+                            counter.add(n,1,1,0.0)
+                            continue
+                        t = time.time()
+                        res = not collides()
+                        counter.add(n,1,1 if res else 0,time.time()-t)
+                        if not res:
+                            ok[k] = False
+                            break
+                alive = alive[ok]
+
+        #constraints added after construction
+        batches = getattr(self,'feasibilityTestBatches',{})
+        for f,n in zip(self.feasibilityTests[self._numCollisionTests:],names[self._numCollisionTests:]):
+            if len(alive) == 0:
+                break
+            t = time.time()
+            if n in batches:
+                res = np.asarray(batches[n](X[alive]),dtype=bool)
+            else:
+                res = np.zeros(len(alive),dtype=bool)
+                for k,x in enumerate(X[alive].tolist()):
+                    robot.setConfig(x)
+                    res[k] = f(x)
+            counter.add(n,len(alive),int(np.count_nonzero(res)),time.time()-t)
+            alive = alive[res]
+
+        feasible = np.zeros(len(X),dtype=bool)
+        feasible[alive] = True
+        if stats:
+            return feasible,counter.stats(len(X),len(alive),time.time()-t0)
+        return feasible
+
+    def setLazy(self,enabled=True):
+        """Enables or disables lazy collision checking.
+
+        In lazy mode, the planner's feasibility test for sampled
+        configurations only checks joint limits, and collision checks are
+        deferred to :meth:`lazyVisible`, the visibility test, which checks
+        the edge endpoints and then the edge itself.  Endpoint results are
+        memoized, and configurations known to be infeasible are rejected by
+        the feasibility test.  This pays off with planners that check edges
+        lazily, such as 'sbl', 'lazyprm*', and 'lazyrrg*', since full
+        checks are then only run on candidate solution paths.
+
+        Must be called before :meth:`setup` (i.e., before a planner is
+        created).  :meth:`feasible` still runs all tests.  Statistics are
+        reported in :meth:`getStats` under the key 'lazy collision'.
+
+        .. note::
+
+            The memoized results are only valid for the current obstacle
+            poses.  Call :meth:`clearLazyCache` whenever obstacles move.
+        """
+        if enabled:
+            self._lazy = {'memo':{},'stats':{'edges':0,'configs checked':0,'memo hits':0,'infeasible configs':0}}
+        else:
+            self._lazy = None
+        self._updateVisible()
+
+    def clearLazyCache(self):
+        """Forgets the memoized configuration feasibility results of lazy
+        mode.  Must be called when obstacles move, and may be called to
+        limit memory usage on long runs."""
+        if self._lazy is not None:
+            #cleared in place, since the planner's tests refer to the memo
+            self._lazy['memo'].clear()
+
+    def lazyFeasibilityTests(self):
+        """Returns the (tests,names,dependencies) lists of feasibility
+        tests used by the planner in lazy mode: the joint limit test, if
+        present, and a test that rejects configurations memoized as
+        infeasible."""
+        memo = self._lazy['memo']
+        tests = [(lambda x: memo.get(tuple(x),True))]
+        names = ['lazy collision']
+        if 'joint limits' in self.feasibilityTestNames:
+            i = self.feasibilityTestNames.index('joint limits')
+            tests = [self.feasibilityTests[i]] + tests
+            names = ['joint limits'] + names
+        return tests,names,[]
+
+    def setup(self,reinit=False):
+        """Sets up the planning hooks, see :meth:`CSpace.setup`.  In lazy mode
+        only the tests of :meth:`lazyFeasibilityTests` are used."""
+        if self._lazy is None:
+            CSpace.setup(self,reinit)
+            return
+        full = (self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies)
+        self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies = self.lazyFeasibilityTests()
+        try:
+            CSpace.setup(self,reinit)
+        finally:
+            self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies = full
+
+    def lazyFeasible(self,x):
+        """Runs all feasibility tests on x, memoizing the result"""
+        data = self._lazy
+        key = tuple(x)
+        res = data['memo'].get(key)
+        if res is not None:
+            data['stats']['memo hits'] += 1
+            return res
+        data['stats']['configs checked'] += 1
+        res = self.feasible(x)
+        if not res:
+            data['stats']['infeasible configs'] += 1
+        data['memo'][key] = res
+        return res
+
+    def lazyVisible(self,a,b):
+        """The visibility test in lazy mode.  Checks the endpoints with
+        :meth:`lazyFeasible`, then the edge, either by continuous checking
+        (if enabled) or by discretization at resolution self.eps."""
+        if self._lazy is None:
+            raise RuntimeError("setLazy() must be called first")
+        self._lazy['stats']['edges'] += 1
+        if not self.lazyFeasible(a) or not self.lazyFeasible(b):
+            return False
+        if self._continuous is not None:
+            return self.continuousVisible(a,b)
+        return self._visibleDiscretized(a,b,self.feasibilityTests)
+
+    def getStats(self):
+        """Returns the statistics of :meth:`CSpace.getStats`.  If continuous
+        edge checking is enabled, the key 'continuous collision' contains
+        its statistics: the number of edges checked and certified, and the
+        number of configurations and distance queries needed.  In lazy
+        mode, the key 'lazy collision' contains the number of edges and
+        configurations checked, memo hits, and infeasible configurations."""
+        stats = CSpace.getStats(self)
+        if self._continuous is not None:
+            stats = dict(stats)
+            stats['continuous collision'] = self._continuous['stats'].copy()
+        if self._lazy is not None:
+            stats = dict(stats)
+            stats['lazy collision'] = self._lazy['stats'].copy()
+        return stats
+
     def sendPathToController(self,path,controller):
         """Given a planned CSpace path 'path' and a SimRobotController 'controller',
         sends the path so that it is executed correctly by the controller (this assumes
@@ -393,6 +777,59 @@ class EmbeddedRobotCSpace(EmbeddedCSpace):
                     newmask.add(rindices[j])
             collider.mask[rindex] = newmask
 
+    def setContinuousEdgeChecking(self,enabled=True,tol=1e-3):
+        """Enables continuous edge checking in the ambient space, see
+        :meth:`RobotCSpace.setContinuousEdgeChecking`.  Should be called
+        after :meth:`disableInactiveCollisions` and before :meth:`setup`.
+        """
+        self.ambientspace.setContinuousEdgeChecking(enabled,tol)
+        self._updateVisible()
+
+    def setLazy(self,enabled=True):
+        """Enables lazy collision checking in the ambient space, see
+        :meth:`RobotCSpace.setLazy`.  Should be called after
+        :meth:`disableInactiveCollisions` and before :meth:`setup`.
+        """
+        self.ambientspace.setLazy(enabled)
+        self._updateVisible()
+
+    def clearLazyCache(self):
+        """Clears the lazy collision memo of the ambient space, see
+        :meth:`RobotCSpace.clearLazyCache`."""
+        self.ambientspace.clearLazyCache()
+
+    def _updateVisible(self):
+        if 'visible' in self.ambientspace.__dict__:
+            self.visible = lambda a,b:self.ambientspace.visible(self.lift(a),self.lift(b))
+        elif 'visible' in self.__dict__:
+            del self.visible
+
+    def setup(self,reinit=False):
+        """Sets up the planning hooks, see :meth:`CSpace.setup`.  If the
+        ambient space is lazy, only its lazy feasibility tests are used."""
+        if getattr(self.ambientspace,'_lazy',None) is None:
+            CSpace.setup(self,reinit)
+            return
+        full = (self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies)
+        tests,self.feasibilityTestNames,self.feasibilityTestDependencies = self.ambientspace.lazyFeasibilityTests()
+        self.feasibilityTests = [(lambda x,f=f:f(self.lift(x))) for f in tests]
+        try:
+            CSpace.setup(self,reinit)
+        finally:
+            self.feasibilityTests,self.feasibilityTestNames,self.feasibilityTestDependencies = full
+
+    def getStats(self):
+        """Returns the statistics of :meth:`CSpace.getStats`, along with the
+        continuous and lazy collision statistics of the ambient space, if
+        enabled."""
+        stats = CSpace.getStats(self)
+        astats = self.ambientspace.getStats()
+        for key in ['continuous collision','lazy collision']:
+            if key in astats:
+                stats = dict(stats)
+                stats[key] = astats[key]
+        return stats
+
     def discretizePath(self,path,epsilon=1e-2):
         """Only useful for ClosedLoopRobotCSpace"""
         if hasattr(self.ambientspace,'discretizePath'):
@@ -156,6 +156,7 @@ def planToConfig(world,robot,target,
                  ignoreCollisions=[],
                  movingSubset='auto',
                  verbose=True,
+                 parallel=None,
                  **planOptions):
     """Creates a MotionPlan object that can be called to solve a standard motion
     planning problem for a robot in a world.  The plan starts from the robot's
@@ -191,6 +192,11 @@ def planToConfig(world,robot,target,
             be allowed to move.  Otherwise, if this is None or 'all', all joints
             will be allowed to move.  If this is a list, then only these joint
             indices will be allowed to move.
+        parallel (int or list of dict, optional): if given, returns a
+            :class:`ParallelMotionPlan` that races this many planners in
+            separate processes.  If this is a list, each element is a dict
+            of planner options overriding planOptions for one of the
+            planners, e.g., to race different planner types.
         planOptions (keywords): keyword options that will be sent to the planner.  See
             the documentation for MotionPlan.setOptions for more details.
     
@@ -201,7 +207,40 @@ def planToConfig(world,robot,target,
         The underlying configuration space (a RobotCSpace, ClosedLoopRobotCSpace, or
         EmbeddedRobotCSpace) can be retrieved using the "space" attribute of the
         resulting MotionPlan object.
+
+        If parallel is given, a :class:`ParallelMotionPlan` is returned
+        instead, and the plan is computed by calling its ``solve(maxTime)``
+        method.  Its planners start from the robot's configuration at the
+        time of this call.
+
+        Returns None if the start or target configuration is infeasible.
     """
+    if parallel is not None:
+        if isinstance(parallel,int):
+            options = [planOptions]*parallel
+        else:
+            options = [dict(planOptions,**opts) for opts in parallel]
+        q0 = robot.getConfig()
+        def makePlan(index):
+            #called in each worker process, which starts from the robot's
+            #configuration at the time of this call
+            robot.setConfig(q0)
+            return planToConfig(world,robot,target,
+                                edgeCheckResolution=edgeCheckResolution,
+                                extraConstraints=extraConstraints,
+                                equalityConstraints=equalityConstraints,
+                                equalityTolerance=equalityTolerance,
+                                ignoreCollisions=ignoreCollisions,
+                                movingSubset=movingSubset,
+                                verbose=verbose,
+                                **options[index])
+        #check the endpoints before forking any workers
+        plan = makePlan(0)
+        if plan is None:
+            return None
+        plan.close()
+        plan.space.close()
+        return ParallelMotionPlan(makePlan,len(options))
     q0 = robot.getConfig()
     assert(len(q0)==len(target)),"target configuration must be of correct size for robot"
     if movingSubset == 'auto':
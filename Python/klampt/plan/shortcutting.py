@@ -0,0 +1,290 @@
+"""Shortcutting and smoothing of planned paths, as a post-processing step
+for any :class:`~klampt.plan.cspace.CSpace`.
+
+The shortcutting built into the planners (the 'shortcut' option of
+:meth:`MotionPlan.setOptions`) only runs while planning.
+:class:`PathShortcutter` improves a path after the fact, e.g., one returned
+by :meth:`MotionPlan.getPath` or loaded from disk, within a time budget.
+
+Example::
+
+    shortcutter = PathShortcutter(space)
+    path = shortcutter.shortcut(plan.getPath(),maxTime=0.2)
+    print(shortcutter.stats['improvement rate'])
+    traj = shortcutter.fitSpline(path)
+
+Edges are checked by subdivision to the space's resolution eps, in
+bisection order.  The checks of many candidate edges are batched into calls
+to :meth:`CSpace.feasible_batch`, level by level, and edges are dropped as
+soon as one of their configurations is infeasible.  Results are memoized
+per configuration and per edge, so a PathShortcutter can be reused on
+related paths in the same environment.  Call :meth:`clearCache` if the
+environment changes.
+
+If the space defines a custom visible(a,b) (e.g., a RobotCSpace with
+continuous or lazy collision checking), edges are checked with
+space.isVisible instead.
+"""
+
+from ..math import vectorops
+from ..model.trajectory import path_to_trajectory
+import math
+import random
+import time
+
+class PathShortcutter:
+    """Shortcuts paths in a CSpace.
+
+    Args:
+        space (CSpace): the space.  Its distance, interpolate, and visible
+            methods are used, if defined.
+
+    Attributes:
+        stats (dict): statistics of the last call to :meth:`shortcut`:
+
+            - 'initial length', 'length': the path length before and after.
+            - 'time': the time spent, in seconds.
+            - 'improvement rate': the length reduction per second.
+            - 'iterations': the number of shortcutting rounds.
+            - 'edges checked', 'configs checked': the number of edges and
+              configurations whose feasibility was tested.
+            - 'cache hits': the number of memoized results used.
+            - 'history': a list of (time,length) pairs, one per improvement.
+    """
+    def __init__(self,space):
+        if space.cspace is None:
+            space.setup()
+        self.space = space
+        self._configs = {}
+        self._edges = {}
+        self._resetStats(0.0)
+
+    def _resetStats(self,length):
+        self.stats = {'initial length':length,'length':length,'time':0.0,
+                      'improvement rate':0.0,'iterations':0,'edges checked':0,
+                      'configs checked':0,'cache hits':0,'history':[(0.0,length)]}
+
+    def clearCache(self):
+        """Forgets all memoized feasibility results"""
+        self._configs = {}
+        self._edges = {}
+
+    def _distance(self,a,b):
+        if hasattr(self.space,'distance'):
+            return self.space.distance(a,b)
+        return vectorops.distance(a,b)
+
+    def _interpolate(self,a,b,u):
+        if hasattr(self.space,'interpolate'):
+            return self.space.interpolate(a,b,u)
+        return vectorops.interpolate(a,b,u)
+
+    def length(self,path):
+        """Returns the length of a path in the space's metric"""
+        return sum(self._distance(a,b) for (a,b) in zip(path[:-1],path[1:]))
+
+    def _feasibleBatch(self,Q):
+        """Checks the feasibility of a list of configurations, memoized"""
+        import numpy as np
+        res = np.empty(len(Q),dtype=bool)
+        todo = []
+        for i,q in enumerate(Q):
+            r = self._configs.get(tuple(q))
+            if r is None:
+                todo.append(i)
+            else:
+                res[i] = r
+                self.stats['cache hits'] += 1
+        if len(todo) > 0:
+            if hasattr(self.space,'feasible_batch'):
+                feasible = self.space.feasible_batch([Q[i] for i in todo])
+            else:
+                feasible = [self.space.isFeasible(Q[i]) for i in todo]
+            for i,f in zip(todo,feasible):
+                res[i] = f
+                self._configs[tuple(Q[i])] = bool(f)
+            self.stats['configs checked'] += len(todo)
+        return res
+
+    def checkEdges(self,edges):
+        """Checks whether the straight edges (a,b) in a list are feasible,
+        assuming that their endpoints are.  Returns a list of bools."""
+        res = [True]*len(edges)
+        todo = []
+        for k,(a,b) in enumerate(edges):
+            key = (tuple(a),tuple(b))
+            if key in self._edges:
+                res[k] = self._edges[key]
+                self.stats['cache hits'] += 1
+            elif hasattr(self.space,'visible'):
+                res[k] = self._edges[key] = self.space.isVisible(a,b)
+                self.stats['edges checked'] += 1
+            else:
+                n = int(math.ceil(self._distance(a,b)/self.space.eps))
+                todo.append((k,a,b,n,[(0,n)]))
+                self.stats['edges checked'] += 1
+        #subdivide all remaining edges in bisection order, one level at a time
+        while len(todo) > 0:
+            Q = []
+            owners = []
+            active = []
+            for (k,a,b,n,intervals) in todo:
+                children = []
+                for (lo,hi) in intervals:
+                    if hi - lo < 2:
+                        continue
+                    mid = (lo+hi)//2
+                    Q.append(self._interpolate(a,b,float(mid)/n))
+                    owners.append(k)
+                    children += [(lo,mid),(mid,hi)]
+                if len(children) > 0:
+                    active.append((k,a,b,n,children))
+            if len(Q) == 0:
+                break
+            for k,f in zip(owners,self._feasibleBatch(Q)):
+                if not f:
+                    res[k] = False
+            todo = [e for e in active if res[e[0]]]
+        for (a,b),r in zip(edges,res):
+            self._edges[(tuple(a),tuple(b))] = r
+        return res
+
+    def _deterministicPass(self,path,deadline):
+        """From each milestone, skips to the furthest later milestone that
+        it can reach directly.  Returns the new path."""
+        res = [path[0]]
+        i = 0
+        last = len(path)-1
+        while i < last:
+            if time.time() > deadline:
+                return res + path[i+1:]
+            candidates = list(range(last,i+1,-1))
+            feasible = self.checkEdges([(path[i],path[j]) for j in candidates])
+            j = i+1
+            for (c,f) in zip(candidates,feasible):
+                if f:
+                    j = c
+                    break
+            res.append(path[j])
+            i = j
+        return res
+
+    def _evalPath(self,path,s,cumlen):
+        """Returns the segment index and configuration at arc length s"""
+        import bisect
+        i = min(max(bisect.bisect_right(cumlen,s)-1,0),len(path)-2)
+        d = cumlen[i+1]-cumlen[i]
+        u = 0.0 if d <= 0 else min(max((s-cumlen[i])/d,0.0),1.0)
+        return i,self._interpolate(path[i],path[i+1],u)
+
+    def _randomPass(self,path,batch):
+        """Tries batch random shortcuts between points along the path and
+        applies the non-overlapping ones that are feasible, largest savings
+        first.  Returns the new path."""
+        cumlen = [0.0]
+        for (a,b) in zip(path[:-1],path[1:]):
+            cumlen.append(cumlen[-1] + self._distance(a,b))
+        L = cumlen[-1]
+        candidates = []
+        for k in range(batch):
+            s1,s2 = sorted((random.uniform(0,L),random.uniform(0,L)))
+            i1,a = self._evalPath(path,s1,cumlen)
+            i2,b = self._evalPath(path,s2,cumlen)
+            if i1 == i2:
+                continue
+            saving = (s2-s1) - self._distance(a,b)
+            if saving > 1e-8*L:
+                candidates.append((saving,s1,s2,i1,i2,a,b))
+        if len(candidates) == 0:
+            return path
+        feasible = self.checkEdges([(c[5],c[6]) for c in candidates])
+        accepted = []
+        for c,f in sorted(zip(candidates,feasible),key=lambda x:-x[0][0]):
+            if f and all(c[2] <= d[1] or c[1] >= d[2] for d in accepted):
+                accepted.append(c)
+        if len(accepted) == 0:
+            return path
+        res = []
+        i = 0
+        for (saving,s1,s2,i1,i2,a,b) in sorted(accepted,key=lambda x:x[1]):
+            res += path[i:i1+1]
+            res += [a,b]
+            i = i2+1
+        res += path[i:]
+        return res
+
+    def shortcut(self,path,maxTime=1.0,method='both',iterations=None,batch=16):
+        """Shortcuts a feasible path.
+
+        Args:
+            path (list of configurations): the path.
+            maxTime (float): the time budget, in seconds.
+            method (str): 'deterministic' repeatedly skips from each
+                milestone to the furthest one it can reach directly, until
+                no milestone can be skipped.  'random' repeatedly tries
+                shortcuts between random points along the path.  'both'
+                (default) runs the deterministic passes, and then random
+                shortcutting with the remaining time.
+            iterations (int, optional): the maximum number of random
+                shortcutting rounds.  If None, runs until maxTime.
+            batch (int): the number of random shortcuts checked per round.
+
+        Returns:
+            list of configurations: the shortened path.
+        """
+        if method not in ['deterministic','random','both']:
+            raise ValueError("Invalid shortcutting method "+str(method))
+        t0 = time.time()
+        deadline = t0 + maxTime
+        path = [list(q) for q in path]
+        L0 = self.length(path)
+        self._resetStats(L0)
+        L = L0
+        if method in ['deterministic','both']:
+            while len(path) > 2 and time.time() < deadline:
+                newpath = self._deterministicPass(path,deadline)
+                self.stats['iterations'] += 1
+                if len(newpath) == len(path):
+                    break
+                path = newpath
+                L = self.length(path)
+                self.stats['history'].append((time.time()-t0,L))
+        if method in ['random','both']:
+            iters = 0
+            while time.time() < deadline and (iterations is None or iters < iterations):
+                newpath = self._randomPass(path,batch)
+                iters += 1
+                self.stats['iterations'] += 1
+                if newpath is not path:
+                    path = newpath
+                    L = self.length(path)
+                    self.stats['history'].append((time.time()-t0,L))
+        T = time.time()-t0
+        self.stats['length'] = L
+        self.stats['time'] = T
+        self.stats['improvement rate'] = (L0-L)/T if T > 0 else 0.0
+        return path
+
+    def fitSpline(self,path,dt=0.01,**options):
+        """Converts a path to a smooth trajectory with
+        :func:`~klampt.model.trajectory.path_to_trajectory` (by default, with
+        smoothing='spline').  If the smoothed trajectory, sampled every dt,
+        leaves the feasible space, the trajectory is recomputed with
+        smoothing=None, i.e., along the straight edges of the path.
+
+        Smoothing is not supported for non-Euclidean spaces, in which case
+        pass smoothing=None.
+
+        Returns:
+            Trajectory: the timed trajectory.
+        """
+        options.setdefault('smoothing','spline')
+        traj = path_to_trajectory(path,**options)
+        if options['smoothing'] is None:
+            return traj
+        Q = [traj.eval(t) for t in (traj.startTime() + dt*k for k in range(int(math.ceil(traj.duration()/dt))+1))]
+        Q = [q[:len(path[0])] for q in Q]
+        if all(self._feasibleBatch(Q)) and all(self.checkEdges(list(zip(Q[:-1],Q[1:])))):
+            return traj
+        options['smoothing'] = None
+        return path_to_trajectory(path,**options)
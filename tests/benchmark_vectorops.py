@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Times the list and numpy backends of klampt.math.vectorops for increasing
+vector dimensions, and reports the dimension at which numpy becomes faster
+for each operation.  Two numpy cases are timed: the numpy backend with
+list arguments (which includes conversion to and from arrays), and numpy
+array arguments.
+
+Usage: python benchmark_vectorops.py [max_dimension]
+"""
+
+import sys
+import timeit
+import random
+import numpy
+from klampt.math import vectorops
+
+OPERATIONS = [
+    ('add',lambda a,b: vectorops.add(a,b)),
+    ('madd',lambda a,b: vectorops.madd(a,b,0.5)),
+    ('sub',lambda a,b: vectorops.sub(a,b)),
+    ('mul',lambda a,b: vectorops.mul(a,2.0)),
+    ('div',lambda a,b: vectorops.div(a,b)),
+    ('dot',lambda a,b: vectorops.dot(a,b)),
+    ('norm',lambda a,b: vectorops.norm(a)),
+    ('distance',lambda a,b: vectorops.distance(a,b)),
+    ('interpolate',lambda a,b: vectorops.interpolate(a,b,0.3)),
+]
+
+def time_call(f,a,b,backend):
+    vectorops.set_backend(backend)
+    n,t = timeit.Timer(lambda: f(a,b)).autorange()
+    return t/n
+
+def main(maxdim=1024):
+    dims = []
+    d = 1
+    while d <= maxdim:
+        dims.append(d)
+        d *= 2
+    for mode in ['numpy backend','array arguments']:
+        print("Speedup of",mode,"(list time / numpy time), numpy wins where > 1")
+        print("%-12s"%"operation"+"".join("%8d"%d for d in dims)+"  crossover")
+        for name,f in OPERATIONS:
+            ratios = []
+            crossover = None
+            for d in dims:
+                a = [random.random() for i in range(d)]
+                b = [random.random()+1 for i in range(d)]
+                tlist = time_call(f,a,b,'list')
+                if mode == 'numpy backend':
+                    tnumpy = time_call(f,a,b,'numpy')
+                else:
+                    tnumpy = time_call(f,numpy.array(a),numpy.array(b),'list')
+                ratios.append(tlist/tnumpy)
+                if crossover is None and tnumpy < tlist:
+                    crossover = d
+            vectorops.set_backend('list')
+            print("%-12s"%name+"".join("%8.2f"%r for r in ratios)+"  "+(str(crossover) if crossover is not None else ">"+str(maxdim)))
+        print()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 import unittest
-from klampt.math import so3
+import math
+import numpy as np
+from klampt.math import so3,se3
 
 class so3Test(unittest.TestCase):
 
@@ -18,5 +20,20 @@ class so3Test(unittest.TestCase):
         self.assertAlmostEqual(p,1.5707963267948966)
         self.assertAlmostEqual(y,3.141592653589793)
 
+    def test_batch(self):
+        Rs = [so3.from_rpy((0.1*i,-0.3*i,0.7*i)) for i in range(20)] + [so3.rotation((0,0,1),math.pi-0.1),so3.identity()]
+        R2s = Rs[1:]+Rs[:1]
+        A,B = np.array(Rs),np.array(R2s)
+        self.assertTrue(np.allclose(so3.mul(A,B),[so3.mul(a,b) for a,b in zip(Rs,R2s)]))
+        self.assertTrue(np.allclose(so3.rotation_vector(A),[so3.rotation_vector(a) for a in Rs]))
+        self.assertTrue(np.allclose(so3.quaternion(A),[so3.quaternion(a) for a in Rs]))
+        self.assertTrue(np.allclose(so3.rpy(A),[so3.rpy(a) for a in Rs]))
+        self.assertTrue(np.allclose(so3.interpolate(A,B,0.3),[so3.interpolate(a,b,0.3) for a,b in zip(Rs,R2s)]))
+        self.assertTrue(np.allclose(so3.apply(Rs[1],A[:,:3]),[so3.apply(Rs[1],p) for p in A[:,:3].tolist()]))
+        Ts = [(R,[0.1*i,0,1]) for i,R in enumerate(Rs)]
+        X = np.array([R+t for (R,t) in Ts])
+        self.assertTrue(np.allclose(se3.mul(X,se3.inv(X)),[se3.identity()[0]+se3.identity()[1]]*len(Ts)))
+        self.assertTrue(np.allclose(se3.error(X,X[::-1]),[se3.error(a,b) for a,b in zip(Ts,Ts[::-1])]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy as np
+from klampt.math import vectorops
+from klampt.model.trajectory import HermiteTrajectory
+
+class vectoropsTest(unittest.TestCase):
+
+    def tearDown(self):
+        vectorops.set_backend('list')
+
+    def test_numpy_dispatch(self):
+        a,b = [1.0,2.0,3.0],(-1.0,0.5,2.0)
+        for backend in ['list','numpy']:
+            vectorops.set_backend(backend)
+            self.assertEqual(vectorops.get_backend(),backend)
+            for f,args in [(vectorops.add,(a,b)),(vectorops.madd,(a,b,2.0)),(vectorops.sub,(a,b)),
+                           (vectorops.mul,(a,2.0)),(vectorops.div,(a,b)),(vectorops.maximum,(a,b)),
+                           (vectorops.interpolate,(a,b,0.25))]:
+                res = f(*args)
+                self.assertIsInstance(res,list)
+                resarray = f(np.array(args[0]),*args[1:])
+                self.assertIsInstance(resarray,np.ndarray)
+                self.assertTrue(np.allclose(res,resarray))
+            self.assertAlmostEqual(vectorops.dot(a,b),vectorops.dot(np.array(a),np.array(b)))
+            self.assertAlmostEqual(vectorops.distance(a,b),vectorops.distance(np.array(a),b))
+        self.assertRaises(ValueError,vectorops.set_backend,'torch')
+
+    def test_numpy_scalars(self):
+        #numpy scalars behave like Python scalars, and give list results
+        for backend in ['list','numpy']:
+            vectorops.set_backend(backend)
+            for f,args in [(vectorops.madd,([1.0,2.0],[3.0,4.0],np.float64(2.0))),(vectorops.sub,([1.0,2.0],np.float64(1.0))),
+                           (vectorops.mul,([1.0,2.0],np.float64(2.0))),(vectorops.div,([1.0,2.0],np.float64(2.0))),
+                           (vectorops.interpolate,([1.0,2.0],[3.0,4.0],np.float64(0.5)))]:
+                res = f(*args)
+                self.assertIsInstance(res,list)
+                self.assertTrue(np.allclose(res,f(*[(float(x) if isinstance(x,np.float64) else x) for x in args])))
+            self.assertEqual(vectorops.mul([1,2],np.float64(2.0))+[3],[2.0,4.0,3])
+
+    def test_hermite_numpy_times(self):
+        traj = HermiteTrajectory(list(np.linspace(0,2,3)),[[0,0],[1,1],[2,0]],[[0,0],[1,0],[0,0]])
+        self.assertTrue(np.allclose(traj.eval(0.5),[0.375,0.5]))
+        self.assertTrue(np.allclose(traj.deriv(0.5),[1.25,1.5]))
+        self.assertEqual(len(traj.deriv(0.5)),2)
+
+if __name__ == '__main__':
+    unittest.main()
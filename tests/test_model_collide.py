@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+import random
+from klampt.model.collide import SweepAndPrune,bb_intersect
+
+class collideTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+
+    def randomBB(self):
+        c = [random.uniform(0,10) for i in range(3)]
+        r = random.uniform(0.1,1.0)
+        return [x-r for x in c],[x+r for x in c]
+
+    def bruteForce(self,bbs,active=None):
+        return sorted((i,j) for i in range(len(bbs)) for j in range(i+1,len(bbs))
+                      if bb_intersect(bbs[i],bbs[j]) and (active is None or (active[i] and active[j])))
+
+    def test_sweep_and_prune(self):
+        bbs = [self.randomBB() for i in range(200)]
+        sap = SweepAndPrune(bbs)
+        self.assertEqual(sorted(sap.overlaps()),self.bruteForce(bbs))
+        for k in range(20):
+            i = random.randrange(len(bbs))
+            bbs[i] = self.randomBB()
+            sap.update(i,bbs[i])
+        bbs.append(self.randomBB())
+        self.assertEqual(sap.add(bbs[-1]),len(bbs)-1)
+        self.assertEqual(sorted(sap.overlaps()),self.bruteForce(bbs))
+        active = [random.random() < 0.5 for bb in bbs]
+        self.assertEqual(sorted(sap.overlaps(active)),self.bruteForce(bbs,active))
+
+    def test_world_collider_broad_phase(self):
+        from klampt import WorldModel,Geometry3D,GeometricPrimitive
+        from klampt.model.collide import WorldCollider
+        world = WorldModel()
+        for i in range(30):
+            prim = GeometricPrimitive()
+            prim.setAABB([0,0,0],[1,1,1])
+            world.makeRigidObject(str(i)).geometry().set(Geometry3D(prim))
+            world.rigidObject(i).setTransform([1,0,0,0,1,0,0,0,1],[random.uniform(0,5) for j in range(3)])
+        collider = WorldCollider(world)
+        f1 = lambda obj: int(obj.getName()) % 2 == 0
+        f2 = lambda obj: int(obj.getName()) % 3 == 0
+        def testPairs(*filters):
+            return [(int(a[0].getName()),int(b[0].getName())) for (a,b) in collider.collisionTests(*filters,bb_reject=True)]
+        for k in range(3):
+            objs = [world.rigidObject(i) for i in range(30)]
+            overlapping = self.bruteForce([obj.geometry().getBB() for obj in objs])
+            self.assertEqual(sorted(testPairs()),overlapping)
+            self.assertEqual(sorted(testPairs(f1)),[(i,j) for (i,j) in overlapping if f1(objs[i]) and f1(objs[j])])
+            #with two filters, each pair is reported once, in filter order
+            pairs = testPairs(f1,f2)
+            for (i,j) in pairs:
+                self.assertTrue(f1(objs[i]) and f2(objs[j]))
+            self.assertEqual(sorted(tuple(sorted(p)) for p in pairs),
+                             [(i,j) for (i,j) in overlapping if (f1(objs[i]) and f2(objs[j])) or (f2(objs[i]) and f1(objs[j]))])
+            #move some objects
+            for i in random.sample(range(30),10):
+                world.rigidObject(i).setTransform([1,0,0,0,1,0,0,0,1],[random.uniform(0,5) for j in range(3)])
+
+    def test_collisions_batch(self):
+        from klampt import WorldModel,Geometry3D,GeometricPrimitive
+        from klampt.model.collide import WorldCollider
+        world = WorldModel()
+        for i in range(2):
+            prim = GeometricPrimitive()
+            prim.setAABB([0,0,0],[1,1,1])
+            world.makeRigidObject("box"+str(i)).geometry().set(Geometry3D(prim))
+        world.rigidObject(1).setTransform([1,0,0,0,1,0,0,0,1],[5,0,0])
+        collider = WorldCollider(world)
+        body = world.rigidObject(0)
+        configs = [[1,0,0,0,1,0,0,0,1,x,0,0] for x in [0,4.5,3,5.5,8]]
+        for processes in [None,2]:
+            res = collider.collisions_batch(configs,body,processes=processes)
+            self.assertEqual(res.tolist(),[False,True,False,True,False])
+            pairs = collider.collisions_batch(configs,body,pairs=True,processes=processes)
+            self.assertEqual(pairs[:,0].tolist(),[1,3])
+        self.assertEqual(body.getTransform()[1],[0,0,0])
+
+    def test_ray_cast_batch(self):
+        from klampt import Geometry3D,GeometricPrimitive
+        from klampt.model.collide import ray_cast,ray_cast_batch
+        geoms = []
+        for i in range(10):
+            c = [random.uniform(-5,5) for j in range(3)]
+            prim = GeometricPrimitive()
+            prim.setAABB([x-0.5 for x in c],[x+0.5 for x in c])
+            geoms.append(Geometry3D(prim))
+        s = [[0,0,0]]*100
+        d = [[random.gauss(0,1) for j in range(3)] for k in range(100)]
+        for processes in [None,2]:
+            dist,index = ray_cast_batch(geoms,s,d,processes=processes)
+            for k in range(100):
+                res = ray_cast(geoms,s[k],d[k])
+                if res is None:
+                    self.assertEqual(index[k],-1)
+                else:
+                    self.assertEqual(index[k],res[0])
+                    self.assertAlmostEqual(dist[k],sum(x*x for x in res[1])**0.5)
+
+    def test_prune_self_collisions(self):
+        import tempfile,shutil
+        from klampt import WorldModel
+        from klampt.model.collide import prune_self_collisions
+        cacheDir = tempfile.mkdtemp()
+        try:
+            world = WorldModel()
+            robot = world.loadRobot('data/robots/pr2gripper.rob')
+            never,always = prune_self_collisions(robot,100,cacheDir=cacheDir)
+            for (i,j) in never+always:
+                self.assertFalse(robot.selfCollisionEnabled(i,j))
+            self.assertEqual(len(os.listdir(cacheDir)),1)
+            robot2 = world.loadRobot('data/robots/pr2gripper.rob')
+            self.assertEqual(prune_self_collisions(robot2,100,cacheDir=cacheDir),(never,always))
+            #changing a link's geometry invalidates the cached result
+            robot3 = world.loadRobot('data/robots/pr2gripper.rob')
+            link = [robot3.link(i) for i in range(robot3.numLinks()) if not robot3.link(i).geometry().empty()][-1]
+            link.geometry().translate([0,0,0.1])
+            prune_self_collisions(robot3,100,cacheDir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)),2)
+        finally:
+            shutil.rmtree(cacheDir)
+
+    def test_robot_sphere_model(self):
+        from klampt import WorldModel
+        from klampt.model.collide import RobotSphereModel
+        world = WorldModel()
+        robot = world.loadRobot('data/robots/pr2gripper.rob')
+        spheres = RobotSphereModel(robot,cacheDir=None)
+        configs = []
+        for i in range(50):
+            robot.randomizeConfig()
+            configs.append(robot.getConfig())
+        res = spheres.collisions(configs)
+        for q,collides in zip(configs,res):
+            robot.setConfig(q)
+            self.assertEqual(collides,robot.selfCollides())
+
+if __name__ == '__main__':
+    unittest.main()
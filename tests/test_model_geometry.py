@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from klampt import Geometry3D,GeometricPrimitive
+from klampt.model.geometry import SignedDistanceField
+
+class geometryTest(unittest.TestCase):
+
+    def test_signed_distance_field(self):
+        prim = GeometricPrimitive()
+        prim.setAABB([-1,-1,-1],[1,1,1])
+        geom = Geometry3D(prim)
+        geom.setCurrentTransform([1,0,0,0,1,0,0,0,1],[0,0,2])
+        cacheDir = tempfile.mkdtemp()
+        try:
+            sdf = SignedDistanceField(geom,0.05,cacheDir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)),1)
+            cached = SignedDistanceField(geom,0.05,cacheDir=cacheDir)
+            self.assertTrue(np.array_equal(sdf.values,cached.values))
+        finally:
+            shutil.rmtree(cacheDir)
+        pts = [[0,0,2],[0,0,2.5],[0.5,0,2],[0,0,4]]
+        d,g = sdf.distance_and_gradient(pts)
+        self.assertTrue(np.allclose(d,[-1,-0.5,-0.5,1],atol=0.1))
+        self.assertTrue(np.allclose(g[1:],[[0,0,1],[1,0,0],[0,0,1]],atol=0.2))
+
+if __name__ == '__main__':
+    unittest.main()
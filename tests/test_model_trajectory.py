@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+import tempfile
+import numpy as np
+from klampt.math import so3
+from klampt.model.trajectory import Trajectory,HermiteTrajectory,SO3Trajectory,SE3Trajectory,path_to_trajectory
+from klampt.model.trajectory import StreamingTrajectory,StreamingHermiteTrajectory
+
+class trajectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.times = [0.0,0.5,1.5,2.0,3.0]
+        self.milestones = [[0,0],[1,0],[1,2],[-1,0.5],[0,0]]
+        self.ts = np.linspace(-1,7,81).tolist() + self.times
+
+    def assertBatchMatches(self,traj,endBehavior):
+        X = traj.eval_batch(self.ts,endBehavior)
+        V = traj.deriv_batch(self.ts,endBehavior)
+        self.assertEqual(X.shape[0],len(self.ts))
+        for i,t in enumerate(self.ts):
+            x = traj.eval(t,endBehavior)
+            v = traj.deriv(t,endBehavior)
+            if isinstance(x,tuple):
+                x = list(x[0])+list(x[1])
+                v = list(v[0])+list(v[1])
+            self.assertTrue(np.allclose(X[i],x),"eval_batch mismatch at time %f"%(t,))
+            self.assertTrue(np.allclose(V[i],v),"deriv_batch mismatch at time %f"%(t,))
+
+    def test_eval_batch(self):
+        traj = Trajectory(self.times,self.milestones)
+        self.assertBatchMatches(traj,'halt')
+        self.assertBatchMatches(traj,'loop')
+
+    def test_hermite_eval_batch(self):
+        traj = HermiteTrajectory()
+        traj.makeSpline(Trajectory(self.times,self.milestones))
+        self.assertBatchMatches(traj,'halt')
+        self.assertBatchMatches(traj,'loop')
+
+    def test_so3_se3_eval_batch(self):
+        Rs = [so3.from_rpy((0.1*i,-0.2*i,0.3*i)) for i in range(len(self.times))]
+        self.assertBatchMatches(SO3Trajectory(self.times,Rs),'halt')
+        self.assertBatchMatches(SE3Trajectory(self.times,[(R,[0.1*i,0,1]) for i,R in enumerate(Rs)]),'loop')
+
+    def test_discretize(self):
+        traj = Trajectory(self.times,self.milestones).discretize(0.1)
+        self.assertEqual(traj.times[0],0.0)
+        self.assertEqual(traj.times[-1],3.0)
+        self.assertEqual(len(traj.times),31)
+
+    def test_compact(self):
+        traj = Trajectory(self.times,self.milestones)
+        ctraj = Trajectory(self.times,self.milestones).compact()
+        self.assertTrue(ctraj.isCompact())
+        self.assertEqual(ctraj.milestones[2],self.milestones[2])
+        self.assertTrue(np.allclose(traj.eval_batch(self.ts),ctraj.eval_batch(self.ts)))
+        for (a,b) in [(traj.concat(traj,relative=True,jumpPolicy='jump'),ctraj.concat(ctraj,relative=True,jumpPolicy='jump')),
+                      (traj.split(1.0)[0],ctraj.split(1.0)[0]),
+                      (traj.split(1.0)[1],ctraj.split(1.0)[1]),
+                      (traj.extractDofs([1]),ctraj.extractDofs([1]))]:
+            self.assertTrue(b.isCompact())
+            self.assertEqual(list(a.times),list(b.times))
+            self.assertTrue(np.allclose(a.milestones,np.asarray(b.milestones)))
+        #milestones are read-only copies, but whole milestones can be assigned
+        with self.assertRaises(TypeError):
+            ctraj.milestones[2][0] = 5.0
+        self.assertEqual(ctraj.milestones[2],self.milestones[2])
+        ctraj.milestones[2] = [5.0,6.0]
+        self.assertEqual(ctraj.eval(self.times[2]),[5.0,6.0])
+
+    def test_cursor(self):
+        traj = HermiteTrajectory()
+        traj.makeSpline(Trajectory(self.times,self.milestones))
+        ts = self.ts + [2.5,0.1,10.0,0.0]
+        for endBehavior in ['halt','loop']:
+            cursor = traj.cursor(endBehavior)
+            for t in ts:
+                self.assertTrue(np.allclose(cursor.eval(t),traj.eval(t,endBehavior)))
+                self.assertTrue(np.allclose(cursor.deriv(t),traj.deriv(t,endBehavior)))
+
+    def test_optimal_timing(self):
+        vmax,amax = [1.0,2.0],[3.0,1.0]
+        for smoothing in [None,'spline']:
+            traj = path_to_trajectory(self.milestones,timing='optimal',smoothing=smoothing,vmax=vmax,amax=amax)
+            self.assertIsInstance(traj,HermiteTrajectory)
+            self.assertTrue(np.allclose(traj.milestones[0],self.milestones[0]+[0,0]))
+            self.assertTrue(np.allclose(traj.milestones[-1],self.milestones[-1]+[0,0]))
+            #the limits also hold between the grid points
+            ts = np.linspace(0,traj.times[-1],20001)
+            V = traj.deriv_batch(ts)
+            self.assertTrue(np.all(np.abs(V) <= np.array(vmax)+1e-6))
+            A = np.diff(V,axis=0)/np.diff(ts)[:,np.newaxis]
+            self.assertTrue(np.all(np.abs(A) <= np.array(amax)*(1+1e-3)+1e-6))
+            limited = path_to_trajectory(self.milestones,timing='limited',smoothing=smoothing,vmax=vmax,amax=amax)
+            self.assertLess(traj.duration(),limited.duration())
+
+    def test_npz(self):
+        traj = HermiteTrajectory()
+        traj.makeSpline(Trajectory(self.times,self.milestones))
+        fd,fn = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            traj.save(fn)
+            for mmap in [True,False]:
+                loaded = HermiteTrajectory()
+                loaded.loadNpz(fn,mmap)
+                self.assertTrue(loaded.isCompact())
+                self.assertEqual(list(loaded.times),self.times)
+                self.assertTrue(np.allclose(loaded.eval_batch(self.ts),traj.eval_batch(self.ts)))
+                del loaded
+        finally:
+            os.remove(fn)
+
+    def test_streaming(self):
+        traj = StreamingTrajectory(3)
+        htraj = StreamingHermiteTrajectory(3)
+        for i,(t,q) in enumerate(zip(self.times,self.milestones)):
+            traj.append(t,q)
+            htraj.append(t,q,[0,0])
+            self.assertEqual(traj.eval(t),q)
+            self.assertEqual(htraj.eval(t),q)
+            self.assertEqual(len(traj.times),min(i+1,3))
+        self.assertEqual(list(traj.times),self.times[-3:])
+        ref = Trajectory(self.times,self.milestones)
+        self.assertEqual(traj.eval(2.5),ref.eval(2.5))
+        traj.drop_before(2.5)
+        self.assertEqual(list(traj.times),self.times[-2:])
+        self.assertEqual(traj.eval(2.5),ref.eval(2.5))
+        self.assertRaises(ValueError,traj.append,1.0,[0,0])
+
+    def test_link_trajectories(self):
+        from klampt import WorldModel
+        from klampt.model.trajectory import RobotTrajectory
+        world = WorldModel()
+        world.loadRobot('data/robots/pr2gripper.rob')
+        robot = world.robot(0)
+        qs = [[0.1*i*j for j in range(robot.numLinks())] for i in range(len(self.times))]
+        traj = RobotTrajectory(robot,self.times,qs)
+        links = list(range(robot.numLinks()))
+        for link,X,T in zip(links,traj.getLinkTrajectories(links,asArrays=True),traj.getLinkTrajectories(links)):
+            ref = traj.getLinkTrajectory(link)
+            self.assertTrue(np.allclose(X,np.asarray(ref.milestones)))
+            self.assertTrue(np.allclose(np.asarray(T.milestones),np.asarray(ref.milestones)))
+
+if __name__ == '__main__':
+    unittest.main()
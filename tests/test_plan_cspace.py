@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+import unittest
+import asyncio
+import multiprocessing
+import random
+import numpy as np
+from klampt import WorldModel
+from klampt.model import collide
+from klampt.model.create import primitives
+from klampt.plan.cspace import CSpace,MotionPlan,ParallelMotionPlan
+from klampt.plan.robotcspace import RobotCSpace
+from klampt.plan.shortcutting import PathShortcutter
+
+class cspaceTest(unittest.TestCase):
+
+    def test_feasible_batch(self):
+        space = CSpace()
+        space.setBounds([(0,1),(0,1)])
+        space.addFeasibilityTest((lambda x: x[0] < 0.5),"left",batch=(lambda X: X[:,0] < 0.5))
+        space.addFeasibilityTest((lambda x: x[1] < 0.5),"bottom")
+        X = np.random.rand(100,2)
+        feasible,stats = space.feasible_batch(X,stats=True)
+        self.assertEqual(feasible.tolist(),[space.feasible(x) for x in X.tolist()])
+        self.assertEqual(int(stats['left_count']),100)
+        self.assertEqual(int(stats['bottom_count']),int(np.count_nonzero(X[:,0] < 0.5)))
+
+    def test_robot_feasible_batch(self):
+        world = WorldModel()
+        robot = world.loadRobot('data/robots/pr2gripper.rob')
+        space = RobotCSpace(robot,collide.WorldCollider(world))
+        X = [space.sample() for i in range(50)]
+        self.assertEqual(space.feasible_batch(X).tolist(),[space.feasible(x) for x in X])
+
+    def test_continuous_edge_checking(self):
+        world = WorldModel()
+        robot = world.loadRobot('data/robots/swingup.rob')
+        primitives.box(0.2,0.2,0.2,center=[0.5,0,0.5],world=world,name='obstacle')
+        space = RobotCSpace(robot,collide.WorldCollider(world))
+        space.setContinuousEdgeChecking(True)
+        random.seed(0)
+        edges = 0
+        for i in range(20):
+            a,b = space.sample(),space.sample()
+            if not (space.feasible(a) and space.feasible(b)):
+                continue
+            edges += 1
+            if space.continuousVisible(a,b):
+                #certified edges are feasible at a fine discretization
+                for u in np.linspace(0,1,201):
+                    self.assertTrue(space.feasible(space.interpolate(a,b,float(u))))
+        stats = space.getStats()
+        self.assertIn('continuous collision',stats)
+        self.assertEqual(stats['continuous collision']['edges'],edges)
+
+        class CurvedRobotCSpace(RobotCSpace):
+            def interpolate(self,a,b,u):
+                return RobotCSpace.interpolate(self,a,b,u*u)
+        with self.assertRaises(ValueError):
+            CurvedRobotCSpace(robot,collide.WorldCollider(world)).setContinuousEdgeChecking(True)
+
+    def test_lazy(self):
+        world = WorldModel()
+        robot = world.loadRobot('data/robots/pr2gripper.rob')
+        space = RobotCSpace(robot,collide.WorldCollider(world))
+        lazy = RobotCSpace(robot,collide.WorldCollider(world))
+        lazy.setLazy(True)
+        space.setup()
+        lazy.setup()
+        random.seed(0)
+        infeasible = []
+        for i in range(30):
+            a,b = space.sample(),space.sample()
+            fa,fb = space.feasible(a),space.feasible(b)
+            self.assertEqual(lazy.feasible(a),fa)
+            if fa and fb:
+                self.assertEqual(lazy.isVisible(a,b),space.isVisible(a,b))
+            else:
+                self.assertFalse(lazy.isVisible(a,b))
+                infeasible += [x for (x,f) in [(a,fa),(b,fb)] if not f and lazy.inJointLimits(x)]
+        #memoized infeasible configurations are rejected until the cache is cleared
+        for x in infeasible:
+            self.assertFalse(lazy.isFeasible(x))
+        stats = lazy.getStats()
+        self.assertIn('lazy collision',stats)
+        self.assertEqual(stats['lazy collision']['edges'],30)
+        lazy.clearLazyCache()
+        for x in infeasible:
+            self.assertTrue(lazy.isFeasible(x))
+        space.close()
+        lazy.close()
+
+    def test_plan_async(self):
+        space = CSpace()
+        space.setBounds([(0,1),(0,1)])
+        space.addFeasibilityTest((lambda x: x[0] < 0.4 or x[0] > 0.6 or x[1] > 0.8),"wall")
+        plan = MotionPlan(space,type='rrt*')
+        plan.setEndpoints([0.1,0.1],[0.9,0.1])
+        costs = []
+        path = asyncio.run(plan.plan_async(0.5,on_improve=lambda path,cost: costs.append(cost)))
+        self.assertIsNotNone(path)
+        self.assertEqual(costs,sorted(costs,reverse=True))
+        self.assertAlmostEqual(plan.pathCost(path),costs[-1])
+        plan.close()
+        space.close()
+
+    def test_parallel_plan(self):
+        space = CSpace()
+        space.setBounds([(0,1),(0,1)])
+        space.addFeasibilityTest((lambda x: x[0] < 0.4 or x[0] > 0.6 or x[1] > 0.8),"wall")
+        def makePlan(index):
+            plan = MotionPlan(space,type='rrt*' if index == 0 else 'rrt')
+            plan.setEndpoints([0.1,0.1],[0.9,0.1])
+            return plan
+        parallel = ParallelMotionPlan(makePlan,3)
+        path = parallel.solve(10.0,seed=1)
+        self.assertIsNotNone(path)
+        self.assertEqual(path[0],[0.1,0.1])
+        self.assertEqual(path[-1],[0.9,0.1])
+        self.assertIn(parallel.index,[0,1,2])
+        self.assertIn('solution time',parallel.stats)
+        #remaining planners are cancelled
+        self.assertEqual(multiprocessing.active_children(),[])
+        path = parallel.solve(2.0,optimizing=True,seed=1)
+        self.assertIsNotNone(path)
+        self.assertGreater(parallel.stats['solution time'],0)
+        self.assertEqual(multiprocessing.active_children(),[])
+        self.assertIsNone(ParallelMotionPlan((lambda index: None),2).solve(1.0))
+        self.assertEqual(multiprocessing.active_children(),[])
+        space.close()
+
+    def test_shortcut(self):
+        space = CSpace()
+        space.setBounds([(0,1),(0,1)])
+        space.addFeasibilityTest((lambda x: x[0] < 0.4 or x[0] > 0.6 or x[1] > 0.8),"wall")
+        path = [[0.1,0.1],[0.3,0.5],[0.2,0.9],[0.5,0.85],[0.8,0.9],[0.7,0.5],[0.9,0.1]]
+        shortcutter = PathShortcutter(space)
+        res = shortcutter.shortcut(path,maxTime=0.1)
+        self.assertEqual(res[0],path[0])
+        self.assertEqual(res[-1],path[-1])
+        self.assertLess(shortcutter.stats['length'],shortcutter.stats['initial length'])
+        for (a,b) in zip(res[:-1],res[1:]):
+            self.assertTrue(space.isVisible(a,b))
+        space.close()
+
+if __name__ == '__main__':
+    unittest.main()
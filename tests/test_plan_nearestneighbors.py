@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import unittest
+import math
+import numpy as np
+from klampt.plan.nearestneighbors import NearestNeighbors
+
+class nearestNeighborsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.weights = [1.0,4.0,0.5]
+        self.periods = [0.0,2*math.pi,0.0]
+        self.points = rng.uniform(0,2*math.pi,(500,3))
+        #queries outside of [0,2pi) wrap around the periodic dimension
+        self.queries = rng.uniform(-1,7,(40,3))
+        self.nn = NearestNeighbors(3,self.weights,self.periods,leafSize=4,bufferSize=16)
+        for x in self.points:
+            self.nn.add(x)
+
+    def bruteForce(self,x):
+        d = np.abs(self.points - x)
+        d[:,1] = np.mod(d[:,1],2*math.pi)
+        d[:,1] = np.minimum(d[:,1],2*math.pi - d[:,1])
+        return np.sqrt(np.dot(d*d,self.weights))
+
+    def test_knearest(self):
+        self.assertEqual(len(self.nn),len(self.points))
+        for x in self.queries:
+            D = self.bruteForce(x)
+            order = np.argsort(D)
+            res = self.nn.knearest(x,5)
+            self.assertEqual([i for (d,i) in res],order[:5].tolist())
+            self.assertTrue(np.allclose([d for (d,i) in res],D[order[:5]]))
+            d,i = self.nn.nearest(x)
+            self.assertEqual(i,order[0])
+            self.assertAlmostEqual(d,D[order[0]])
+
+    def test_neighbors(self):
+        for x in self.queries:
+            D = self.bruteForce(x)
+            res = self.nn.neighbors(x,1.5)
+            self.assertEqual(sorted(i for (d,i) in res),np.nonzero(D <= 1.5)[0].tolist())
+            self.assertEqual([d for (d,i) in res],sorted(d for (d,i) in res))
+
+    def test_batch(self):
+        D,I = self.nn.knearest_batch(self.queries,5,chunk=16)
+        self.assertEqual(D.shape,(len(self.queries),5))
+        for x,d,inds in zip(self.queries,D,I):
+            ref = self.bruteForce(x)
+            self.assertEqual(inds.tolist(),np.argsort(ref)[:5].tolist())
+            self.assertTrue(np.allclose(d,ref[inds]))
+        for x,inds in zip(self.queries,self.nn.neighbors_batch(self.queries,1.5)):
+            self.assertEqual(sorted(inds.tolist()),np.nonzero(self.bruteForce(x) <= 1.5)[0].tolist())
+        D,I = self.nn.knearest_batch(self.queries[:2],1000)
+        self.assertEqual(D.shape,(2,len(self.points)))
+
+    def test_wraparound(self):
+        #the nearest point is across the period boundary, outside of the
+        #query's bounding box
+        nn = NearestNeighbors(2,periods=[0.0,2*math.pi],leafSize=1,bufferSize=2)
+        for x in [[0.0,0.1],[0.0,3.0],[0.5,2*math.pi-0.1],[0.0,4.0]]:
+            nn.add(x)
+        d,i = nn.nearest([0.0,2*math.pi-0.05])
+        self.assertEqual(i,0)
+        self.assertAlmostEqual(d,0.15)
+        d,i = nn.nearest([0.0,-0.2])
+        self.assertEqual(i,0)
+        self.assertAlmostEqual(d,0.3)
+        self.assertEqual(sorted(i for (d,i) in nn.neighbors([0.0,0.0],0.6)),[0,2])
+
+    def test_point(self):
+        #points are returned as added, even if periodic coordinates wrap or
+        #a dimension has weight 0
+        nn = NearestNeighbors(3,[1.0,0.0,2.0],[2*math.pi,2*math.pi,0.0])
+        points = [[7.0,-1.0,0.5],[-0.5,9.0,1.0]]
+        for x in points:
+            nn.add(x)
+        self.assertEqual([nn.point(i) for i in range(2)],points)
+        d,i = nn.nearest([0.7,0.0,0.5])
+        self.assertEqual(i,0)
+        self.assertAlmostEqual(d,abs(7.0-2*math.pi-0.7))
+        self.assertRaises(ValueError,NearestNeighbors,2,[1.0,-1.0])
+
+    def test_empty(self):
+        nn = NearestNeighbors(2)
+        self.assertEqual(len(nn),0)
+        self.assertIsNone(nn.nearest([0,0]))
+        self.assertEqual(nn.knearest([0,0],3),[])
+        self.assertEqual(nn.neighbors([0,0],1.0),[])
+        D,I = nn.knearest_batch([[0,0],[1,1]],3)
+        self.assertEqual(D.shape,(2,0))
+        self.assertEqual([len(inds) for inds in nn.neighbors_batch([[0,0]],1.0)],[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+import tempfile
+from klampt import WorldModel
+from klampt.plan.cspace import CSpace
+from klampt.plan.pathlibrary import PathLibrary
+
+class pathLibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = WorldModel()
+        self.robot = self.world.loadRobot('data/robots/pr2gripper.rob')
+
+    def config(self,x):
+        q = self.robot.getConfig()
+        q[0] = x
+        return q
+
+    def makeLibrary(self,capacity):
+        library = PathLibrary(self.robot,capacity=capacity)
+        for x in [0.0,0.1,0.2]:
+            library.add([self.config(x),self.config(x+0.05)])
+        return library
+
+    def test_lru(self):
+        library = self.makeLibrary(3)
+        self.assertEqual(library.nearest(self.config(0.21),self.config(0.26),2),[2,1])
+        library.touch(0)
+        library.add([self.config(0.3),self.config(0.35)])
+        self.assertEqual(len(library),3)
+        self.assertEqual(list(library.entries.keys()),[2,0,3])
+        self.assertEqual(library.nearest(self.config(0.11),self.config(0.16),2),[2,0])
+
+    def test_save_load(self):
+        library = self.makeLibrary(3)
+        library.touch(0)
+        fd,fn = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            library.save(fn)
+            loaded = PathLibrary(self.robot,capacity=3,filename=fn)
+            self.assertEqual([e['path'] for e in loaded.entries.values()],[e['path'] for e in library.entries.values()])
+            self.assertEqual(loaded.nearest(self.config(0.01),self.config(0.06),1),[2])
+            #the least recently used paths are dropped
+            small = PathLibrary(self.robot,capacity=2,filename=fn)
+            self.assertEqual([e['path'][0] for e in small.entries.values()],[self.config(0.2),self.config(0.0)])
+        finally:
+            os.remove(fn)
+
+    def test_repair(self):
+        class FakePlan:
+            pass
+        space = CSpace()
+        space.setBounds([(0,1),(0,1)])
+        space.addFeasibilityTest((lambda x: abs(x[0]-0.5) > 0.1 or x[1] > 0.5),"wall")
+        space.setup()
+        plan = FakePlan()
+        plan.space = space
+        library = PathLibrary(self.robot)
+        path = [[0.1,0.1],[0.3,0.9],[0.7,0.9],[0.9,0.1]]
+        self.assertEqual(library.repair(plan,path,[0.0,0.1],[1.0,0.1]),[[0.0,0.1],[0.7,0.9],[1.0,0.1]])
+        #infeasible waypoints are skipped
+        self.assertEqual(library.repair(plan,[[0.1,0.1],[0.5,0.2],[0.5,0.9],[0.9,0.1]],[0.0,0.1],[1.0,0.1]),[[0.0,0.1],[0.5,0.9],[1.0,0.1]])
+        #infeasible endpoints are rejected
+        self.assertIsNone(library.repair(plan,path,[0.0,0.1],[0.5,0.1]))
+        self.assertIsNone(library.repair(plan,path,[0.5,0.1],[1.0,0.1]))
+        #and so are paths that cannot be shortcut around the wall
+        self.assertIsNone(library.repair(plan,[[0.1,0.1],[0.9,0.1]],[0.0,0.1],[1.0,0.1]))
+        space.close()
+
+if __name__ == '__main__':
+    unittest.main()
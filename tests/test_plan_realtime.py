@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import unittest
+import time
+import numpy as np
+from klampt.control.robotinterface import RobotInterfaceBase
+from klampt.model.trajectory import Trajectory
+from klampt.plan.cspace import CSpace
+from klampt.plan.realtime import RealTimePlanner
+
+class FakeInterface(RobotInterfaceBase):
+    """A robot with a settable clock that records its commands"""
+    def __init__(self):
+        RobotInterfaceBase.__init__(self)
+        self.t = 0.0
+        self.q = [0.0,0.0]
+        self.commands = []
+
+    def status(self,part=None,joint_idx=None):
+        return 'ok'
+
+    def clock(self):
+        return self.t
+
+    def commandedPosition(self,part=None,joint_idx=None):
+        return self.q
+
+    def setPiecewiseLinear(self,ts,qs,relative=True,part=None,joint_idx=None):
+        self.commands.append((list(ts),[list(q) for q in qs]))
+
+
+class ScriptedPlanner(RealTimePlanner):
+    """Returns the results of a list of functions f(start) in order, and
+    times paths at unit speed"""
+    def planSegment(self,start,goal,deadline):
+        return self.script.pop(0)(start)
+
+    def timeParameterize(self,path):
+        times = [0.0]
+        for (a,b) in zip(path[:-1],path[1:]):
+            times.append(times[-1] + np.linalg.norm(np.subtract(b,a)))
+        return Trajectory(times,path)
+
+
+class realTimeTest(unittest.TestCase):
+
+    def test_step(self):
+        wall = {'y':0.0}
+        space = CSpace()
+        space.setBounds([(-1,2),(-1,2)])
+        space.addFeasibilityTest((lambda x: not (0.65 < x[0] < 0.75 and abs(x[1]) < wall['y'])),"wall")
+        interface = FakeInterface()
+        planner = ScriptedPlanner(interface,space,rate=10,budget=0.05,margin=0.05,amax=20.0)
+        goal = [1.0,0.0]
+        planner.setGoal(goal)
+
+        #from rest, the new segment starts at tnow + budget + margin
+        planner.script = [lambda start: [start,goal]]
+        self.assertTrue(planner.step())
+        ts,qs = interface.commands[-1]
+        self.assertTrue(np.allclose(ts,[0.1,1.1]))
+        self.assertEqual(qs,[[0.0,0.0],goal])
+
+        #a longer path does not replace a valid trajectory
+        interface.t = 0.2
+        planner.script = [lambda start: [start,[0.6,0.3],goal]]
+        self.assertFalse(planner.step())
+        self.assertEqual(len(interface.commands),1)
+        self.assertEqual(planner.stats['kept'],1)
+
+        #if the trajectory becomes infeasible, a detour is spliced in, and
+        #its velocity is blended with the velocity at the splice point over
+        #4*|dv|/amax = 0.12s
+        interface.t = 0.3
+        wall['y'] = 0.1
+        planner.script = [lambda start: [start,[0.7,0.3],goal]]
+        self.assertTrue(planner.step())
+        ts,qs = interface.commands[-1]
+        self.assertTrue(np.allclose(ts[:2],[0.4,0.41]))
+        self.assertTrue(np.allclose(ts[-3:],[0.52,0.9,0.9+np.sqrt(0.18)]))
+        self.assertTrue(np.allclose(qs[0],[0.3,0.0]))
+        self.assertTrue(np.allclose(qs[-3:],[[0.396,0.072],[0.7,0.3],goal]))
+        V = np.diff(qs,axis=0)/np.diff(ts)[:,np.newaxis]
+        self.assertTrue(np.allclose(V[0],[1.0,0.0],atol=0.1))
+        self.assertTrue(np.all(np.abs(np.diff(V[:13],axis=0)) <= 20.0*0.01))
+
+        #if it becomes infeasible and planning fails, the robot slows down to
+        #a stop from the splice point over |v|/amax = 0.04s
+        interface.t = 0.5
+        wall['y'] = float('inf')
+        planner.script = [lambda start: None]
+        self.assertFalse(planner.step())
+        ts,qs = interface.commands[-1]
+        i = int(np.argmin(np.abs(np.subtract(ts,0.6))))
+        self.assertAlmostEqual(ts[i],0.6)
+        self.assertAlmostEqual(ts[-1],0.64)
+        self.assertTrue(np.allclose(qs[i],[0.46,0.12]))
+        self.assertTrue(np.allclose(qs[-1],[0.476,0.132]))
+        steps = np.linalg.norm(np.diff(qs[i:],axis=0),axis=1)
+        self.assertTrue(np.all(np.diff(steps) < 0))
+        self.assertAlmostEqual(planner.trajectory.endTime(),0.64)
+        self.assertEqual(planner.stats['stops'],1)
+
+        #paths planned after the splice time are discarded
+        interface.t = 1.0
+        interface.q = qs[0]
+        def late(start):
+            time.sleep(0.15)
+            return [start,goal]
+        planner.script = [late]
+        self.assertFalse(planner.step())
+        self.assertEqual(len(interface.commands),3)
+        self.assertIsNone(planner.trajectory)
+        stats = planner.getStats()
+        self.assertEqual((stats['cycles'],stats['successes'],stats['failures'],stats['late']),(5,2,2,1))
+        self.assertEqual(stats['plans'],5)
+        self.assertAlmostEqual(stats['success rate'],0.4)
+        self.assertGreaterEqual(stats['max latency'],0.15)
+        self.assertLessEqual(stats['mean latency'],stats['max latency'])
+        space.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import unittest
+import math
+import random
+import shutil
+import tempfile
+from klampt import WorldModel
+from klampt.math import so3
+from klampt.model.create import primitives
+from klampt.plan.cspace import CSpace
+from klampt.plan.roadmapcache import RoadmapCache
+
+class roadmapCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        #a point moving in the unit square around a disk-shaped obstacle
+        #centered at the origin of a rigid object
+        self.world = WorldModel()
+        self.obstacle = primitives.box(0.1,0.1,0.1,world=self.world,name='obstacle',mass=1.0)
+        self.moveObstacle(0.5,0.5)
+        self.space = CSpace()
+        self.space.setBounds([(0,1),(0,1)])
+        self.space.eps = 1e-2
+        self.space.addFeasibilityTest(self.collisionFree,"obstacle")
+        self.space.setup()
+        self.cacheDir = tempfile.mkdtemp()
+        random.seed(0)
+        V = []
+        while len(V) < 200:
+            x = [random.random(),random.random()]
+            if self.collisionFree(x):
+                V.append(x)
+        E = [(i,j) for i in range(len(V)) for j in range(i) if math.hypot(V[i][0]-V[j][0],V[i][1]-V[j][1]) < 0.2]
+        self.V,self.E = V,E
+
+    def tearDown(self):
+        self.space.close()
+        shutil.rmtree(self.cacheDir)
+
+    def moveObstacle(self,x,y):
+        self.obstacle.setTransform(so3.identity(),[x,y,0])
+
+    def collisionFree(self,x):
+        t = self.obstacle.getTransform()[1]
+        return math.hypot(x[0]-t[0],x[1]-t[1]) > 0.2
+
+    def assertPathValid(self,path,start,goal):
+        self.assertIsNotNone(path)
+        self.assertEqual(path[0],start)
+        self.assertEqual(path[-1],goal)
+        for (a,b) in zip(path[:-1],path[1:]):
+            self.assertTrue(self.space.isVisible(a,b))
+
+    def test_lazy_edges(self):
+        cache = RoadmapCache(self.space,self.world,cacheDir=self.cacheDir)
+        cache.addRoadmap(self.V,self.E,checkedEdges=False)
+        n,m = cache.numVertices(),cache.numEdges()
+        path = cache.query([0.1,0.1],[0.9,0.9])
+        self.assertPathValid(path,[0.1,0.1],[0.9,0.9])
+        #only the edges that were searched are checked
+        checked = sum(1 for a in cache.adj for e in a.values() if e[1] is not False)//2
+        self.assertLess(checked,m)
+        #the endpoints are temporary unless asked otherwise
+        self.assertEqual((cache.numVertices(),cache.numEdges()),(n,m))
+        cache.query([0.1,0.1],[0.9,0.9],keepEndpoints=True)
+        self.assertEqual(cache.numVertices(),n+2)
+
+    def test_moved_obstacles(self):
+        cache = RoadmapCache(self.space,self.world,cacheDir=self.cacheDir)
+        cache.addRoadmap(self.V,self.E)
+        m = cache.numEdges()
+        self.moveObstacle(0.6,0.6)
+        path = cache.query([0.1,0.1],[0.9,0.9])
+        self.assertPathValid(path,[0.1,0.1],[0.9,0.9])
+        #infeasible vertices and edges are blocked, not removed
+        self.assertEqual(cache.numEdges(),m)
+        self.assertIn(None,cache.checked+[e[1] for a in cache.adj for e in a.values()])
+        for i,c in enumerate(cache.checked):
+            if c is None:
+                self.assertFalse(self.collisionFree(cache.V[i]))
+        #and are re-checked once the obstacle moves again
+        self.moveObstacle(0.5,0.5)
+        self.assertTrue(cache.updateEnvironment())
+        self.assertNotIn(None,cache.checked)
+        self.assertFalse(cache.updateEnvironment())
+
+    def test_save_load(self):
+        cache = RoadmapCache(self.space,self.world,cacheDir=self.cacheDir)
+        self.assertEqual(cache.numVertices(),0)
+        cache.addRoadmap(self.V,self.E)
+        cache.query([0.1,0.1],[0.9,0.9])
+        cache.save()
+        loaded = RoadmapCache(self.space,self.world,cacheDir=self.cacheDir)
+        self.assertEqual(loaded.V,cache.V)
+        self.assertEqual(loaded.checked,cache.checked)
+        self.assertEqual(loaded.numEdges(),cache.numEdges())
+        self.assertPathValid(loaded.query([0.1,0.1],[0.9,0.9]),[0.1,0.1],[0.9,0.9])
+        #a cache saved with the obstacles elsewhere is rechecked
+        self.moveObstacle(0.6,0.6)
+        moved = RoadmapCache(self.space,self.world,cacheDir=self.cacheDir)
+        self.assertEqual(moved.numVertices(),cache.numVertices())
+        self.assertTrue(all(c is False for c in moved.checked))
+        self.assertPathValid(moved.query([0.1,0.1],[0.9,0.9]),[0.1,0.1],[0.9,0.9])
+
+if __name__ == '__main__':
+    unittest.main()